@@ -0,0 +1,211 @@
+# Este módulo existe idéntico en m0_cargajson/ y en m1_scrapper/, porque cada carpeta
+# es su propio contexto de build de Docker. Cualquier cambio se hace en las dos copias.
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Código de error de MongoDB para claves duplicadas en un índice único
+ERROR_CLAVE_DUPLICADA = 11000
+
+def escribir_lote(collection, uuids, operaciones, nombre=None):
+    """
+    Ejecuta un bulk_write no ordenado de `operaciones` (una por uuid, en el mismo orden).
+
+    Retorna (conteos, confirmados): conteos con insertados, actualizados, coincidentes
+    (sin modificar), duplicados y errores, y la lista de uuids que quedaron en la
+    colección (escritos o ya existentes).
+    """
+    try:
+        resultado = collection.bulk_write(operaciones, ordered=False)
+        insertados = resultado.upserted_count
+        coincidentes = resultado.matched_count
+        modificados = resultado.modified_count
+        duplicados = errores = 0
+        confirmados = list(uuids)
+    except BulkWriteError as e:
+        # Solo ocurre si otro proceso insertó el mismo uuid entre medio
+        detalles = e.details
+        insertados = detalles.get('nUpserted', 0)
+        coincidentes = detalles.get('nMatched', 0)
+        modificados = detalles.get('nModified', 0)
+        errores_escritura = detalles.get('writeErrors', [])
+        duplicados = sum(1 for err in errores_escritura if err.get('code') == ERROR_CLAVE_DUPLICADA)
+        errores = len(errores_escritura) - duplicados
+        # Un duplicado también significa que el uuid ya está en la colección
+        fallidos = {err['index'] for err in errores_escritura if err.get('code') != ERROR_CLAVE_DUPLICADA}
+        confirmados = [uuid for i, uuid in enumerate(uuids) if i not in fallidos]
+    except Exception as e:
+        print(f"Error al escribir un lote en {nombre or collection.name}: {e}")
+        insertados = coincidentes = modificados = duplicados = 0
+        errores = len(operaciones)
+        confirmados = []
+    return {"insertados": insertados, "actualizados": modificados, "coincidentes": coincidentes - modificados,
+            "duplicados": duplicados, "errores": errores}, confirmados
+
+class BufferEscritura:
+    """
+    Buffer de escritura diferida hacia MongoDB compartido entre celdas o archivos.
+
+    Los documentos se acumulan por colección y se envían con `bulk_write` de upserts
+    cuando se alcanzan `tam_lote` operaciones pendientes o pasan `intervalo_max`
+    segundos. Si hay `max_pendientes` operaciones sin escribir, `insertar` y
+    `actualizar` bloquean hasta que el hilo de escritura libere espacio.
+
+    - `insertar` agrega el documento solo si su uuid no existe (`$setOnInsert`), así
+      los duplicados se cuentan con `matched_count` en vez de provocar errores.
+    - `actualizar` encola una operación de actualización arbitraria por uuid.
+
+    Las estadísticas por colección (insertados, actualizados, duplicados, sin_cambios
+    y errores) salen de los resultados de MongoDB, por lo que son exactas.
+
+    Con un `indice` (IndiceUUIDs), `insertar` descarta sin ir al servidor los uuids
+    que el índice ya conoce (se cuentan como `conocidos`), y los uuids de cada lote
+    se agregan al índice recién cuando MongoDB confirma la escritura.
+    """
+    def __init__(self, colecciones, tam_lote=1000, intervalo_max=2.0, max_pendientes=10000, indice=None):
+        self.colecciones = colecciones  # nombre -> Collection
+        self.indice = indice
+        self.tam_lote = tam_lote
+        self.intervalo_max = intervalo_max
+        self.max_pendientes = max(max_pendientes, tam_lote)
+
+        # nombre -> {"insertar": {uuid: doc}, "actualizar": {uuid: UpdateOne}}
+        self.pendientes = {nombre: {"insertar": {}, "actualizar": {}} for nombre in colecciones}
+        self.total_pendientes = 0
+        self.escribiendo = 0  # Operaciones tomadas por el hilo de escritura y aún no confirmadas
+        self.estadisticas = {nombre: {"insertados": 0, "actualizados": 0, "duplicados": 0,
+                                      "sin_cambios": 0, "errores": 0, "conocidos": 0, "lotes": 0}
+                             for nombre in colecciones}
+
+        self.condicion = threading.Condition()
+        self.cerrado = False
+        self.ultimo_flush = time.monotonic()
+        self.hilo = threading.Thread(target=self._bucle_escritura, name="buffer-escritura", daemon=True)
+        self.hilo.start()
+
+    # ---- Encolado ----
+
+    def _esperar_espacio(self):
+        # Lo que el hilo de escritura ya tomó sigue en memoria hasta que bulk_write termina
+        while self.total_pendientes + self.escribiendo >= self.max_pendientes and not self.cerrado:
+            self.condicion.notify_all()
+            self.condicion.wait()
+
+    def insertar(self, nombre, doc):
+        """Encola un documento para insertarlo solo si su uuid no existe en la colección"""
+        with self.condicion:
+            self._esperar_espacio()
+            pendientes = self.pendientes[nombre]
+            uuid = doc['uuid']
+            if self.indice is not None and self.indice.contiene(nombre, uuid):
+                # Ya está en MongoDB según el índice local
+                self.estadisticas[nombre]["conocidos"] += 1
+                return
+            if uuid in pendientes["insertar"] or uuid in pendientes["actualizar"]:
+                # Repetido dentro del mismo buffer: no hace falta ir al servidor
+                self.estadisticas[nombre]["duplicados"] += 1
+                return
+            pendientes["insertar"][uuid] = doc
+            self._registrar_encolado()
+
+    def actualizar(self, nombre, uuid, operacion):
+        """Encola una operación de actualización (UpdateOne) para el uuid; la última gana"""
+        with self.condicion:
+            self._esperar_espacio()
+            pendientes = self.pendientes[nombre]
+            if pendientes["insertar"].pop(uuid, None) is not None:
+                self.total_pendientes -= 1
+            if uuid not in pendientes["actualizar"]:
+                self.total_pendientes += 1
+            pendientes["actualizar"][uuid] = operacion
+            if self.total_pendientes >= self.tam_lote:
+                self.condicion.notify_all()
+
+    def _registrar_encolado(self):
+        self.total_pendientes += 1
+        if self.total_pendientes >= self.tam_lote:
+            self.condicion.notify_all()
+
+    # ---- Escritura ----
+
+    def _tomar_pendientes(self):
+        """Retira todas las operaciones pendientes (se llama con la condición tomada)"""
+        tomados = self.pendientes
+        self.pendientes = {nombre: {"insertar": {}, "actualizar": {}} for nombre in self.colecciones}
+        self.escribiendo += self.total_pendientes
+        self.total_pendientes = 0
+        return tomados
+
+    def _escribir(self, tomados):
+        for nombre, pendientes in tomados.items():
+            collection = self.colecciones[nombre]
+            if pendientes["insertar"]:
+                operaciones = [UpdateOne({'uuid': uuid}, {'$setOnInsert': doc}, upsert=True)
+                               for uuid, doc in pendientes["insertar"].items()]
+                self._aplicar(nombre, collection, list(pendientes["insertar"]), operaciones, "duplicados")
+            if pendientes["actualizar"]:
+                self._aplicar(nombre, collection, list(pendientes["actualizar"]),
+                              list(pendientes["actualizar"].values()), "sin_cambios")
+
+    def _aplicar(self, nombre, collection, uuids, operaciones, clave_coincidentes):
+        """
+        Ejecuta los bulk_write en lotes y acumula sus conteos. Las operaciones que
+        coinciden con un documento existente sin modificarlo se cuentan en `clave_coincidentes`.
+        """
+        estadisticas = self.estadisticas[nombre]
+        for inicio in range(0, len(operaciones), self.tam_lote):
+            conteos, confirmados = escribir_lote(collection, uuids[inicio:inicio + self.tam_lote],
+                                                 operaciones[inicio:inicio + self.tam_lote], nombre)
+            if self.indice is not None and confirmados:
+                self.indice.agregar(nombre, confirmados)
+
+            with self.condicion:
+                estadisticas["insertados"] += conteos["insertados"]
+                estadisticas["actualizados"] += conteos["actualizados"]
+                estadisticas[clave_coincidentes] += conteos["coincidentes"]
+                estadisticas["duplicados"] += conteos["duplicados"]
+                estadisticas["errores"] += conteos["errores"]
+                estadisticas["lotes"] += 1
+
+    def _bucle_escritura(self):
+        while True:
+            with self.condicion:
+                while not self.cerrado and self.total_pendientes < self.tam_lote:
+                    restante = self.intervalo_max - (time.monotonic() - self.ultimo_flush)
+                    if restante <= 0 and self.total_pendientes > 0:
+                        break
+                    self.condicion.wait(timeout=max(restante, 0.05))
+                    if restante <= 0:
+                        self.ultimo_flush = time.monotonic()
+                if self.cerrado and self.total_pendientes == 0:
+                    return
+                tomados = self._tomar_pendientes()
+                cantidad = self.escribiendo
+            self._escribir(tomados)
+            with self.condicion:
+                self.escribiendo -= cantidad
+                self.ultimo_flush = time.monotonic()
+                self.condicion.notify_all()
+
+    def flush(self):
+        """Espera a que todo lo encolado hasta ahora quede escrito en MongoDB"""
+        with self.condicion:
+            while self.total_pendientes > 0 or self.escribiendo > 0:
+                self.ultimo_flush = 0  # Fuerza la escritura sin esperar el intervalo
+                self.condicion.notify_all()
+                self.condicion.wait(timeout=0.1)
+
+    def cerrar(self):
+        """Escribe lo pendiente y detiene el hilo de escritura"""
+        self.flush()
+        with self.condicion:
+            self.cerrado = True
+            self.condicion.notify_all()
+        self.hilo.join()
+
+    def resumen(self):
+        """Copia de las estadísticas acumuladas por colección"""
+        with self.condicion:
+            return {nombre: dict(valores) for nombre, valores in self.estadisticas.items()}
@@ -0,0 +1,225 @@
+import json
+import multiprocessing
+import threading
+import time
+
+import ijson
+from pymongo import UpdateOne
+
+from buffer_escritura import escribir_lote
+
+# Correspondencia entre las listas de cada celda y las colecciones de MongoDB
+LISTAS_COLECCIONES = (('alerts', 'alertas'), ('jams', 'atascos'))
+
+def lotes_de_archivo(archivo_json, tam_lote, max_bytes=0):
+    """
+    Genera (coleccion, documentos) recorriendo las celdas como flujo (ijson), sin
+    cargar el archivo completo. Un lote se entrega al llegar a `tam_lote` documentos
+    o, si `max_bytes` es mayor que 0, cuando su tamaño aproximado en JSON lo alcanza.
+    """
+    pendientes = {nombre: [] for _, nombre in LISTAS_COLECCIONES}
+    tamanos = {nombre: 0 for _, nombre in LISTAS_COLECCIONES}
+    with open(archivo_json, 'rb') as file:
+        # use_float evita Decimal, que MongoDB no sabe codificar
+        for celda in ijson.items(file, 'celdas.item', use_float=True):
+            if 'data' not in celda:
+                continue
+            for lista, nombre in LISTAS_COLECCIONES:
+                for item in celda['data'].get(lista, []):
+                    pendientes[nombre].append(item)
+                    if max_bytes > 0:
+                        tamanos[nombre] += len(json.dumps(item, separators=(',', ':'), default=str))
+                    if len(pendientes[nombre]) >= tam_lote or (max_bytes > 0 and tamanos[nombre] >= max_bytes):
+                        yield nombre, pendientes[nombre]
+                        pendientes[nombre] = []
+                        tamanos[nombre] = 0
+    for nombre, docs in pendientes.items():
+        if docs:
+            yield nombre, docs
+
+def proceso_parser(cola_archivos, cola_lotes, tam_lote, max_bytes=0):
+    """
+    Proceso que parsea archivos y pone sus lotes en la cola acotada, salvo los que
+    ya estaban confirmados. Al terminar cada archivo envía ('archivo', ruta, lotes,
+    conteos, error).
+    """
+    while True:
+        trabajo = cola_archivos.get()
+        if trabajo is None:
+            return
+        archivo, saltar = trabajo
+        conteos = {nombre: 0 for _, nombre in LISTAS_COLECCIONES}
+        numero = 0
+        error = None
+        try:
+            for nombre, docs in lotes_de_archivo(archivo, tam_lote, max_bytes):
+                if numero not in saltar:
+                    cola_lotes.put(('lote', archivo, numero, nombre, docs))
+                conteos[nombre] += len(docs)
+                numero += 1
+        except FileNotFoundError:
+            error = "el archivo no existe"
+        except ijson.JSONError:
+            error = "no tiene un formato JSON válido"
+        except Exception as e:
+            error = str(e)
+        cola_lotes.put(('archivo', archivo, numero, conteos, error))
+
+class CargaParalela:
+    """
+    Carga de archivos en pipeline: `procesos` parsers ponen lotes (de `tam_lote`
+    documentos o `max_bytes` bytes, lo que ocurra primero) en una cola acotada a
+    `max_cola` lotes y `escritores` hilos los aplican con bulk_write, compartiendo
+    las colecciones (y por lo tanto el pool de conexiones de un único MongoClient).
+
+    Cada lote se inserta con upserts `$setOnInsert` por uuid, igual que
+    BufferEscritura.insertar, y con un `indice` (IndiceUUIDs) se omiten los
+    uuids conocidos. Con un `manifiesto` (ManifiestoCarga) se saltan los archivos
+    ya cargados y los lotes ya confirmados, y cada lote escrito sin errores queda
+    como checkpoint. Las estadísticas quedan en `estadisticas` y `archivos`.
+    """
+    def __init__(self, colecciones, procesos=1, escritores=4, tam_lote=1000, max_cola=16, indice=None,
+                 manifiesto=None, intervalo_reporte=5.0, max_bytes=0):
+        self.colecciones = colecciones
+        self.procesos = max(1, procesos)
+        self.escritores = max(1, escritores)
+        self.tam_lote = tam_lote
+        self.max_bytes = max_bytes
+        self.max_cola = max_cola
+        self.indice = indice
+        self.manifiesto = manifiesto
+        self.intervalo_reporte = intervalo_reporte
+
+        self.lock = threading.Lock()
+        self.estadisticas = {nombre: {"insertados": 0, "duplicados": 0, "errores": 0, "conocidos": 0, "lotes": 0}
+                             for nombre in colecciones}
+        self.archivos = {}  # ruta -> {"lotes", "conteos", "error"}
+        self.omitidos = 0  # Archivos que el manifiesto ya tenía completos
+        self.documentos = 0  # Documentos ya aplicados (para el throughput)
+
+    def escribir(self, nombre, docs):
+        """
+        Aplica un lote de documentos en su colección y acumula las estadísticas.
+        Retorna los conteos del lote (insertados, duplicados y errores).
+        """
+        if self.indice is not None:
+            conocidos = len(docs)
+            docs = [doc for doc in docs if not self.indice.contiene(nombre, doc['uuid'])]
+            conocidos -= len(docs)
+        else:
+            conocidos = 0
+
+        # Un uuid repetido dentro del lote se manda una sola vez
+        por_uuid = {}
+        for doc in docs:
+            por_uuid.setdefault(doc['uuid'], doc)
+        repetidos = len(docs) - len(por_uuid)
+
+        conteos = {"insertados": 0, "duplicados": 0, "errores": 0}
+        if por_uuid:
+            operaciones = [UpdateOne({'uuid': uuid}, {'$setOnInsert': doc}, upsert=True)
+                           for uuid, doc in por_uuid.items()]
+            conteos, confirmados = escribir_lote(self.colecciones[nombre], list(por_uuid), operaciones, nombre)
+            conteos["duplicados"] += conteos["coincidentes"]
+            if self.indice is not None and confirmados:
+                self.indice.agregar(nombre, confirmados)
+
+        with self.lock:
+            estadisticas = self.estadisticas[nombre]
+            estadisticas["insertados"] += conteos["insertados"]
+            estadisticas["duplicados"] += conteos["duplicados"] + repetidos
+            estadisticas["errores"] += conteos["errores"]
+            estadisticas["conocidos"] += conocidos
+            estadisticas["lotes"] += 1
+            self.documentos += len(docs) + conocidos
+        return {"insertados": conteos["insertados"], "duplicados": conteos["duplicados"] + repetidos + conocidos,
+                "errores": conteos["errores"]}
+
+    def terminar_archivo(self, archivo, lotes, conteos, error):
+        """Registra que un parser terminó de leer un archivo"""
+        with self.lock:
+            self.archivos[archivo] = {"lotes": lotes, "conteos": conteos, "error": error}
+        if self.manifiesto is not None:
+            self.manifiesto.terminar_parseo(archivo, lotes, conteos['alertas'], conteos['atascos'], error)
+        if error:
+            print(f"Error al procesar el archivo {archivo}: {error}")
+
+    def _hilo_escritor(self, cola_lotes):
+        while True:
+            mensaje = cola_lotes.get()
+            if mensaje is None:
+                return
+            if mensaje[0] == 'lote':
+                _, archivo, numero, nombre, docs = mensaje
+                conteos = self.escribir(nombre, docs)
+                if self.manifiesto is not None and not conteos["errores"]:
+                    self.manifiesto.confirmar_lote(archivo, numero, conteos["insertados"], conteos["duplicados"])
+            else:
+                _, archivo, lotes, conteos, error = mensaje
+                self.terminar_archivo(archivo, lotes, conteos, error)
+
+    def _reportar(self, inicio, anterior):
+        """Imprime el avance y retorna (instante, documentos) para el siguiente reporte"""
+        ahora = time.monotonic()
+        with self.lock:
+            documentos = self.documentos
+            archivos = len(self.archivos)
+        instantaneo = (documentos - anterior[1]) / max(ahora - anterior[0], 1e-9)
+        promedio = documentos / max(ahora - inicio, 1e-9)
+        print(f"[{ahora - inicio:6.1f} s] {archivos} archivos, {documentos} documentos | "
+              f"{instantaneo:.0f} docs/s (promedio {promedio:.0f} docs/s)")
+        return ahora, documentos
+
+    def cargar(self, archivos_json):
+        """Carga todos los archivos y retorna la duración en segundos"""
+        inicio = time.monotonic()
+        trabajos = []
+        for archivo in archivos_json:
+            saltar = set()
+            if self.manifiesto is not None:
+                try:
+                    saltar = self.manifiesto.planificar(archivo, self.tam_lote, self.max_bytes)
+                except OSError as e:
+                    print(f"Error al leer el archivo {archivo}: {e}")
+                    continue
+                if saltar is None:
+                    self.omitidos += 1
+                    continue
+            trabajos.append((archivo, saltar))
+        if not trabajos:
+            return time.monotonic() - inicio
+
+        contexto = multiprocessing.get_context('spawn')
+        cola_archivos = contexto.Queue()
+        cola_lotes = contexto.Queue(maxsize=self.max_cola)
+        for trabajo in trabajos:
+            cola_archivos.put(trabajo)
+        for _ in range(self.procesos):
+            cola_archivos.put(None)
+
+        parsers = [contexto.Process(target=proceso_parser, args=(cola_archivos, cola_lotes, self.tam_lote, self.max_bytes),
+                                    daemon=True)
+                   for _ in range(self.procesos)]
+        escritores = [threading.Thread(target=self._hilo_escritor, args=(cola_lotes,), daemon=True)
+                      for _ in range(self.escritores)]
+        for proceso in parsers:
+            proceso.start()
+        for hilo in escritores:
+            hilo.start()
+
+        anterior = (inicio, 0)
+        for proceso in parsers:
+            while proceso.is_alive():
+                proceso.join(timeout=self.intervalo_reporte)
+                if proceso.is_alive():
+                    anterior = self._reportar(inicio, anterior)
+
+        # Los parsers terminaron: un centinela por escritor para cerrar el pipeline
+        for _ in escritores:
+            cola_lotes.put(None)
+        for hilo in escritores:
+            while hilo.is_alive():
+                hilo.join(timeout=self.intervalo_reporte)
+                if hilo.is_alive():
+                    anterior = self._reportar(inicio, anterior)
+        return time.monotonic() - inicio
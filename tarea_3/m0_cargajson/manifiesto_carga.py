@@ -0,0 +1,148 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS archivos (
+    ruta TEXT PRIMARY KEY,
+    tamano INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    tam_lote INTEGER NOT NULL,
+    max_bytes INTEGER NOT NULL DEFAULT 0,
+    estado TEXT NOT NULL,          -- 'pendiente', 'en_curso', 'completo' o 'error'
+    lotes_total INTEGER,           -- Se conoce cuando el parser termina el archivo
+    alertas INTEGER NOT NULL DEFAULT 0,
+    atascos INTEGER NOT NULL DEFAULT 0,
+    insertados INTEGER NOT NULL DEFAULT 0,
+    duplicados INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    actualizado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lotes (
+    ruta TEXT NOT NULL,
+    numero INTEGER NOT NULL,
+    PRIMARY KEY (ruta, numero)
+);
+"""
+
+def sha1_archivo(ruta):
+    h = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+class ManifiestoCarga:
+    """
+    Registro persistente (SQLite) de la carga de cada archivo: tamaño, mtime, SHA1,
+    estado, conteos y los lotes ya confirmados por MongoDB.
+
+    Un archivo se reconoce por tamaño y mtime; si alguno cambió se compara el SHA1 y
+    solo si el contenido es distinto se vuelve a cargar desde cero. Los lotes de un
+    archivo se numeran en el orden en que el parser los genera, así que al reanudar
+    (con el mismo tamaño de lote en documentos y bytes) se saltan los que ya se confirmaron.
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.executescript(ESQUEMA)
+        columnas = {fila[1] for fila in self.conexion.execute("PRAGMA table_info(archivos)")}
+        if 'max_bytes' not in columnas:
+            # Manifiestos creados antes de que los lotes pudieran cortarse por bytes
+            self.conexion.execute("ALTER TABLE archivos ADD COLUMN max_bytes INTEGER NOT NULL DEFAULT 0")
+        self.conexion.commit()
+
+    def planificar(self, archivo, tam_lote, max_bytes=0):
+        """
+        Retorna None si el archivo ya está cargado, o el conjunto de números de lote
+        ya confirmados (vacío si hay que cargarlo entero).
+        """
+        info = os.stat(archivo)
+        with self.lock:
+            fila = self.conexion.execute(
+                "SELECT tamano, mtime_ns, sha1, tam_lote, estado, max_bytes FROM archivos WHERE ruta = ?", (archivo,)
+            ).fetchone()
+        if fila is not None and fila[0] == info.st_size and fila[1] == info.st_mtime_ns:
+            sha1 = fila[2]
+        else:
+            sha1 = sha1_archivo(archivo)
+
+        with self.lock:
+            if fila is not None and fila[2] == sha1:
+                if fila[1] != info.st_mtime_ns:
+                    # Mismo contenido con otro mtime: se conserva el avance
+                    self.conexion.execute("UPDATE archivos SET mtime_ns = ? WHERE ruta = ?",
+                                          (info.st_mtime_ns, archivo))
+                    self.conexion.commit()
+                if fila[4] == 'completo':
+                    return None
+                if fila[3] == tam_lote and fila[5] == max_bytes:
+                    confirmados = {numero for (numero,) in self.conexion.execute(
+                        "SELECT numero FROM lotes WHERE ruta = ?", (archivo,))}
+                    self.conexion.execute("UPDATE archivos SET estado = 'en_curso', error = NULL, actualizado = ? "
+                                          "WHERE ruta = ?", (time.time(), archivo))
+                    self.conexion.commit()
+                    return confirmados
+
+            # Archivo nuevo, con otro contenido o con otro tamaño de lote: se carga entero
+            self.conexion.execute("DELETE FROM lotes WHERE ruta = ?", (archivo,))
+            self.conexion.execute(
+                "INSERT OR REPLACE INTO archivos (ruta, tamano, mtime_ns, sha1, tam_lote, max_bytes, estado, actualizado) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'en_curso', ?)",
+                (archivo, info.st_size, info.st_mtime_ns, sha1, tam_lote, max_bytes, time.time())
+            )
+            self.conexion.commit()
+            return set()
+
+    def _verificar_completo(self, archivo):
+        """Marca el archivo como completo si todos sus lotes están confirmados (con el lock tomado)"""
+        fila = self.conexion.execute("SELECT lotes_total, estado FROM archivos WHERE ruta = ?", (archivo,)).fetchone()
+        if fila is None or fila[0] is None or fila[1] != 'en_curso':
+            return False
+        (confirmados,) = self.conexion.execute("SELECT COUNT(*) FROM lotes WHERE ruta = ?", (archivo,)).fetchone()
+        if confirmados < fila[0]:
+            return False
+        self.conexion.execute("UPDATE archivos SET estado = 'completo', actualizado = ? WHERE ruta = ?",
+                              (time.time(), archivo))
+        self.conexion.execute("DELETE FROM lotes WHERE ruta = ?", (archivo,))
+        return True
+
+    def confirmar_lote(self, archivo, numero, insertados, duplicados):
+        """Checkpoint de un lote que MongoDB aplicó sin errores"""
+        with self.lock:
+            self.conexion.execute("INSERT OR IGNORE INTO lotes (ruta, numero) VALUES (?, ?)", (archivo, numero))
+            self.conexion.execute(
+                "UPDATE archivos SET insertados = insertados + ?, duplicados = duplicados + ?, actualizado = ? "
+                "WHERE ruta = ?", (insertados, duplicados, time.time(), archivo)
+            )
+            self._verificar_completo(archivo)
+            self.conexion.commit()
+
+    def terminar_parseo(self, archivo, lotes_total, alertas, atascos, error=None):
+        """Registra cuántos lotes tiene el archivo (o el error al parsearlo)"""
+        with self.lock:
+            if error:
+                self.conexion.execute("UPDATE archivos SET estado = 'error', error = ?, actualizado = ? WHERE ruta = ?",
+                                      (error, time.time(), archivo))
+            else:
+                self.conexion.execute(
+                    "UPDATE archivos SET lotes_total = ?, alertas = ?, atascos = ?, actualizado = ? WHERE ruta = ?",
+                    (lotes_total, alertas, atascos, time.time(), archivo)
+                )
+                self._verificar_completo(archivo)
+            self.conexion.commit()
+
+    def resumen(self):
+        """Cantidad de archivos por estado"""
+        with self.lock:
+            return dict(self.conexion.execute("SELECT estado, COUNT(*) FROM archivos GROUP BY estado").fetchall())
+
+    def cerrar(self):
+        with self.lock:
+            self.conexion.close()
@@ -0,0 +1,242 @@
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# Configuraciones desde variables de entorno
+ARCHIVO_DIRECTORIO = os.environ.get('ARCHIVO_DIRECTORIO', './jsons/archivo')  # Vacío = no archivar
+ARCHIVO_MAX_BYTES = int(os.environ.get('ARCHIVO_MAX_BYTES', 64 * 1024 * 1024))  # Tamaño máximo por segmento
+ARCHIVO_MAX_SEGUNDOS = int(os.environ.get('ARCHIVO_MAX_SEGUNDOS', 3600))  # Antigüedad máxima por segmento
+# Retención: al rotar se borran los segmentos más viejos que pasen de estos límites (0 = sin límite)
+ARCHIVO_RETENCION_BYTES = int(os.environ.get('ARCHIVO_RETENCION_BYTES', 2 * 1024 * 1024 * 1024))
+ARCHIVO_RETENCION_SEGUNDOS = int(os.environ.get('ARCHIVO_RETENCION_SEGUNDOS', 7 * 24 * 3600))
+
+NOMBRE_INDICE = 'indice.ndjson'
+NOMBRE_BARRIDOS = 'barridos.ndjson'
+
+class ArchivoRespuestas:
+    """
+    Archivo de respuestas crudas de get_waze_data en segmentos NDJSON comprimidos.
+
+    Cada registro se escribe como un miembro gzip independiente, así el segmento se
+    puede leer completo con gzip.open o se puede saltar directo a un registro con su
+    offset. Por cada registro se agrega una línea a `indice.ndjson` con el segmento,
+    offset, longitud, timestamp, barrido y celda. Los segmentos rotan por tamaño o
+    antigüedad. En `barridos.ndjson` se guardan las celdas vigentes de cada barrido.
+
+    Al rotar se borran los segmentos más viejos que `retencion_segundos` o que hagan
+    pasar el archivo de `retencion_bytes`, y se compactan el índice y los barridos.
+    """
+    def __init__(self, directorio=ARCHIVO_DIRECTORIO, max_bytes=ARCHIVO_MAX_BYTES, max_segundos=ARCHIVO_MAX_SEGUNDOS,
+                 retencion_bytes=ARCHIVO_RETENCION_BYTES, retencion_segundos=ARCHIVO_RETENCION_SEGUNDOS):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.max_segundos = max_segundos
+        self.retencion_bytes = retencion_bytes
+        self.retencion_segundos = retencion_segundos
+        self.lock = threading.Lock()
+        self.segmento = None
+        self.archivo = None
+        self.apertura = 0
+        os.makedirs(directorio, exist_ok=True)
+        self.indice = open(os.path.join(directorio, NOMBRE_INDICE), 'a', encoding='utf-8')
+        self.barridos = open(os.path.join(directorio, NOMBRE_BARRIDOS), 'a', encoding='utf-8')
+
+    def _rotar(self, ts):
+        if self.archivo is not None:
+            self.archivo.close()
+        base = datetime.fromtimestamp(ts).strftime('respuestas_%Y%m%d-%H%M%S')
+        nombre = f"{base}.ndjson.gz"
+        sufijo = 1
+        while os.path.exists(os.path.join(self.directorio, nombre)):
+            nombre = f"{base}_{sufijo}.ndjson.gz"
+            sufijo += 1
+        self.segmento = nombre
+        self.archivo = open(os.path.join(self.directorio, nombre), 'ab')
+        self.apertura = ts
+        self._aplicar_retencion(ts)
+
+    def _aplicar_retencion(self, ts):
+        """Borra los segmentos viejos (nunca el actual) y sus entradas del índice y de los barridos"""
+        if not self.retencion_bytes and not self.retencion_segundos:
+            return
+        segmentos = []
+        for ruta in glob.glob(os.path.join(self.directorio, '*.ndjson.gz')):
+            if os.path.basename(ruta) != self.segmento:
+                estado = os.stat(ruta)
+                segmentos.append((estado.st_mtime, estado.st_size, ruta))
+        segmentos.sort()
+        total = sum(tamano for _, tamano, _ in segmentos)
+        borrados = set()
+        for modificado, tamano, ruta in segmentos:
+            if not ((self.retencion_bytes and total > self.retencion_bytes)
+                    or (self.retencion_segundos and ts - modificado > self.retencion_segundos)):
+                break
+            os.remove(ruta)
+            borrados.add(os.path.basename(ruta))
+            total -= tamano
+        if borrados:
+            self._compactar(borrados)
+
+    def _compactar(self, borrados):
+        """Reescribe el índice sin los segmentos borrados y los barridos sin registros anteriores al primero que queda"""
+        entradas = [e for e in leer_indice(self.directorio) if e["segmento"] not in borrados]
+        desde = min((e["ts"] for e in entradas), default=self.apertura)
+        barridos = []
+        with open(os.path.join(self.directorio, NOMBRE_BARRIDOS), 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    if json.loads(linea)["ts"] >= desde:
+                        barridos.append(linea)
+                except (json.JSONDecodeError, KeyError):
+                    pass
+        self.indice.close()
+        self.barridos.close()
+        for nombre, lineas in ((NOMBRE_INDICE, [json.dumps(e) + '\n' for e in entradas]), (NOMBRE_BARRIDOS, barridos)):
+            ruta = os.path.join(self.directorio, nombre)
+            with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+                f.writelines(lineas)
+            os.replace(ruta + '.tmp', ruta)
+        self.indice = open(os.path.join(self.directorio, NOMBRE_INDICE), 'a', encoding='utf-8')
+        self.barridos = open(os.path.join(self.directorio, NOMBRE_BARRIDOS), 'a', encoding='utf-8')
+        print(f"Archivo: borrados {len(borrados)} segmentos por retención")
+
+    def agregar(self, data, barrido, ts=None):
+        """Archiva la respuesta cruda de una celda perteneciente al barrido indicado"""
+        ts = time.time() if ts is None else ts
+        id_celda = data.get('location_metadata', {}).get('id_celda')
+        registro = json.dumps({"ts": ts, "barrido": barrido, "celda": id_celda, "data": data},
+                              separators=(',', ':')).encode('utf-8') + b'\n'
+        comprimido = gzip.compress(registro)
+
+        with self.lock:
+            if (self.archivo is None or self.archivo.tell() + len(comprimido) > self.max_bytes
+                    or ts - self.apertura > self.max_segundos):
+                self._rotar(ts)
+            offset = self.archivo.tell()
+            self.archivo.write(comprimido)
+            self.archivo.flush()
+            self.indice.write(json.dumps({
+                "segmento": self.segmento, "offset": offset, "longitud": len(comprimido),
+                "ts": ts, "barrido": barrido, "celda": id_celda
+            }) + '\n')
+            self.indice.flush()
+
+    def registrar_barrido(self, barrido, ts, celdas_vigentes):
+        """Guarda las celdas vigentes de un barrido, incluidas las que no se consultaron"""
+        with self.lock:
+            self.barridos.write(json.dumps({"barrido": barrido, "ts": ts, "celdas": list(celdas_vigentes)}) + '\n')
+            self.barridos.flush()
+
+    def cerrar(self):
+        with self.lock:
+            if self.archivo is not None:
+                self.archivo.close()
+                self.archivo = None
+            self.indice.close()
+            self.barridos.close()
+
+def leer_indice(directorio):
+    """Entradas del índice; si no existe, se reconstruyen recorriendo los segmentos"""
+    ruta = os.path.join(directorio, NOMBRE_INDICE)
+    if os.path.exists(ruta):
+        entradas = []
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entradas.append(json.loads(linea))
+                except json.JSONDecodeError:
+                    pass  # Línea cortada por una caída a mitad de escritura
+        return entradas
+
+    entradas = []
+    for segmento in sorted(glob.glob(os.path.join(directorio, '*.ndjson.gz'))):
+        with gzip.open(segmento, 'rt', encoding='utf-8') as f:
+            for linea in f:
+                registro = json.loads(linea)
+                entradas.append({"segmento": os.path.basename(segmento), "offset": None, "longitud": None,
+                                 "ts": registro["ts"], "barrido": registro.get("barrido"),
+                                 "celda": registro.get("celda")})
+    return entradas
+
+def leer_barridos(directorio):
+    """barrido -> celdas vigentes, según `barridos.ndjson`"""
+    vigentes = {}
+    ruta = os.path.join(directorio, NOMBRE_BARRIDOS)
+    if os.path.exists(ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                    vigentes[registro["barrido"]] = registro["celdas"]
+                except json.JSONDecodeError:
+                    pass
+    return vigentes
+
+def leer_registro(directorio, entrada, archivos_abiertos):
+    """Lee un registro a partir de su entrada en el índice"""
+    segmento = entrada["segmento"]
+    if segmento not in archivos_abiertos:
+        archivos_abiertos[segmento] = open(os.path.join(directorio, segmento), 'rb')
+    archivo = archivos_abiertos[segmento]
+    if entrada["offset"] is None:
+        # Sin offsets (índice reconstruido): se busca el registro recorriendo el segmento
+        archivo.seek(0)
+        with gzip.open(archivo, 'rt', encoding='utf-8') as f:
+            for linea in f:
+                registro = json.loads(linea)
+                if registro["ts"] == entrada["ts"] and registro.get("celda") == entrada["celda"]:
+                    return registro
+        return None
+    archivo.seek(entrada["offset"])
+    return json.loads(gzip.decompress(archivo.read(entrada["longitud"])))
+
+def reproducir(directorio, velocidad=1.0, desde=None, hasta=None, celdas=None):
+    """
+    Itera los barridos archivados como (ts, [data, ...], celdas_vigentes) en orden
+    temporal. Si el barrido no quedó registrado, las celdas vigentes son las que
+    tienen respuesta.
+
+    Entre barridos se espera el tiempo original dividido por `velocidad`; con
+    velocidad 0 se reproduce lo más rápido posible. `desde` y `hasta` son
+    timestamps y `celdas` un conjunto de ids de celda para filtrar.
+    """
+    entradas = [e for e in leer_indice(directorio)
+                if (desde is None or e["ts"] >= desde) and (hasta is None or e["ts"] <= hasta)
+                and (celdas is None or e["celda"] in celdas)]
+    entradas.sort(key=lambda e: e["ts"])
+    vigentes = leer_barridos(directorio)
+
+    archivos_abiertos = {}
+    ts_anterior = None
+    inicio_real = None
+    ts_inicio = None
+    try:
+        barrido_actual, ts_barrido, datos = None, None, []
+        for entrada in entradas + [None]:
+            if entrada is None or entrada["barrido"] != barrido_actual:
+                if datos:
+                    if velocidad > 0 and ts_anterior is not None:
+                        # Espera acumulada respecto del inicio para no arrastrar errores de sleep
+                        objetivo = inicio_real + (ts_barrido - ts_inicio) / velocidad
+                        time.sleep(max(0, objetivo - time.monotonic()))
+                    if ts_anterior is None:
+                        inicio_real, ts_inicio = time.monotonic(), ts_barrido
+                    ts_anterior = ts_barrido
+                    celdas_barrido = vigentes.get(barrido_actual)
+                    if celdas_barrido is None:
+                        celdas_barrido = [d.get('location_metadata', {}).get('id_celda') for d in datos]
+                    yield ts_barrido, datos, celdas_barrido
+                if entrada is None:
+                    break
+                barrido_actual, ts_barrido, datos = entrada["barrido"], entrada["ts"], []
+
+            registro = leer_registro(directorio, entrada, archivos_abiertos)
+            if registro is not None:
+                datos.append(registro["data"])
+    finally:
+        for archivo in archivos_abiertos.values():
+            archivo.close()
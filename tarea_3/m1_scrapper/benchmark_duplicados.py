@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Compara verificar_duplicados (json.load) con verificar_duplicados_streaming (ijson)
+sobre snapshots sintéticos grandes: tiempo, memoria máxima y que los resultados coincidan.
+
+Cada medición corre en un proceso nuevo para que la memoria máxima (ru_maxrss)
+de una no contamine a la otra.
+
+Uso:
+    python benchmark_duplicados.py --celdas 2000 --alertas 200 --atascos 100
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid as uuidlib
+
+def generar_snapshot(ruta, celdas, alertas_por_celda, atascos_por_celda, fraccion_repetidos, semilla=42):
+    """Escribe un snapshot con estructura de celdas sin armarlo completo en memoria"""
+    rng = random.Random(semilla)
+    vistos_alertas, vistos_atascos = [], []
+
+    def uuid_alerta():
+        if vistos_alertas and rng.random() < fraccion_repetidos:
+            return rng.choice(vistos_alertas)
+        nuevo = str(uuidlib.UUID(int=rng.getrandbits(128)))
+        if len(vistos_alertas) < 10000:
+            vistos_alertas.append(nuevo)
+        return nuevo
+
+    def uuid_atasco():
+        if vistos_atascos and rng.random() < fraccion_repetidos:
+            return rng.choice(vistos_atascos)
+        nuevo = rng.randint(10**8, 2 * 10**9)
+        if len(vistos_atascos) < 10000:
+            vistos_atascos.append(nuevo)
+        return nuevo
+
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write('{"celdas": [')
+        for i in range(celdas):
+            alertas = [{
+                "uuid": uuid_alerta(), "type": "JAM", "subtype": "", "reportRating": 3,
+                "city": "Santiago", "street": "Calle", "location": {"x": -70.6, "y": -33.4},
+                "comments": [{"reportMillis": 1744644865000, "text": "", "isThumbsUp": True}] * 3
+            } for _ in range(alertas_por_celda)]
+            atascos = [{
+                "uuid": uuid_atasco(), "severity": 3, "city": "Santiago", "street": "Calle", "roadType": 1,
+                "line": [{"x": -70.6 + k * 1e-4, "y": -33.4} for k in range(10)]
+            } for _ in range(atascos_por_celda)]
+            if i:
+                f.write(',')
+            json.dump({"indice": i, "data": {"alerts": alertas, "jams": atascos}}, f)
+        f.write('], "metadata": {"region": "Santiago"}}')
+
+def medir(modo, ruta):
+    """Se ejecuta en un proceso hijo: mide tiempo y memoria máxima de un modo"""
+    from duplicados import verificar_duplicados, verificar_duplicados_streaming
+    funcion = verificar_duplicados_streaming if modo == 'streaming' else verificar_duplicados
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    duplicados, total_objetos, uuids_unicos, total_alertas, total_atascos = funcion(ruta)
+    duracion = time.perf_counter() - inicio
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "segundos": duracion,
+        "memoria_mb": (maximo - base) / 1024,  # ru_maxrss está en KB en Linux
+        "resultado": [len(duplicados), total_objetos, uuids_unicos, total_alertas, total_atascos],
+        "firma": sum(hash((str(k), v["conteo"], v["tipo"])) for k, v in duplicados.items()) & 0xFFFFFFFF
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de json.load vs streaming en duplicados.py")
+    parser.add_argument('--celdas', type=int, default=2000)
+    parser.add_argument('--alertas', type=int, default=200, help="Alertas por celda")
+    parser.add_argument('--atascos', type=int, default=100, help="Atascos por celda")
+    parser.add_argument('--repetidos', type=float, default=0.1, help="Fracción de UUIDs repetidos")
+    parser.add_argument('--medir', nargs=2, metavar=('MODO', 'ARCHIVO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir(*args.medir)
+        return
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'snapshot_sintetico.json')
+        print(f"Generando snapshot: {args.celdas} celdas x ({args.alertas} alertas + {args.atascos} atascos)...")
+        generar_snapshot(ruta, args.celdas, args.alertas, args.atascos, args.repetidos)
+        print(f"Tamaño del archivo: {os.path.getsize(ruta) / 1024 / 1024:.1f} MB\n")
+
+        resultados = {}
+        entorno = dict(os.environ, PYTHONHASHSEED='0')
+        for modo in ('json.load', 'streaming'):
+            salida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--medir', modo, ruta],
+                capture_output=True, text=True, check=True, env=entorno,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            resultados[modo] = json.loads(salida.stdout.strip().splitlines()[-1])
+            r = resultados[modo]
+            print(f"{modo:>10}: {r['segundos']:.2f} s | memoria máxima {r['memoria_mb']:.1f} MB | "
+                  f"{r['resultado'][0]} duplicados en {r['resultado'][1]} objetos")
+
+        iguales = (resultados['json.load']['resultado'] == resultados['streaming']['resultado']
+                   and resultados['json.load']['firma'] == resultados['streaming']['firma'])
+        print(f"\nResultados idénticos: {'sí' if iguales else 'NO'}")
+
+if __name__ == "__main__":
+    main()
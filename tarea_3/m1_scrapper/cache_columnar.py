@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Caché columnar (Parquet) de los snapshots JSON para análisis repetidos.
+
+La primera vez que se ve un snapshot se recorre como flujo (LectorSnapshot) y se
+guarda un archivo Parquet con una fila por alerta o atasco y solo los campos que
+usan json_analisis.py y duplicados.py. Los análisis siguientes leen las columnas
+que necesitan en vez de volver a decodificar el JSON.
+
+El Parquet guarda en sus metadatos el mtime, tamaño y SHA1 del snapshot. Si el
+mtime o el tamaño cambian se recalcula el SHA1, y solo si también cambió se vuelve
+a convertir el archivo.
+
+Uso:
+    python cache_columnar.py ./jsons --procesos 4
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lectura_streaming import LectorSnapshot, PRESENTE
+
+# Configuraciones desde variables de entorno
+CACHE_COLUMNAR_DIRECTORIO = os.environ.get('CACHE_COLUMNAR_DIRECTORIO', './jsons/cache_columnar')
+
+VERSION_CACHE = 1
+CLAVE_METADATOS = b'snapshot'
+
+CAMPOS_TEXTO = ("type", "subtype", "reportBy", "city", "street")
+ESQUEMA = pa.schema([
+    ("contenedor", pa.dictionary(pa.int8(), pa.string())),  # 'alerts', 'jams' o 'lista'
+    ("categoria", pa.dictionary(pa.int8(), pa.string())),   # 'alerta', 'atasco' o 'desconocido'
+    ("uuid", pa.string()),
+    ("uuid_entero", pa.bool_()),  # Los atascos tienen uuid numérico
+    ("type", pa.string()),
+    ("subtype", pa.string()),
+    ("reportBy", pa.string()),
+    ("city", pa.string()),
+    ("street", pa.string()),
+    ("location_x", pa.float64()),
+    ("location_y", pa.float64()),
+])
+
+def sha1_archivo(ruta):
+    h = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+def categoria_de_item(contenedor, valores):
+    """Tipo del item según su contenedor o, en listas directas, según sus campos"""
+    if contenedor == "jams":
+        return "atasco"
+    if contenedor == "alerts":
+        return "alerta"
+    if "roadType" in valores and "street" in valores:
+        return "atasco"
+    if "subtype" in valores and "reportRating" in valores:
+        return "alerta"
+    return "desconocido"
+
+def ruta_cache(archivo, directorio=CACHE_COLUMNAR_DIRECTORIO):
+    """Ruta del Parquet de un snapshot; incluye un hash de la ruta absoluta para no mezclar directorios"""
+    sufijo = hashlib.sha1(os.path.abspath(archivo).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(directorio, f"{os.path.basename(archivo)}.{sufijo}.parquet")
+
+def _texto(valor):
+    return None if valor is None or valor is PRESENTE else str(valor)
+
+def _numero(valor):
+    return float(valor) if isinstance(valor, (int, float)) and not isinstance(valor, bool) else None
+
+def convertir(archivo, destino, estado):
+    """Recorre el snapshot y escribe su Parquet con `estado` en los metadatos"""
+    columnas = {nombre: [] for nombre in ESQUEMA.names}
+    lector = LectorSnapshot(archivo, campos=("uuid", "roadType", "reportRating", "location.x", "location.y")
+                            + CAMPOS_TEXTO)
+    for contenedor, valores in lector:
+        if "uuid" not in valores:
+            continue
+        uuid = valores["uuid"]
+        columnas["contenedor"].append(contenedor)
+        columnas["categoria"].append(categoria_de_item(contenedor, valores))
+        columnas["uuid"].append(str(uuid))
+        columnas["uuid_entero"].append(isinstance(uuid, int) and not isinstance(uuid, bool))
+        for campo in CAMPOS_TEXTO:
+            columnas[campo].append(_texto(valores.get(campo)))
+        columnas["location_x"].append(_numero(valores.get("location.x")))
+        columnas["location_y"].append(_numero(valores.get("location.y")))
+
+    estado = dict(estado, tiene_celdas=lector.tiene_celdas, version=VERSION_CACHE)
+    tabla = pa.Table.from_pydict(columnas, schema=ESQUEMA.with_metadata({CLAVE_METADATOS: json.dumps(estado)}))
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    pq.write_table(tabla, temporal, compression='zstd')
+    os.replace(temporal, destino)
+    return estado
+
+def leer_estado(destino):
+    """Metadatos guardados en un Parquet de la caché, o None si no existe o es de otra versión"""
+    try:
+        metadatos = pq.read_schema(destino).metadata or {}
+        estado = json.loads(metadatos[CLAVE_METADATOS])
+    except (FileNotFoundError, KeyError, ValueError, pa.ArrowInvalid):
+        return None
+    return estado if estado.get("version") == VERSION_CACHE else None
+
+def asegurar_cache(archivo, directorio=CACHE_COLUMNAR_DIRECTORIO):
+    """Deja al día el Parquet del snapshot y retorna (ruta, estado, convertido)"""
+    os.makedirs(directorio, exist_ok=True)
+    destino = ruta_cache(archivo, directorio)
+    info = os.stat(archivo)
+    estado = leer_estado(destino)
+    if estado is not None and estado["mtime_ns"] == info.st_mtime_ns and estado["tamano"] == info.st_size:
+        return destino, estado, False
+
+    sha1 = sha1_archivo(archivo)
+    nuevo = {"mtime_ns": info.st_mtime_ns, "tamano": info.st_size, "sha1": sha1}
+    if estado is not None and estado["sha1"] == sha1:
+        # Mismo contenido con otro mtime (copiado o tocado): solo se actualizan los metadatos
+        tabla = pq.read_table(destino)
+        estado = dict(estado, **nuevo)
+        temporal = f"{destino}.{os.getpid()}.tmp"
+        pq.write_table(tabla.replace_schema_metadata({CLAVE_METADATOS: json.dumps(estado)}), temporal,
+                       compression='zstd')
+        os.replace(temporal, destino)
+        return destino, estado, False
+    return destino, convertir(archivo, destino, nuevo), True
+
+def leer_columnas(archivo, columnas, directorio=CACHE_COLUMNAR_DIRECTORIO):
+    """
+    Lee solo `columnas` del snapshot a través de la caché. Retorna (datos, estado) con
+    datos como {columna: lista}. La columna "uuid" se entrega con su tipo original
+    (entero para los atascos).
+    """
+    destino, estado, _ = asegurar_cache(archivo, directorio)
+    pedidas = list(columnas)
+    if "uuid" in pedidas and "uuid_entero" not in pedidas:
+        pedidas.append("uuid_entero")
+    datos = pq.read_table(destino, columns=pedidas).to_pydict()
+    if "uuid" in datos:
+        datos["uuid"] = [int(u) if entero else u for u, entero in zip(datos["uuid"], datos["uuid_entero"])]
+        if "uuid_entero" not in columnas:
+            del datos["uuid_entero"]
+    return datos, estado
+
+def _asegurar(par):
+    archivo, directorio = par
+    try:
+        return archivo, asegurar_cache(archivo, directorio)[2], None
+    except Exception as e:
+        return archivo, False, str(e)
+
+def actualizar_cache(archivos, directorio=CACHE_COLUMNAR_DIRECTORIO, procesos=None):
+    """Convierte en paralelo los snapshots que no estén en la caché o hayan cambiado"""
+    convertidos = errores = 0
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        for archivo, convertido, error in pool.map(_asegurar, [(a, directorio) for a in archivos]):
+            if error:
+                print(f"Error al convertir {archivo}: {error}")
+                errores += 1
+            elif convertido:
+                convertidos += 1
+    return convertidos, errores
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte los snapshots JSON a la caché columnar")
+    parser.add_argument('directorio', nargs='?', default="./jsons", help="Directorio con los archivos JSON")
+    parser.add_argument('--cache', default=CACHE_COLUMNAR_DIRECTORIO, help="Directorio de la caché")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos en paralelo (por defecto, núcleos)")
+    args = parser.parse_args()
+
+    archivos = sorted(glob(os.path.join(args.directorio, "*.json")))
+    if not archivos:
+        print(f"No se encontraron archivos JSON en '{args.directorio}'.")
+        return
+    convertidos, errores = actualizar_cache(archivos, args.cache, args.procesos)
+    print(f"{len(archivos)} snapshots: {convertidos} convertidos, "
+          f"{len(archivos) - convertidos - errores} ya estaban en la caché, {errores} errores")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import hashlib
+import json
+
+# Campos que agrega el scrapper y que no forman parte del contenido de Waze
+CAMPOS_PROPIOS = {'_id', 'fecha', 'region', 'zona_aproximada', 'location_metadata',
+                  'first_seen', 'last_seen', 'updated_at', 'ended_at'}
+
+def huella(item):
+    """Huella del contenido de un item de Waze, sin los campos propios del scrapper"""
+    contenido = {k: v for k, v in item.items() if k not in CAMPOS_PROPIOS}
+    serializado = json.dumps(contenido, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(serializado.encode('utf-8')).hexdigest()
+
+def items_de_respuesta(data):
+    """Itera (tipo, item) sobre las alertas y atascos con uuid de una respuesta"""
+    for alert in data.get('alerts', []):
+        if 'uuid' in alert:
+            yield 'alerta', alert
+    for jam in data.get('jams', []):
+        if 'uuid' in jam:
+            yield 'atasco', jam
+
+class DetectorCambios:
+    """
+    Guarda una huella por celda y por item entre barridos del modo daemon.
+
+    - Si la huella de una celda no cambió, no hay nada que escribir para ella.
+    - Si cambió, solo se reportan los items nuevos o con contenido distinto.
+    - Al cerrar el barrido se reportan los items que ya no aparecen en ninguna celda.
+    """
+    def __init__(self):
+        self.celdas = {}        # id_celda -> {"huella": str, "items": {(tipo, uuid): huella}}
+        self.items = {}         # (tipo, uuid) -> huella vigente
+        self.ultima_vista = {}  # (tipo, uuid) -> último instante en que se vio el item
+
+    def comparar_celda(self, id_celda, data, ahora):
+        """
+        Compara la respuesta de una celda con el barrido anterior.
+        Retorna None si la celda no cambió, o la lista de (tipo, item) nuevos o modificados.
+        """
+        items_celda = {}
+        objetos = {}
+        for tipo, item in items_de_respuesta(data):
+            clave = (tipo, item['uuid'])
+            items_celda[clave] = huella(item)
+            objetos[clave] = item
+            self.ultima_vista[clave] = ahora
+
+        huella_celda = hashlib.sha1(
+            ''.join(sorted(f"{t}:{u}:{h}" for (t, u), h in items_celda.items())).encode('utf-8')
+        ).hexdigest()
+
+        anterior = self.celdas.get(id_celda)
+        self.celdas[id_celda] = {"huella": huella_celda, "items": items_celda}
+        if anterior is not None and anterior["huella"] == huella_celda:
+            return None
+
+        cambios = []
+        for clave, huella_item in items_celda.items():
+            if self.items.get(clave) != huella_item:
+                self.items[clave] = huella_item
+                cambios.append((clave[0], objetos[clave]))
+        return cambios
+
+    def finalizar_barrido(self, celdas_vigentes):
+        """
+        Descarta el estado de celdas que ya no existen (por división o unión en la
+        cuadrícula adaptativa) y retorna [(tipo, uuid, ultima_vista)] de los items
+        que desaparecieron de todas las celdas.
+        """
+        vigentes = set(celdas_vigentes)
+        sin_consultar = [c for c in vigentes if c not in self.celdas]
+        for id_celda in list(self.celdas):
+            if id_celda in vigentes:
+                continue
+            # Se conserva mientras su reemplazo (hijas o padre) no haya sido consultado
+            relacionadas = [c for c in sin_consultar
+                            if c.startswith(id_celda + '.') or id_celda.startswith(c + '.')]
+            if not relacionadas:
+                del self.celdas[id_celda]
+
+        presentes = set()
+        for estado in self.celdas.values():
+            presentes.update(estado["items"])
+
+        terminados = []
+        for clave in list(self.items):
+            if clave not in presentes:
+                terminados.append((clave[0], clave[1], self.ultima_vista.pop(clave, None)))
+                del self.items[clave]
+        return terminados
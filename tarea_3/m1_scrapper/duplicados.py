@@ -1,6 +1,17 @@
+import argparse
 import json
 import os
+import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+
+import ijson
+
+from cache_columnar import CACHE_COLUMNAR_DIRECTORIO, categoria_de_item, leer_columnas
+from lectura_streaming import LectorSnapshot
+from sketches import ResumenUUIDs, mostrar_resumen
 
 def verificar_duplicados(archivo_json):
     """
@@ -100,6 +111,111 @@ def verificar_duplicados(archivo_json):
         print(f"Error al procesar el archivo: {str(e)}")
         return {}, 0, 0, 0, 0
 
+def verificar_duplicados_streaming(archivo_json):
+    """
+    Igual que verificar_duplicados, pero recorre el archivo como flujo de eventos
+    en vez de cargarlo completo. La memoria depende de la cantidad de UUIDs
+    distintos y no del tamaño del archivo.
+    
+    Retorna:
+    tuple: (duplicados, total_objetos, uuids_unicos, total_alertas, total_atascos)
+    """
+    try:
+        conteo_uuids = defaultdict(int)
+        tipo_uuid = {}
+        duplicados = {}
+        total_objetos = 0
+        total_alertas = 0
+        total_atascos = 0
+        
+        lector = LectorSnapshot(archivo_json, campos=("uuid", "roadType", "street", "subtype", "reportRating"))
+        for contenedor, valores in lector:
+            if "uuid" not in valores:
+                continue
+            uuid = valores["uuid"]
+            conteo_uuids[uuid] += 1
+            total_objetos += 1
+            
+            if contenedor == "jams":
+                tipo = "atasco"
+                total_atascos += 1
+            elif contenedor == "alerts":
+                tipo = "alerta"
+                total_alertas += 1
+            else:
+                # Lista directa de objetos: el tipo se deduce de los campos presentes
+                if "roadType" in valores and "street" in valores:
+                    tipo = "atasco"
+                    total_atascos += 1
+                elif "subtype" in valores and "reportRating" in valores:
+                    tipo = "alerta"
+                    total_alertas += 1
+                else:
+                    tipo = "desconocido"
+                
+                if uuid not in tipo_uuid:
+                    tipo_uuid[uuid] = tipo
+                elif tipo_uuid[uuid] != tipo and tipo != "desconocido":
+                    tipo_uuid[uuid] = "mixto"
+                continue
+            
+            if uuid not in tipo_uuid:
+                tipo_uuid[uuid] = tipo
+            elif tipo_uuid[uuid] != tipo:
+                tipo_uuid[uuid] = "mixto"  # UUID existe en ambos tipos
+        
+        # Filtrar solo los UUIDs duplicados
+        for uuid, conteo in conteo_uuids.items():
+            if conteo > 1:
+                duplicados[uuid] = {
+                    "conteo": conteo,
+                    "tipo": tipo_uuid[uuid]
+                }
+        
+        return duplicados, total_objetos, len(conteo_uuids), total_alertas, total_atascos
+    
+    except FileNotFoundError:
+        print(f"Error: El archivo '{archivo_json}' no existe.")
+        return {}, 0, 0, 0, 0
+    except ijson.JSONError:
+        print(f"Error: El archivo '{archivo_json}' no tiene un formato JSON válido.")
+        return {}, 0, 0, 0, 0
+    except Exception as e:
+        print(f"Error al procesar el archivo: {str(e)}")
+        return {}, 0, 0, 0, 0
+
+def verificar_duplicados_cache(archivo_json, cache=CACHE_COLUMNAR_DIRECTORIO):
+    """
+    Igual que verificar_duplicados, pero lee las columnas uuid y categoria de la
+    caché columnar (convirtiendo el snapshot la primera vez que se ve).
+    
+    Retorna:
+    tuple: (duplicados, total_objetos, uuids_unicos, total_alertas, total_atascos)
+    """
+    try:
+        conteo_uuids = defaultdict(int)
+        conteo_tipos = defaultdict(int)
+        tipo_uuid = {}
+        for uuid, tipo in iterar_tipos(archivo_json, cache):
+            conteo_uuids[uuid] += 1
+            conteo_tipos[tipo] += 1
+            tipo_uuid[uuid] = combinar_tipos(tipo_uuid[uuid], tipo) if uuid in tipo_uuid else tipo
+        
+        duplicados = {uuid: {"conteo": conteo, "tipo": tipo_uuid[uuid]}
+                      for uuid, conteo in conteo_uuids.items() if conteo > 1}
+        return (duplicados, sum(conteo_tipos.values()), len(conteo_uuids),
+                conteo_tipos["alerta"], conteo_tipos["atasco"])
+    
+    except FileNotFoundError:
+        print(f"Error: El archivo '{archivo_json}' no existe.")
+        return {}, 0, 0, 0, 0
+    except ijson.JSONError:
+        print(f"Error: El archivo '{archivo_json}' no tiene un formato JSON válido.")
+        return {}, 0, 0, 0, 0
+    except Exception as e:
+        print(f"Error al procesar el archivo: {str(e)}")
+        return {}, 0, 0, 0, 0
+
 def mostrar_resultados(archivo, duplicados, total_objetos, uuids_unicos, total_alertas, total_atascos):
     """Muestra los resultados del análisis de un archivo"""
     nombre_archivo = os.path.basename(archivo)
@@ -148,9 +264,205 @@ def mostrar_resultados(archivo, duplicados, total_objetos, uuids_unicos, total_a
         print(f"Total de objetos analizados: {total_objetos} ({total_alertas} alertas, {total_atascos} atascos)")
         print(f"UUIDs únicos: {uuids_unicos}")
 
+# ---- Duplicados globales entre archivos ----
+
+PATRON_FECHA_ARCHIVO = re.compile(r'(\d{8}-\d{6})')
+
+def fecha_snapshot(archivo):
+    """Fecha del snapshot según su nombre (waze_santiago_AAAAMMDD-HHMMSS.json) o su mtime"""
+    coincidencia = PATRON_FECHA_ARCHIVO.search(os.path.basename(archivo))
+    if coincidencia:
+        try:
+            return datetime.strptime(coincidencia.group(1), "%Y%m%d-%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(archivo)).strftime("%Y-%m-%d %H:%M:%S")
+
+def combinar_tipos(tipo_a, tipo_b):
+    """
+    Tipo resultante de ver un UUID como tipo_a y después como tipo_b, con la misma
+    regla que verificar_duplicados: un tipo conocido distinto del primero (incluso
+    si el primero era desconocido) lo vuelve mixto.
+    """
+    if tipo_a == tipo_b or tipo_b == "desconocido":
+        return tipo_a
+    return "mixto"
+
+def iterar_tipos(archivo, cache=None):
+    """
+    Itera (uuid, tipo) de los items con uuid de un snapshot. Con `cache` (directorio
+    de la caché columnar) se leen solo las columnas necesarias del Parquet.
+    """
+    if cache:
+        datos, _ = leer_columnas(archivo, ("uuid", "categoria"), cache)
+        yield from zip(datos["uuid"], datos["categoria"])
+        return
+    lector = LectorSnapshot(archivo, campos=("uuid", "roadType", "street", "subtype", "reportRating"))
+    for contenedor, valores in lector:
+        if "uuid" in valores:
+            yield valores["uuid"], categoria_de_item(contenedor, valores)
+
+def conteo_parcial(archivos, cache=None):
+    """
+    Cuenta los UUIDs de un grupo de archivos (se ejecuta en un proceso del pool).
+    
+    Retorna {uuid: (apariciones, tipo, archivos, primera_vez, ultima_vez)}
+    """
+    parcial = {}
+    for archivo in archivos:
+        fecha = fecha_snapshot(archivo)
+        del_archivo = {}
+        try:
+            for uuid, tipo in iterar_tipos(archivo, cache):
+                if uuid in del_archivo:
+                    apariciones, tipo_previo = del_archivo[uuid]
+                    del_archivo[uuid] = (apariciones + 1, combinar_tipos(tipo_previo, tipo))
+                else:
+                    del_archivo[uuid] = (1, tipo)
+        except Exception as e:
+            print(f"Error al procesar el archivo '{archivo}': {e}")
+            continue
+        
+        for uuid, (apariciones, tipo) in del_archivo.items():
+            previo = parcial.get(uuid)
+            if previo is None:
+                parcial[uuid] = (apariciones, tipo, 1, fecha, fecha)
+            else:
+                parcial[uuid] = (previo[0] + apariciones, combinar_tipos(previo[1], tipo), previo[2] + 1,
+                                 min(previo[3], fecha), max(previo[4], fecha))
+    return parcial
+
+def fusionar_parciales(par):
+    """
+    Fusiona dos conteos parciales (a de archivos anteriores a los de b), recorriendo
+    el más chico. combinar_tipos depende del orden, así que si se recorre a se combina
+    al revés para que el tipo siga el orden de los archivos.
+    """
+    a, b = par
+    invertido = len(a) < len(b)
+    if invertido:
+        a, b = b, a
+    for uuid, (apariciones, tipo, archivos, primera, ultima) in b.items():
+        previo = a.get(uuid)
+        if previo is None:
+            a[uuid] = (apariciones, tipo, archivos, primera, ultima)
+        else:
+            tipo_combinado = combinar_tipos(tipo, previo[1]) if invertido else combinar_tipos(previo[1], tipo)
+            a[uuid] = (previo[0] + apariciones, tipo_combinado, previo[2] + archivos,
+                       min(previo[3], primera), max(previo[4], ultima))
+    return a
+
+def duplicados_globales(archivos_json, procesos=None, tam_grupo=None, cache=None):
+    """
+    Cuenta los UUIDs de todos los archivos en un pool de procesos. Cada tarea procesa
+    un grupo de archivos y los parciales se fusionan por pares (reducción en árbol),
+    también en el pool, hasta quedar uno solo.
+    
+    Retorna {uuid: (apariciones, tipo, archivos, primera_vez, ultima_vez)}
+    """
+    procesos = procesos or os.cpu_count() or 1
+    if tam_grupo is None:
+        # Unas cuatro tareas por proceso para balancear archivos de distinto tamaño
+        tam_grupo = max(1, len(archivos_json) // (procesos * 4))
+    grupos = [archivos_json[i:i + tam_grupo] for i in range(0, len(archivos_json), tam_grupo)]
+    
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        parciales = list(pool.map(partial(conteo_parcial, cache=cache), grupos))
+        while len(parciales) > 1:
+            pares = [(parciales[i], parciales[i + 1]) for i in range(0, len(parciales) - 1, 2)]
+            sobrante = [parciales[-1]] if len(parciales) % 2 else []
+            parciales = list(pool.map(fusionar_parciales, pares)) + sobrante
+    
+    return parciales[0] if parciales else {}
+
+def mostrar_globales(conteo, total_archivos, limite=20):
+    """Muestra los UUIDs que aparecen en más de un archivo"""
+    repetidos = [(uuid, datos) for uuid, datos in conteo.items() if datos[2] > 1]
+    repetidos.sort(key=lambda x: (x[1][2], x[1][0]), reverse=True)
+    
+    por_tipo = defaultdict(int)
+    for uuid, datos in repetidos:
+        por_tipo[datos[1]] += 1
+    
+    print(f"\n{'=' * 60}")
+    print("DUPLICADOS GLOBALES ENTRE ARCHIVOS:")
+    print(f"Total de archivos analizados: {total_archivos}")
+    print(f"UUIDs distintos: {len(conteo)}")
+    porcentaje = (len(repetidos) / len(conteo)) * 100 if conteo else 0
+    print(f"UUIDs presentes en más de un archivo: {len(repetidos)} ({porcentaje:.2f}%)")
+    for tipo, cantidad in sorted(por_tipo.items()):
+        print(f"  - {tipo}: {cantidad}")
+    
+    if repetidos:
+        print(f"\n--- {min(limite, len(repetidos))} UUIDs presentes en más archivos ---")
+        for uuid, (apariciones, tipo, archivos, primera, ultima) in repetidos[:limite]:
+            print(f"UUID: {uuid} ({tipo}) - {archivos} archivos, {apariciones} apariciones, "
+                  f"visto entre {primera} y {ultima}")
+    print(f"{'=' * 60}")
+
+def guardar_reporte_global(conteo, ruta):
+    """Guarda en JSON los UUIDs presentes en más de un archivo"""
+    reporte = [
+        {"uuid": uuid, "tipo": tipo, "archivos": archivos, "apariciones": apariciones,
+         "primera_vez": primera, "ultima_vez": ultima}
+        for uuid, (apariciones, tipo, archivos, primera, ultima) in conteo.items() if archivos > 1
+    ]
+    reporte.sort(key=lambda r: (r["archivos"], r["apariciones"]), reverse=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+    print(f"Reporte global guardado en {ruta}")
+
+# ---- Resumen aproximado con sketches ----
+
+def actualizar_resumen(resumen, archivos_json, cache=None):
+    """
+    Agrega al resumen los archivos que aún no contiene, en una sola pasada por
+    archivo y con memoria fija (no depende de la cantidad de UUIDs distintos).
+    
+    Retorna la cantidad de archivos nuevos procesados.
+    """
+    nuevos = 0
+    for archivo in archivos_json:
+        nombre = os.path.basename(archivo)
+        if nombre in resumen.archivos:
+            continue
+        try:
+            for uuid, tipo in iterar_tipos(archivo, cache):
+                resumen.agregar(uuid, tipo)
+        except Exception as e:
+            print(f"Error al procesar el archivo '{archivo}': {e}")
+            continue
+        resumen.archivos.add(nombre)
+        nuevos += 1
+    return nuevos
+
 def main():
+    parser = argparse.ArgumentParser(description="Busca UUIDs duplicados en snapshots de Waze")
+    parser.add_argument('directorio', nargs='?', default="./jsons", help="Directorio con los archivos JSON")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Recorrer los archivos como flujo, con memoria acotada por UUIDs distintos")
+    parser.add_argument('--global', dest='modo_global', action='store_true',
+                        help="Buscar UUIDs repetidos entre archivos usando un pool de procesos")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos del pool (por defecto, núcleos)")
+    parser.add_argument('--reporte', default=None, help="Archivo JSON para el reporte de duplicados globales")
+    parser.add_argument('--cache', nargs='?', const=CACHE_COLUMNAR_DIRECTORIO, default=None, metavar='DIRECTORIO',
+                        help="Leer los snapshots desde la caché columnar (Parquet), convirtiéndolos la primera vez")
+    parser.add_argument('--sketch', default=None, metavar='RUTA',
+                        help="Acumular un resumen aproximado (HyperLogLog, Space-Saving y Bloom) en RUTA")
+    parser.add_argument('--error-hll', type=float, default=0.01, help="Error relativo objetivo del HyperLogLog")
+    parser.add_argument('--top-k', type=int, default=1000, help="Contadores del resumen de UUIDs más repetidos")
+    parser.add_argument('--capacidad-bloom', type=int, default=2_000_000, help="UUIDs esperados en el filtro de Bloom")
+    parser.add_argument('--fp-bloom', type=float, default=0.01, help="Tasa de falsos positivos del filtro de Bloom")
+    args = parser.parse_args()
+    if args.cache:
+        verificar = partial(verificar_duplicados_cache, cache=args.cache)
+    elif args.streaming:
+        verificar = verificar_duplicados_streaming
+    else:
+        verificar = verificar_duplicados
+    
     # Directorio donde buscar archivos JSON
-    json_dir = "./jsons"
+    json_dir = args.directorio
     
     # Verificar si el directorio existe
     if not os.path.isdir(json_dir):
@@ -167,13 +479,31 @@ def main():
     
     print(f"Se encontraron {len(archivos_json)} archivos JSON para analizar.")
     
+    if args.sketch:
+        if os.path.exists(args.sketch):
+            resumen = ResumenUUIDs.cargar(args.sketch)
+        else:
+            resumen = ResumenUUIDs(args.error_hll, args.top_k, args.capacidad_bloom, args.fp_bloom)
+        nuevos = actualizar_resumen(resumen, sorted(archivos_json), args.cache)
+        print(f"Archivos nuevos agregados al resumen: {nuevos}")
+        resumen.guardar(args.sketch)
+        mostrar_resumen(resumen)
+        return
+    
+    if args.modo_global:
+        conteo = duplicados_globales(sorted(archivos_json), args.procesos, cache=args.cache)
+        mostrar_globales(conteo, len(archivos_json))
+        if args.reporte:
+            guardar_reporte_global(conteo, args.reporte)
+        return
+    
     # Estadísticas globales
     total_archivos_con_duplicados = 0
     total_duplicados_encontrados = 0
     
     # Procesar cada archivo JSON
     for archivo in archivos_json:
-        duplicados, total_objetos, uuids_unicos, total_alertas, total_atascos = verificar_duplicados(archivo)
+        duplicados, total_objetos, uuids_unicos, total_alertas, total_atascos = verificar(archivo)
         
         # Mostrar resultados de este archivo
         mostrar_resultados(archivo, duplicados, total_objetos, uuids_unicos, total_alertas, total_atascos)
@@ -0,0 +1,243 @@
+import json
+import os
+
+# Configuraciones desde variables de entorno
+GRILLA_ESTADO = os.environ.get('GRILLA_ESTADO', './jsons/densidad_grilla.json')
+GRILLA_PRESUPUESTO = int(os.environ.get('GRILLA_PRESUPUESTO', 32))  # Peticiones por barrido
+GRILLA_LIMITE_RESULTADOS = int(os.environ.get('GRILLA_LIMITE_RESULTADOS', 200))  # Tope de items por bbox de la API
+GRILLA_FRACCION_SATURACION = float(os.environ.get('GRILLA_FRACCION_SATURACION', 0.9))
+GRILLA_BARRIDOS_VACIOS = int(os.environ.get('GRILLA_BARRIDOS_VACIOS', 3))  # Barridos vacíos antes de dormir una celda
+GRILLA_SONDEO_CADA = int(os.environ.get('GRILLA_SONDEO_CADA', 6))  # Cada cuántos barridos se sondea una celda dormida
+GRILLA_PROFUNDIDAD_MAX = int(os.environ.get('GRILLA_PROFUNDIDAD_MAX', 4))
+
+class GrillaAdaptativa:
+    """
+    Cuadrícula adaptativa tipo quadtree sobre la cuadrícula base del scrapper.
+
+    Cada celda se identifica por el índice de su celda base y el camino de
+    cuadrantes hasta ella ("12", "12.0", "12.0.3", ...). Los cuadrantes son
+    0 = noroeste, 1 = noreste, 2 = suroeste y 3 = sureste.
+
+    - Una celda cuya respuesta está cerca del tope de resultados se divide en cuatro.
+    - Una celda vacía durante varios barridos se duerme y solo se sondea de vez en cuando.
+    - Cuatro hermanas dormidas se vuelven a unir en su celda padre.
+    - La densidad de cada celda se guarda en un archivo JSON entre ejecuciones.
+
+    Las celdas a consultar en cada barrido se priorizan por densidad y antigüedad
+    y se recortan al presupuesto de peticiones.
+    """
+    def __init__(self, generar_base, total_base, ruta_estado=GRILLA_ESTADO, presupuesto=GRILLA_PRESUPUESTO,
+                 limite_resultados=GRILLA_LIMITE_RESULTADOS, fraccion_saturacion=GRILLA_FRACCION_SATURACION,
+                 barridos_vacios=GRILLA_BARRIDOS_VACIOS, sondeo_cada=GRILLA_SONDEO_CADA,
+                 profundidad_max=GRILLA_PROFUNDIDAD_MAX):
+        self.generar_base = generar_base
+        self.total_base = total_base
+        self.ruta_estado = ruta_estado
+        self.presupuesto = presupuesto
+        self.umbral_saturacion = limite_resultados * fraccion_saturacion
+        self.barridos_vacios = barridos_vacios
+        self.sondeo_cada = sondeo_cada
+        self.profundidad_max = profundidad_max
+
+        self.barrido = 0
+        self.hojas = [str(i) for i in range(total_base)]
+        self.celdas = {}
+        self.cargar()
+
+    # ---- Persistencia ----
+
+    def cargar(self):
+        """Carga el mapa de densidad de una ejecución anterior, si existe"""
+        if not self.ruta_estado or not os.path.exists(self.ruta_estado):
+            return
+        try:
+            with open(self.ruta_estado, 'r', encoding='utf-8') as f:
+                estado = json.load(f)
+            if estado.get('total_base') != self.total_base:
+                print("Advertencia: el mapa de densidad es de otra cuadrícula base, se ignora")
+                return
+            self.barrido = estado.get('barrido', 0)
+            self.hojas = estado.get('hojas', self.hojas)
+            self.celdas = estado.get('celdas', {})
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Advertencia: no se pudo leer el mapa de densidad ({e}), se parte de cero")
+
+    def guardar(self):
+        """Guarda el mapa de densidad de forma atómica"""
+        if not self.ruta_estado:
+            return
+        directorio = os.path.dirname(self.ruta_estado)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        temporal = self.ruta_estado + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({
+                'total_base': self.total_base,
+                'barrido': self.barrido,
+                'hojas': self.hojas,
+                'celdas': self.celdas
+            }, f)
+        os.replace(temporal, self.ruta_estado)
+
+    # ---- Geometría ----
+
+    def parametros(self, id_celda):
+        """Coordenadas de una celda en el formato que espera get_waze_data"""
+        partes = id_celda.split('.')
+        base = self.generar_base(int(partes[0]), self.total_base)
+        top, bottom, left, right = base['top'], base['bottom'], base['left'], base['right']
+
+        for cuadrante in partes[1:]:
+            cuadrante = int(cuadrante)
+            lat_media = (top + bottom) / 2
+            lon_media = (left + right) / 2
+            if cuadrante in (0, 1):
+                bottom = lat_media
+            else:
+                top = lat_media
+            if cuadrante in (0, 2):
+                right = lon_media
+            else:
+                left = lon_media
+
+        coords = dict(base)
+        coords.update({
+            "top": top, "bottom": bottom, "left": left, "right": right,
+            "zona_aproximada": f"Celda {id_celda}" if len(partes) > 1 else base['zona_aproximada'],
+            "id_celda": id_celda,
+            "grid_size": f"{base['grid_size']} adaptativa"
+        })
+        return coords
+
+    @staticmethod
+    def profundidad(id_celda):
+        return id_celda.count('.')
+
+    @staticmethod
+    def padre(id_celda):
+        return id_celda.rsplit('.', 1)[0] if '.' in id_celda else None
+
+    @staticmethod
+    def hijas(id_celda):
+        return [f"{id_celda}.{q}" for q in range(4)]
+
+    # ---- Planificación ----
+
+    def info(self, id_celda):
+        return self.celdas.setdefault(id_celda, {
+            "densidad": None, "ultimo_conteo": None, "vacios": 0, "ultimo_barrido": None
+        })
+
+    def dormida(self, id_celda):
+        return self.info(id_celda)["vacios"] >= self.barridos_vacios
+
+    def prioridad(self, id_celda):
+        info = self.info(id_celda)
+        if info["ultimo_barrido"] is None:
+            return float('inf')  # Nunca consultada
+        antiguedad = max(1, self.barrido - info["ultimo_barrido"])
+        return ((info["densidad"] or 0) + 1) * antiguedad
+
+    def planificar(self):
+        """Celdas a consultar en el próximo barrido, recortadas al presupuesto"""
+        self.barrido += 1
+        candidatas = []
+        for id_celda in self.hojas:
+            info = self.info(id_celda)
+            if self.dormida(id_celda) and self.barrido - (info["ultimo_barrido"] or 0) < self.sondeo_cada:
+                continue
+            candidatas.append(id_celda)
+        candidatas.sort(key=self.prioridad, reverse=True)
+        return [self.parametros(id_celda) for id_celda in candidatas[:self.presupuesto]]
+
+    # ---- Actualización ----
+
+    def registrar(self, id_celda, data):
+        """
+        Actualiza la densidad de la celda con su respuesta. Si la respuesta está
+        cerca del tope de resultados y se puede dividir, reemplaza la hoja por sus
+        cuatro hijas y las retorna; si no, retorna una lista vacía.
+        """
+        info = self.info(id_celda)
+        num_alertas = len(data.get('alerts', []))
+        num_atascos = len(data.get('jams', []))
+        conteo = num_alertas + num_atascos
+
+        info["densidad"] = conteo if info["densidad"] is None else 0.5 * info["densidad"] + 0.5 * conteo
+        info["ultimo_conteo"] = conteo
+        info["vacios"] = info["vacios"] + 1 if conteo == 0 else 0
+        info["ultimo_barrido"] = self.barrido
+
+        saturada = max(num_alertas, num_atascos) >= self.umbral_saturacion
+        if not saturada or self.profundidad(id_celda) >= self.profundidad_max or id_celda not in self.hojas:
+            return []
+
+        hijas = self.hijas(id_celda)
+        posicion = self.hojas.index(id_celda)
+        self.hojas[posicion:posicion + 1] = hijas
+        for hija in hijas:
+            self.celdas[hija] = {
+                "densidad": info["densidad"] / 4, "ultimo_conteo": None, "vacios": 0, "ultimo_barrido": None
+            }
+        return hijas
+
+    def consolidar(self):
+        """Une en su padre los grupos de cuatro hermanas que están todas dormidas"""
+        unidas = 0
+        cambio = True
+        while cambio:
+            cambio = False
+            hojas = set(self.hojas)
+            for id_celda in list(self.hojas):
+                padre = self.padre(id_celda)
+                if padre is None or id_celda not in hojas:
+                    continue
+                hermanas = self.hijas(padre)
+                if all(h in hojas and self.dormida(h) for h in hermanas):
+                    posicion = self.hojas.index(hermanas[0])
+                    self.hojas = [h for h in self.hojas if h not in hermanas]
+                    self.hojas.insert(posicion, padre)
+                    self.celdas[padre] = {
+                        "densidad": 0, "ultimo_conteo": 0, "vacios": self.barridos_vacios,
+                        "ultimo_barrido": max(self.info(h)["ultimo_barrido"] or 0 for h in hermanas)
+                    }
+                    for h in hermanas:
+                        self.celdas.pop(h, None)
+                    unidas += 1
+                    cambio = True
+                    break
+        return unidas
+
+    def barrer(self, consultar):
+        """
+        Ejecuta un barrido completo. `consultar` recibe una lista de coordenadas y
+        retorna [(coords, data)]. Las celdas que se saturan se refinan dentro del
+        mismo barrido con el presupuesto que dejaron libre las celdas dormidas.
+        Retorna todas las respuestas obtenidas.
+        """
+        plan = self.planificar()
+        restante = self.presupuesto - len(plan)
+        respuestas = []
+
+        while plan:
+            pendientes = []
+            for coords, data in consultar(plan):
+                respuestas.append((coords, data))
+                if data:
+                    pendientes.extend(self.registrar(coords['id_celda'], data))
+
+            plan = [self.parametros(id_celda) for id_celda in pendientes[:max(0, restante)]]
+            restante -= len(plan)
+
+        self.consolidar()
+        self.guardar()
+        return respuestas
+
+    def resumen(self):
+        dormidas = sum(1 for h in self.hojas if self.dormida(h))
+        return {
+            "barrido": self.barrido,
+            "hojas": len(self.hojas),
+            "dormidas": dormidas,
+            "profundidad_max": max((self.profundidad(h) for h in self.hojas), default=0)
+        }
@@ -1,15 +1,94 @@
 #!/usr/bin/env python3
 
+import argparse
 import json
 import os
 from glob import glob
 from collections import Counter, defaultdict
 
-def analyze_jsons(directory=None):
+import ijson
+
+from cache_columnar import CACHE_COLUMNAR_DIRECTORIO, leer_columnas
+from lectura_streaming import LectorSnapshot
+from sketches import ResumenUUIDs, mostrar_resumen
+
+CAMPOS_INFO = ("subtype", "type", "reportBy", "city")
+
+def alertas_de_archivo(json_file, streaming=False, cache=None):
+    """
+    Retorna las alertas con uuid de un snapshot (en modo streaming o desde la caché
+    columnar, solo con uuid y CAMPOS_INFO), o None si el archivo no tiene el campo "celdas".
+    """
+    if cache:
+        datos, estado = leer_columnas(json_file, ("contenedor", "uuid") + CAMPOS_INFO, cache)
+        if not estado["tiene_celdas"]:
+            return None
+        columnas = ("uuid",) + CAMPOS_INFO
+        return [{campo: valor for campo, valor in zip(columnas, fila) if valor is not None}
+                for contenedor, *fila in zip(datos["contenedor"], *(datos[c] for c in columnas))
+                if contenedor == "alerts"]
+    
+    if streaming:
+        lector = LectorSnapshot(json_file, campos=("uuid",) + CAMPOS_INFO)
+        alertas = [valores for contenedor, valores in lector if contenedor == "alerts" and "uuid" in valores]
+        return alertas if lector.tiene_celdas else None
+    
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    # Verificar si existe el campo "celdas"
+    if "celdas" not in data:
+        return None
+    
+    alertas = []
+    # Recorrer cada elemento en "celdas"
+    for celda in data["celdas"]:
+        # Verificar si existe el campo "data" y el campo "alerts" en "data"
+        if "data" not in celda or "alerts" not in celda["data"]:
+            continue
+        for alert in celda["data"]["alerts"]:
+            if "uuid" in alert:
+                alertas.append(alert)
+    return alertas
+
+def resumir_jsons(json_files, resumen, streaming=False, cache=None):
+    """
+    Agrega al resumen aproximado los UUIDs de alertas de los archivos que aún no
+    contiene, con memoria fija (no guarda la lista de UUIDs ni su información).
+    
+    Retorna la cantidad de archivos nuevos procesados.
+    """
+    nuevos = 0
+    for json_file in json_files:
+        nombre = os.path.basename(json_file)
+        if nombre in resumen.archivos:
+            continue
+        try:
+            alertas = alertas_de_archivo(json_file, streaming, cache)
+            if alertas is None:
+                print(f"Advertencia: El archivo {json_file} no contiene el campo 'celdas'.")
+                continue
+            for alert in alertas:
+                resumen.agregar(alert["uuid"], "alerta")
+        except (json.JSONDecodeError, ijson.JSONError):
+            print(f"Error: El archivo {json_file} no es un JSON válido.")
+            continue
+        except Exception as e:
+            print(f"Error al procesar {json_file}: {str(e)}")
+            continue
+        resumen.archivos.add(nombre)
+        nuevos += 1
+    return nuevos
+
+def analyze_jsons(directory=None, streaming=False, cache=None, resumen=None):
     """
     Analiza archivos JSON en el directorio especificado, recorre el campo "celdas",
     extrae los UUIDs de los campos "alerts" y cuenta UUIDs repetidos.
     Muestra información adicional (subtype, type, reportby, city) para cada UUID repetido.
+    Con streaming=True los archivos se recorren como flujo en vez de cargarse completos,
+    y con `cache` (directorio) se leen solo las columnas necesarias de la caché columnar.
+    Con `resumen` (un ResumenUUIDs) no se cuentan los UUIDs exactos: se acumulan en el
+    resumen aproximado y se retorna la estimación de apariciones repetidas.
     """
     # Definir la ruta al directorio jsons
     if directory is None:
@@ -27,48 +106,40 @@ def analyze_jsons(directory=None):
         print(f"No se encontraron archivos JSON en el directorio '{directory}'.")
         return
     
+    if resumen is not None:
+        nuevos = resumir_jsons(sorted(json_files), resumen, streaming, cache)
+        print(f"Archivos nuevos agregados al resumen: {nuevos}")
+        mostrar_resumen(resumen)
+        return resumen.reporte()["apariciones_repetidas_aprox"]
+    
     all_uuids = []
     uuid_info = defaultdict(list)  # Para almacenar la información adicional de cada UUID
     
     # Procesar cada archivo JSON
     for json_file in json_files:
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Verificar si existe el campo "celdas"
-            if "celdas" not in data:
+            alertas = alertas_de_archivo(json_file, streaming, cache)
+            if alertas is None:
                 print(f"Advertencia: El archivo {json_file} no contiene el campo 'celdas'.")
                 continue
             
-            # Recorrer cada elemento en "celdas"
-            for celda in data["celdas"]:
-                # Verificar si existe el campo "data"
-                if "data" not in celda:
-                    continue
+            # Extraer los UUIDs y la información adicional de "alerts"
+            for alert in alertas:
+                uuid = alert["uuid"]
+                all_uuids.append(uuid)
                 
-                # Verificar si existe el campo "alerts" en "data"
-                if "alerts" not in celda["data"]:
-                    continue
+                # Extraer información adicional
+                info = {
+                    "subtype": alert.get("subtype", "N/A"),
+                    "type": alert.get("type", "N/A"),
+                    "reportby": alert.get("reportBy", "N/A"),
+                    "city": alert.get("city", "N/A"),
+                    "file": os.path.basename(json_file)
+                }
                 
-                # Extraer los UUIDs y la información adicional de "alerts"
-                for alert in celda["data"]["alerts"]:
-                    if "uuid" in alert:
-                        uuid = alert["uuid"]
-                        all_uuids.append(uuid)
-                        
-                        # Extraer información adicional
-                        info = {
-                            "subtype": alert.get("subtype", "N/A"),
-                            "type": alert.get("type", "N/A"),
-                            "reportby": alert.get("reportby", "N/A"),
-                            "city": alert.get("city", "N/A"),
-                            "file": os.path.basename(json_file)
-                        }
-                        
-                        uuid_info[uuid].append(info)
+                uuid_info[uuid].append(info)
         
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, ijson.JSONError):
             print(f"Error: El archivo {json_file} no es un JSON válido.")
         except Exception as e:
             print(f"Error al procesar {json_file}: {str(e)}")
@@ -105,4 +176,26 @@ def analyze_jsons(directory=None):
     return len(repeated_uuids)
 
 if __name__ == "__main__":
-    analyze_jsons()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cuenta UUIDs de alertas repetidos en snapshots de Waze")
+    parser.add_argument('directorio', nargs='?', default=None, help="Directorio con los archivos JSON")
+    parser.add_argument('--streaming', action='store_true', help="Recorrer los archivos como flujo")
+    parser.add_argument('--cache', nargs='?', const=CACHE_COLUMNAR_DIRECTORIO, default=None, metavar='DIRECTORIO',
+                        help="Leer los snapshots desde la caché columnar (Parquet)")
+    parser.add_argument('--sketch', default=None, metavar='RUTA',
+                        help="Acumular un resumen aproximado (HyperLogLog, Space-Saving y Bloom) en RUTA "
+                             "en vez de contar los UUIDs exactos")
+    parser.add_argument('--error-hll', type=float, default=0.01, help="Error relativo objetivo del HyperLogLog")
+    parser.add_argument('--top-k', type=int, default=1000, help="Contadores del resumen de UUIDs más repetidos")
+    parser.add_argument('--capacidad-bloom', type=int, default=2_000_000, help="UUIDs esperados en el filtro de Bloom")
+    parser.add_argument('--fp-bloom', type=float, default=0.01, help="Tasa de falsos positivos del filtro de Bloom")
+    args = parser.parse_args()
+    
+    resumen = None
+    if args.sketch:
+        if os.path.exists(args.sketch):
+            resumen = ResumenUUIDs.cargar(args.sketch)
+        else:
+            resumen = ResumenUUIDs(args.error_hll, args.top_k, args.capacidad_bloom, args.fp_bloom)
+    analyze_jsons(args.directorio, args.streaming, args.cache, resumen)
+    if resumen is not None:
+        resumen.guardar(args.sketch)
\ No newline at end of file
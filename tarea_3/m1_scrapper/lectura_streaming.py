@@ -0,0 +1,57 @@
+import ijson
+
+# Valor que se reporta para un campo presente cuyo contenido no es escalar (objeto o lista)
+PRESENTE = object()
+
+# Prefijos de ijson de cada item según el contenedor en el que aparece
+PREFIJOS_CELDAS = {
+    'celdas.item.data.alerts.item': 'alerts',
+    'celdas.item.data.jams.item': 'jams'
+}
+PREFIJO_LISTA = 'item'
+EVENTOS_ESCALARES = {'string', 'number', 'boolean', 'null'}
+
+class LectorSnapshot:
+    """
+    Recorre un snapshot JSON como flujo de eventos (ijson) sin cargarlo completo.
+
+    Al iterar entrega (contenedor, valores) por cada item, donde contenedor es
+    'alerts' o 'jams' para archivos con estructura de celdas, o 'lista' si la raíz
+    es una lista de objetos. `valores` tiene solo los `campos` pedidos que están
+    presentes en el item; se aceptan rutas con punto para subcampos ("location.x").
+
+    Después de recorrerlo, `raiz` indica si la raíz era un objeto o una lista y
+    `tiene_celdas` si el objeto raíz tenía el campo "celdas".
+    """
+    def __init__(self, archivo, campos=('uuid',)):
+        self.archivo = archivo
+        self.campos = set(campos)
+        self.raiz = None
+        self.tiene_celdas = False
+
+    def __iter__(self):
+        with open(self.archivo, 'rb') as f:
+            base = contenedor = None
+            valores = None
+            for prefijo, evento, valor in ijson.parse(f, use_float=True):
+                if self.raiz is None:
+                    self.raiz = 'lista' if evento == 'start_array' else 'objeto'
+                    bases = {PREFIJO_LISTA: 'lista'} if self.raiz == 'lista' else PREFIJOS_CELDAS
+
+                if base is None:
+                    if evento == 'start_map' and prefijo in bases:
+                        base, contenedor, valores = prefijo, bases[prefijo], {}
+                    elif evento == 'map_key' and prefijo == '' and valor == 'celdas':
+                        self.tiene_celdas = True
+                    continue
+
+                if prefijo == base:
+                    if evento == 'end_map':
+                        yield contenedor, valores
+                        base = contenedor = valores = None
+                    elif evento == 'map_key' and valor in self.campos:
+                        valores.setdefault(valor, PRESENTE)
+                elif evento in EVENTOS_ESCALARES:
+                    relativo = prefijo[len(base) + 1:]
+                    if relativo in self.campos:
+                        valores[relativo] = valor
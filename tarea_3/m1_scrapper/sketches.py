@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Resúmenes probabilísticos de UUIDs con memoria acotada, serializables y fusionables.
+
+- HyperLogLog: cantidad aproximada de UUIDs distintos.
+- Space-Saving: UUIDs más repetidos con cota de error por contador.
+- Filtro de Bloom: consulta "¿ya se vio este UUID?" con tasa de falsos positivos fija.
+
+Uso:
+    python sketches.py mostrar resumen.json.gz
+    python sketches.py fusionar salida.json.gz resumen_a.json.gz resumen_b.json.gz
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import os
+import sys
+
+def hash64(valor, semilla=0):
+    """Hash estable de 64 bits (no depende de PYTHONHASHSEED). Distingue 123 de "123"."""
+    digest = hashlib.blake2b(repr(valor).encode('utf-8'), digest_size=8, salt=semilla.to_bytes(16, 'little')).digest()
+    return int.from_bytes(digest, 'little')
+
+def hash128(valor):
+    """Dos hashes de 64 bits independientes para doble hashing"""
+    digest = hashlib.blake2b(repr(valor).encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+class HyperLogLog:
+    """Cardinalidad aproximada con error relativo típico ~ 1.04 / sqrt(2^p)"""
+    def __init__(self, error=0.01, p=None):
+        if p is None:
+            p = math.ceil(math.log2((1.04 / error) ** 2))
+        self.p = min(18, max(4, p))
+        self.m = 1 << self.p
+        self.registros = bytearray(self.m)
+
+    def agregar(self, valor):
+        h = hash64(valor)
+        indice = h >> (64 - self.p)
+        resto = h & ((1 << (64 - self.p)) - 1)
+        rango = (64 - self.p) - resto.bit_length() + 1
+        if rango > self.registros[indice]:
+            self.registros[indice] = rango
+
+    def estimar(self):
+        m = self.m
+        alfa = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        suma = sum(2.0 ** -r for r in self.registros)
+        estimacion = alfa * m * m / suma
+        ceros = self.registros.count(0)
+        if estimacion <= 2.5 * m and ceros:
+            return m * math.log(m / ceros)  # Corrección para rangos pequeños (linear counting)
+        return estimacion
+
+    def fusionar(self, otro):
+        if otro.p != self.p:
+            raise ValueError("No se pueden fusionar HyperLogLog con distinta precisión")
+        self.registros = bytearray(max(a, b) for a, b in zip(self.registros, otro.registros))
+
+    def a_dict(self):
+        return {"p": self.p, "registros": base64.b64encode(bytes(self.registros)).decode('ascii')}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        hll = cls(p=datos["p"])
+        hll.registros = bytearray(base64.b64decode(datos["registros"]))
+        return hll
+
+class SpaceSaving:
+    """
+    Los k UUIDs más frecuentes. Cada contador sobreestima la frecuencia real en a
+    lo más su `error`, y cualquier UUID con frecuencia mayor a total/k está presente.
+    """
+    def __init__(self, k=1000):
+        self.k = k
+        self.contadores = {}  # valor -> [conteo, error]
+        self.heap = []        # (conteo, valor) con entradas posiblemente obsoletas
+        self.total = 0
+
+    def _minimo(self):
+        while True:
+            conteo, clave = self.heap[0]
+            if self.contadores.get(clave, [None])[0] == conteo:
+                return conteo, clave
+            heapq.heappop(self.heap)
+
+    def agregar(self, valor, cantidad=1):
+        self.total += cantidad
+        clave = json.dumps(valor)  # Las claves se guardan serializadas para distinguir tipos
+        contador = self.contadores.get(clave)
+        if contador is not None:
+            contador[0] += cantidad
+        elif len(self.contadores) < self.k:
+            contador = self.contadores[clave] = [cantidad, 0]
+        else:
+            # Se reemplaza el contador mínimo heredando su conteo como error
+            minimo, clave_minima = self._minimo()
+            del self.contadores[clave_minima]
+            contador = self.contadores[clave] = [minimo + cantidad, minimo]
+        heapq.heappush(self.heap, (contador[0], clave))
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(c[0], v) for v, c in self.contadores.items()]
+            heapq.heapify(self.heap)
+
+    def top(self, n=20):
+        """[(valor, conteo, error)] ordenado por conteo"""
+        mayores = sorted(self.contadores.items(), key=lambda x: x[1][0], reverse=True)[:n]
+        return [(json.loads(clave), conteo, error) for clave, (conteo, error) in mayores]
+
+    def fusionar(self, otro):
+        """Fusión de resúmenes Space-Saving (Agarwal et al.): suma y recorte a k"""
+        minimo_propio = min((c[0] for c in self.contadores.values()), default=0) if len(self.contadores) >= self.k else 0
+        minimo_otro = min((c[0] for c in otro.contadores.values()), default=0) if len(otro.contadores) >= otro.k else 0
+        combinados = {}
+        for clave in set(self.contadores) | set(otro.contadores):
+            propio = self.contadores.get(clave, [minimo_propio, minimo_propio])
+            ajeno = otro.contadores.get(clave, [minimo_otro, minimo_otro])
+            combinados[clave] = [propio[0] + ajeno[0], propio[1] + ajeno[1]]
+        mayores = sorted(combinados.items(), key=lambda x: x[1][0], reverse=True)[:self.k]
+        self.contadores = dict(mayores)
+        self.heap = [(c[0], v) for v, c in self.contadores.items()]
+        heapq.heapify(self.heap)
+        self.total += otro.total
+
+    def a_dict(self):
+        return {"k": self.k, "total": self.total, "contadores": self.contadores}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        ss = cls(datos["k"])
+        ss.total = datos["total"]
+        ss.contadores = {clave: list(valores) for clave, valores in datos["contadores"].items()}
+        ss.heap = [(c[0], v) for v, c in ss.contadores.items()]
+        heapq.heapify(ss.heap)
+        return ss
+
+class FiltroBloom:
+    """Pertenencia aproximada sin falsos negativos, dimensionado por capacidad y tasa de falsos positivos"""
+    def __init__(self, capacidad=2_000_000, tasa_fp=0.01):
+        self.capacidad = capacidad
+        self.tasa_fp = tasa_fp
+        self.m = max(8, math.ceil(-capacidad * math.log(tasa_fp) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / capacidad * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _posiciones(self, valor):
+        h1, h2 = hash128(valor)
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def agregar(self, valor):
+        """Agrega el valor y retorna True si (probablemente) ya estaba"""
+        presente = True
+        for posicion in self._posiciones(valor):
+            byte, bit = posicion >> 3, 1 << (posicion & 7)
+            if not self.bits[byte] & bit:
+                presente = False
+                self.bits[byte] |= bit
+        return presente
+
+    def __contains__(self, valor):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._posiciones(valor))
+
+    def fusionar(self, otro):
+        if (otro.m, otro.k) != (self.m, self.k):
+            raise ValueError("No se pueden fusionar filtros de Bloom con distintos parámetros")
+        self.bits = bytearray(a | b for a, b in zip(self.bits, otro.bits))
+
+    def a_dict(self):
+        return {"capacidad": self.capacidad, "tasa_fp": self.tasa_fp,
+                "bits": base64.b64encode(bytes(self.bits)).decode('ascii')}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        filtro = cls(datos["capacidad"], datos["tasa_fp"])
+        filtro.bits = bytearray(base64.b64decode(datos["bits"]))
+        return filtro
+
+class ResumenUUIDs:
+    """
+    Resumen de UUIDs de alertas y atascos acumulable entre archivos y ejecuciones.
+    Recuerda qué archivos ya se procesaron para no contarlos dos veces.
+    """
+    def __init__(self, error_hll=0.01, top_k=1000, capacidad_bloom=2_000_000, fp_bloom=0.01):
+        self.p_hll = HyperLogLog(error_hll).p
+        self.distintos = {"alerta": HyperLogLog(p=self.p_hll), "atasco": HyperLogLog(p=self.p_hll)}
+        self.frecuentes = SpaceSaving(top_k)
+        self.vistos = FiltroBloom(capacidad_bloom, fp_bloom)
+        self.total = {"alerta": 0, "atasco": 0}
+        self.repetidos = 0  # Apariciones de UUIDs que el filtro de Bloom ya había visto
+        self.archivos = set()
+
+    def agregar(self, uuid, tipo):
+        if tipo not in self.distintos:
+            self.distintos[tipo] = HyperLogLog(p=self.p_hll)
+            self.total[tipo] = 0
+        self.total[tipo] += 1
+        self.distintos[tipo].agregar(uuid)
+        self.frecuentes.agregar([tipo, uuid])
+        if self.vistos.agregar((tipo, uuid)):
+            self.repetidos += 1
+
+    def visto(self, uuid, tipo):
+        return (tipo, uuid) in self.vistos
+
+    def fusionar(self, otro):
+        for tipo, hll in otro.distintos.items():
+            if tipo not in self.distintos:
+                self.distintos[tipo] = HyperLogLog(p=self.p_hll)
+                self.total[tipo] = 0
+            self.distintos[tipo].fusionar(hll)
+            self.total[tipo] += otro.total[tipo]
+        self.frecuentes.fusionar(otro.frecuentes)
+        self.vistos.fusionar(otro.vistos)
+        self.repetidos += otro.repetidos
+        self.archivos |= otro.archivos
+
+    def reporte(self):
+        distintos = {tipo: round(hll.estimar()) for tipo, hll in self.distintos.items()}
+        return {
+            "archivos": len(self.archivos),
+            "total": dict(self.total),
+            "distintos_aprox": distintos,
+            "apariciones_repetidas_aprox": sum(self.total.values()) - sum(distintos.values()),
+            "repetidos_bloom": self.repetidos,
+            "error_relativo_hll": 1.04 / math.sqrt(1 << self.p_hll),
+            "tasa_fp_bloom": self.vistos.tasa_fp
+        }
+
+    def guardar(self, ruta):
+        datos = {
+            "distintos": {tipo: hll.a_dict() for tipo, hll in self.distintos.items()},
+            "frecuentes": self.frecuentes.a_dict(),
+            "vistos": self.vistos.a_dict(),
+            "total": self.total,
+            "repetidos": self.repetidos,
+            "archivos": sorted(self.archivos)
+        }
+        temporal = ruta + '.tmp'
+        with gzip.open(temporal, 'wt', encoding='utf-8') as f:
+            json.dump(datos, f)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+            datos = json.load(f)
+        resumen = cls.__new__(cls)
+        resumen.distintos = {tipo: HyperLogLog.desde_dict(d) for tipo, d in datos["distintos"].items()}
+        resumen.p_hll = resumen.distintos["alerta"].p
+        resumen.frecuentes = SpaceSaving.desde_dict(datos["frecuentes"])
+        resumen.vistos = FiltroBloom.desde_dict(datos["vistos"])
+        resumen.total = datos["total"]
+        resumen.repetidos = datos["repetidos"]
+        resumen.archivos = set(datos["archivos"])
+        return resumen
+
+def mostrar_resumen(resumen, limite=20):
+    reporte = resumen.reporte()
+    print(f"\n{'=' * 60}")
+    print("RESUMEN APROXIMADO DE UUIDs (sketches):")
+    print(f"Archivos acumulados: {reporte['archivos']}")
+    for tipo in reporte['total']:
+        print(f"{tipo.capitalize()}s: {reporte['total'][tipo]} apariciones, "
+              f"~{reporte['distintos_aprox'][tipo]} UUIDs distintos")
+    print(f"Apariciones repetidas (estimadas): ~{reporte['apariciones_repetidas_aprox']} "
+          f"(error relativo HLL ~{reporte['error_relativo_hll'] * 100:.2f}%)")
+    print(f"Apariciones ya vistas según el filtro de Bloom: {reporte['repetidos_bloom']} "
+          f"(falsos positivos ~{reporte['tasa_fp_bloom'] * 100:.2f}%)")
+    print(f"\n--- UUIDs más repetidos ---")
+    # Se ordena por la cota inferior, que es lo que se puede asegurar de cada contador
+    frecuentes = sorted(resumen.frecuentes.top(resumen.frecuentes.k), key=lambda x: x[1] - x[2], reverse=True)
+    for (tipo, uuid), conteo, error in frecuentes[:limite]:
+        if conteo - error <= 1:
+            break
+        print(f"UUID: {uuid} ({tipo}) - entre {conteo - error} y {conteo} apariciones")
+    print(f"{'=' * 60}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Operaciones sobre resúmenes de UUIDs")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    mostrar = sub.add_parser('mostrar', help="Muestra un resumen guardado")
+    mostrar.add_argument('ruta')
+    fusionar = sub.add_parser('fusionar', help="Fusiona varios resúmenes en uno")
+    fusionar.add_argument('salida')
+    fusionar.add_argument('entradas', nargs='+')
+    args = parser.parse_args()
+
+    if args.comando == 'mostrar':
+        mostrar_resumen(ResumenUUIDs.cargar(args.ruta))
+    else:
+        resumen = ResumenUUIDs.cargar(args.entradas[0])
+        for ruta in args.entradas[1:]:
+            otro = ResumenUUIDs.cargar(ruta)
+            repetidos = resumen.archivos & otro.archivos
+            if repetidos:
+                print(f"Advertencia: {len(repetidos)} archivos están en más de un resumen y se cuentan dos veces",
+                      file=sys.stderr)
+            resumen.fusionar(otro)
+        resumen.guardar(args.salida)
+        mostrar_resumen(resumen)
+
+if __name__ == "__main__":
+    main()
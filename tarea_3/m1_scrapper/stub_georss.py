@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Stub local del endpoint georss de Waze para probar el scrapper sin salir a internet.
+
+Sirve las alertas y atascos de un snapshot (formato de m0_cargajson/jsons) que
+caen dentro del bbox pedido. Permite simular latencia y errores.
+
+Uso:
+    python stub_georss.py --snapshot ../m0_cargajson/jsons/waze_santiago_20250414-115311.json --retardo 0.5
+    WAZE_GEORSS_URL=http://localhost:8765/live-map/api/georss python scrapper.py
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+def cargar_items(ruta_snapshot):
+    """Extrae todas las alertas y atascos de un snapshot con estructura de celdas"""
+    alertas, atascos = [], []
+    if not ruta_snapshot:
+        return alertas, atascos
+    with open(ruta_snapshot, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    for celda in datos.get('celdas', []):
+        alertas.extend(celda.get('data', {}).get('alerts', []))
+        atascos.extend(celda.get('data', {}).get('jams', []))
+    return alertas, atascos
+
+def posicion(item):
+    """Coordenada representativa de una alerta (location) o un atasco (primer punto de line)"""
+    if 'location' in item:
+        return item['location'].get('x'), item['location'].get('y')
+    if item.get('line'):
+        return item['line'][0].get('x'), item['line'][0].get('y')
+    return None, None
+
+def dentro(item, top, bottom, left, right):
+    x, y = posicion(item)
+    if x is None or y is None:
+        return False
+    return bottom <= y <= top and left <= x <= right
+
+def crear_handler(alertas, atascos, retardo, tasa_error):
+    class GeorssHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Mantiene las conexiones abiertas (keep-alive)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/live-map/api/georss':
+                self.send_error(404)
+                return
+
+            if retardo > 0:
+                time.sleep(retardo)
+
+            if random.random() < tasa_error:
+                self.send_error(503)
+                return
+
+            params = parse_qs(url.query)
+            try:
+                top = float(params['top'][0])
+                bottom = float(params['bottom'][0])
+                left = float(params['left'][0])
+                right = float(params['right'][0])
+            except (KeyError, ValueError):
+                self.send_error(400)
+                return
+
+            respuesta = {
+                'alerts': [a for a in alertas if dentro(a, top, bottom, left, right)],
+                'jams': [j for j in atascos if dentro(j, top, bottom, left, right)]
+            }
+            cuerpo = json.dumps(respuesta).encode('utf-8')
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                cuerpo = gzip.compress(cuerpo)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, format, *args):
+            pass
+
+    return GeorssHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub local del endpoint georss de Waze")
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--snapshot', default=None, help="Snapshot JSON con estructura de celdas")
+    parser.add_argument('--retardo', type=float, default=0.0, help="Latencia simulada por petición (s)")
+    parser.add_argument('--tasa-error', type=float, default=0.0, help="Fracción de respuestas 503")
+    args = parser.parse_args()
+
+    alertas, atascos = cargar_items(args.snapshot)
+    servidor = ThreadingHTTPServer(('0.0.0.0', args.puerto), crear_handler(alertas, atascos, args.retardo, args.tasa_error))
+    print(f"Stub georss escuchando en http://localhost:{args.puerto}/live-map/api/georss "
+          f"({len(alertas)} alertas, {len(atascos)} atascos)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
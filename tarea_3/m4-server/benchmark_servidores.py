@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Compara server.py (Flask) con server_async.py (ASGI) con la misma carga: la misma
+secuencia de consultas a /alerta/<uuid> y /atasco/<uuid>, con N consultas en curso a
+la vez. Reporta consultas por segundo, latencias (p50, p95, p99) y resultados.
+Con --lote N la misma secuencia se envía en lotes a POST /alertas/lote y /atascos/lote.
+
+El cliente usa asyncio directamente (conexiones keep-alive cuando el servidor las
+permite), así puede mantener miles de consultas en curso desde un solo proceso.
+
+Uso:
+    python benchmark_servidores.py --servidor flask=http://localhost:5000 \\
+        --servidor async=http://localhost:5001 --consultas 20000 --concurrencia 500
+    python benchmark_servidores.py --servidor flask=http://localhost:5000 --lote 200 --concurrencia 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+
+class ConexionHTTP:
+    """Conexión HTTP/1.1 mínima que se reabre si el servidor la cierra"""
+    def __init__(self, host, puerto):
+        self.host = host
+        self.puerto = puerto
+        self.lector = self.escritor = None
+
+    async def _abrir(self):
+        self.lector, self.escritor = await asyncio.open_connection(self.host, self.puerto)
+
+    def _cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        self.lector = self.escritor = None
+
+    async def get(self, ruta):
+        """Retorna (status, cuerpo)"""
+        return await self.enviar("GET", ruta)
+
+    async def post_json(self, ruta, datos):
+        return await self.enviar("POST", ruta, json.dumps(datos).encode('utf-8'))
+
+    async def enviar(self, metodo, ruta, cuerpo_peticion=b""):
+        peticion = f"{metodo} {ruta} HTTP/1.1\r\nHost: {self.host}\r\n"
+        if cuerpo_peticion:
+            peticion += f"Content-Type: application/json\r\nContent-Length: {len(cuerpo_peticion)}\r\n"
+        peticion = (peticion + "\r\n").encode('ascii') + cuerpo_peticion
+        for intento in range(2):
+            if self.escritor is None:
+                await self._abrir()
+            try:
+                self.escritor.write(peticion)
+                await self.escritor.drain()
+                cabecera = await self.lector.readuntil(b"\r\n\r\n")
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Conexión keep-alive cerrada por el servidor: se reintenta una vez con otra
+                self._cerrar()
+                if intento:
+                    raise
+        lineas = cabecera.decode('latin-1').split("\r\n")
+        version, status = lineas[0].split(" ")[:2]
+        cabeceras = {}
+        for linea in lineas[1:]:
+            if ":" in linea:
+                clave, valor = linea.split(":", 1)
+                cabeceras[clave.strip().lower()] = valor.strip()
+        chunked = cabeceras.get('transfer-encoding', '').lower() == 'chunked'
+        if chunked:
+            # Respuestas en streaming (listas de UUIDs): bloques con su largo en hexadecimal
+            partes = []
+            while True:
+                largo = int((await self.lector.readuntil(b"\r\n")).split(b";")[0], 16)
+                if largo == 0:
+                    await self.lector.readuntil(b"\r\n")
+                    break
+                partes.append(await self.lector.readexactly(largo))
+                await self.lector.readexactly(2)
+            cuerpo = b"".join(partes)
+        elif 'content-length' in cabeceras:
+            cuerpo = await self.lector.readexactly(int(cabeceras['content-length']))
+        else:
+            cuerpo = await self.lector.read()
+        if version == "HTTP/1.0" or cabeceras.get('connection', '').lower() == 'close' \
+                or not (chunked or 'content-length' in cabeceras):
+            self._cerrar()
+        return int(status), cuerpo
+
+async def obtener_uuids(url_base):
+    partes = urlsplit(url_base)
+    uuids = []
+    for tipo, ruta in (("alerta", "/uuids_alertas"), ("atasco", "/uuids_atascos")):
+        conexion = ConexionHTTP(partes.hostname, partes.port or 80)
+        status, cuerpo = await conexion.get(ruta)
+        conexion._cerrar()
+        if status != 200:
+            raise RuntimeError(f"{ruta} respondió {status}")
+        uuids.extend((tipo, uuid) for uuid in json.loads(cuerpo))
+    return uuids
+
+def generar_secuencia(uuids, consultas, distribucion, s, semilla=42):
+    """Misma secuencia de consultas para todos los servidores"""
+    rng = random.Random(semilla)
+    uuids = list(uuids)
+    rng.shuffle(uuids)
+    if distribucion == 'uniforme':
+        return [rng.choice(uuids) for _ in range(consultas)]
+    pesos = [1 / (rango ** s) for rango in range(1, len(uuids) + 1)]
+    return rng.choices(uuids, weights=pesos, k=consultas)
+
+def agrupar_en_lotes(secuencia, tam_lote):
+    """Parte la secuencia en lotes de tam_lote consultas, separados por tipo"""
+    pendientes = {"alerta": [], "atasco": []}
+    for tipo, uuid in secuencia:
+        pendientes[tipo].append(uuid)
+        if len(pendientes[tipo]) == tam_lote:
+            yield tipo, pendientes[tipo]
+            pendientes[tipo] = []
+    for tipo, uuids in pendientes.items():
+        if uuids:
+            yield tipo, uuids
+
+async def ejecutar(url_base, secuencia, concurrencia, tam_lote=0):
+    """Con tam_lote > 0 usa POST /alertas/lote y /atascos/lote; las latencias son por lote"""
+    partes = urlsplit(url_base)
+    latencias = []
+    resultados = Counter()
+    siguiente = iter(secuencia)
+
+    async def trabajador_lotes():
+        conexion = ConexionHTTP(partes.hostname, partes.port or 80)
+        for tipo, uuids in siguiente:
+            inicio = time.perf_counter()
+            try:
+                status, cuerpo = await conexion.post_json(f"/{tipo}s/lote", {"uuids": uuids})
+                if status == 200:
+                    resultados.update(json.loads(cuerpo)["conteo"])
+                    # Repetidos dentro del lote: el servidor los resuelve una sola vez
+                    resultados["repetidos_en_lote"] += len(uuids) - len(set(map(str, uuids)))
+                else:
+                    resultados[f"http_{status}"] += len(uuids)
+            except Exception as e:
+                resultados[f"error_{type(e).__name__}"] += len(uuids)
+                conexion._cerrar()
+            latencias.append(time.perf_counter() - inicio)
+        conexion._cerrar()
+
+    async def trabajador():
+        conexion = ConexionHTTP(partes.hostname, partes.port or 80)
+        for tipo, uuid in siguiente:
+            inicio = time.perf_counter()
+            try:
+                status, cuerpo = await conexion.get(f"/{tipo}/{uuid}")
+                resultado = json.loads(cuerpo).get('resultado', f"http_{status}") if status == 200 else f"http_{status}"
+            except Exception as e:
+                resultado = f"error_{type(e).__name__}"
+                conexion._cerrar()
+            latencias.append(time.perf_counter() - inicio)
+            resultados[resultado] += 1
+        conexion._cerrar()
+
+    if tam_lote > 0:
+        siguiente = agrupar_en_lotes(secuencia, tam_lote)
+    inicio = time.perf_counter()
+    await asyncio.gather(*((trabajador_lotes() if tam_lote > 0 else trabajador()) for _ in range(concurrencia)))
+    return time.perf_counter() - inicio, latencias, resultados
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))] if ordenados else 0.0
+
+def limpiar_redis():
+    import redis
+    redis.Redis(host=REDIS_HOST, port=REDIS_PORT).flushdb()
+
+async def principal(args):
+    servidores = [s.split("=", 1) for s in args.servidor]
+    uuids = await obtener_uuids(servidores[0][1])
+    print(f"{len(uuids)} UUIDs obtenidos de {servidores[0][0]}")
+    secuencia = generar_secuencia(uuids, args.consultas, args.distribucion, args.s)
+    print(f"{args.consultas} consultas ({args.distribucion}) con {args.concurrencia} en curso"
+          + (f", en lotes de {args.lote} (latencias por lote)" if args.lote else "") + "\n")
+
+    print(f"{'servidor':>10} | {'consultas/s':>11} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | resultados")
+    for nombre, url in servidores:
+        if args.limpiar_redis:
+            limpiar_redis()
+        duracion, latencias, resultados = await ejecutar(url, secuencia, args.concurrencia, args.lote)
+        print(f"{nombre:>10} | {len(secuencia) / duracion:>11.0f} | {percentil(latencias, 50) * 1000:>8.2f} | "
+              f"{percentil(latencias, 95) * 1000:>8.2f} | {percentil(latencias, 99) * 1000:>8.2f} | "
+              f"{dict(resultados)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de server.py contra server_async.py")
+    parser.add_argument('--servidor', action='append', required=True, metavar='NOMBRE=URL',
+                        help="Servidor a medir; se puede repetir (los UUIDs se obtienen del primero)")
+    parser.add_argument('--consultas', type=int, default=20000)
+    parser.add_argument('--concurrencia', type=int, default=200, help="Consultas en curso a la vez")
+    parser.add_argument('--distribucion', choices=['zipf', 'uniforme'], default='zipf')
+    parser.add_argument('--lote', type=int, default=0,
+                        help="UUIDs por petición POST /<tipo>s/lote (0 = una petición GET por UUID)")
+    parser.add_argument('--s', type=float, default=1.1, help="Exponente de la distribución Zipf")
+    parser.add_argument('--limpiar-redis', action='store_true',
+                        help="FLUSHDB en Redis antes de cada servidor para que todos partan con caché fría")
+    asyncio.run(principal(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Caché L1 en memoria del proceso, delante de Redis. Sigue el esquema W-TinyLFU:
+# una ventana LRU pequeña recibe todas las claves nuevas y, cuando una sale de la
+# ventana, solo entra a la zona principal (SLRU: probatoria + protegida) si su
+# frecuencia estimada supera a la de la víctima. Así una consulta aislada (un
+# recorrido de UUIDs) no desplaza a las claves calientes de una carga Zipf.
+
+L1_MAX_ENTRADAS = int(os.environ.get('L1_MAX_ENTRADAS', 10000))  # 0 = L1 desactivada
+L1_MAX_BYTES = int(os.environ.get('L1_MAX_BYTES', 0))  # Si es > 0 el límite es en bytes
+L1_TTL = float(os.environ.get('L1_TTL', 5))  # Segundos; nunca más que lo que le queda en Redis
+L1_VENTANA = float(os.environ.get('L1_VENTANA', 0.01))  # Fracción de la capacidad para la ventana
+# Las entradas L1 vencen este margen antes que la clave en Redis, así las últimas lecturas
+# llegan a Redis y la expiración anticipada (coalescencia.py) alcanza a refrescarla
+L1_MARGEN = float(os.environ.get('L1_MARGEN', 1))
+
+class CountMinSketch:
+    """Frecuencias aproximadas con contadores de 4 bits que se reducen a la mitad periódicamente"""
+    PROFUNDIDAD = 4
+    SEMILLAS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+    def __init__(self, capacidad):
+        ancho = 16
+        while ancho < capacidad:
+            ancho *= 2
+        self.mascara = ancho - 1
+        self.tablas = [bytearray(ancho) for _ in range(self.PROFUNDIDAD)]
+        # Tras tantos incrementos se envejecen los contadores (la frecuencia es reciente, no histórica)
+        self.tam_muestra = 10 * max(capacidad, 1)
+        self.incrementos = 0
+
+    def _indices(self, clave):
+        h = hash(clave)
+        return [((h ^ semilla) * 0x9E3779B97F4A7C15 >> 17) & self.mascara for semilla in self.SEMILLAS]
+
+    def incrementar(self, clave):
+        for tabla, i in zip(self.tablas, self._indices(clave)):
+            if tabla[i] < 15:
+                tabla[i] += 1
+        self.incrementos += 1
+        if self.incrementos >= self.tam_muestra:
+            self._envejecer()
+
+    def estimar(self, clave):
+        return min(tabla[i] for tabla, i in zip(self.tablas, self._indices(clave)))
+
+    def _envejecer(self):
+        for tabla in self.tablas:
+            for i, valor in enumerate(tabla):
+                if valor:
+                    tabla[i] = valor >> 1
+        self.incrementos //= 2
+
+class CacheL1:
+    """
+    Caché acotada por cantidad de entradas o por bytes (con max_bytes > 0 cada entrada
+    pesa len(valor)). Cada entrada expira a los ttl segundos indicados al guardarla.
+    Es segura entre hilos (Flask atiende cada consulta en un hilo).
+    """
+    def __init__(self, max_entradas=L1_MAX_ENTRADAS, max_bytes=L1_MAX_BYTES, fraccion_ventana=L1_VENTANA):
+        self.por_bytes = max_bytes > 0
+        self.capacidad = max_bytes if self.por_bytes else max_entradas
+        self.cap_ventana = max(1, int(self.capacidad * fraccion_ventana))
+        self.cap_principal = max(0, self.capacidad - self.cap_ventana)
+        self.cap_protegida = int(self.cap_principal * 0.8)
+        self.sketch = CountMinSketch(max_entradas if not self.por_bytes else max(1, max_bytes // 1024))
+        # clave -> (valor, expira, peso)
+        self.ventana = OrderedDict()
+        self.probatoria = OrderedDict()
+        self.protegida = OrderedDict()
+        self.peso_ventana = self.peso_probatoria = self.peso_protegida = 0
+        self.lock = threading.Lock()
+        self.estadisticas = {"hits": 0, "misses": 0, "expirados": 0, "admitidos": 0,
+                             "rechazados": 0, "expulsados": 0}
+
+    @property
+    def activa(self):
+        return self.capacidad > 0
+
+    def _peso(self, valor):
+        return len(valor) if self.por_bytes else 1
+
+    def _segmento(self, clave):
+        for segmento in (self.ventana, self.probatoria, self.protegida):
+            if clave in segmento:
+                return segmento
+        return None
+
+    def _quitar(self, segmento, clave):
+        _, _, peso = segmento.pop(clave)
+        if segmento is self.ventana:
+            self.peso_ventana -= peso
+        elif segmento is self.probatoria:
+            self.peso_probatoria -= peso
+        else:
+            self.peso_protegida -= peso
+
+    def obtener(self, clave):
+        """Retorna el valor guardado o None si no está o expiró"""
+        if not self.activa:
+            return None
+        with self.lock:
+            self.sketch.incrementar(clave)
+            segmento = self._segmento(clave)
+            if segmento is None:
+                self.estadisticas["misses"] += 1
+                return None
+            valor, expira, peso = segmento[clave]
+            if expira <= time.monotonic():
+                self._quitar(segmento, clave)
+                self.estadisticas["expirados"] += 1
+                self.estadisticas["misses"] += 1
+                return None
+
+            if segmento is self.probatoria:
+                # Segundo acceso en la zona principal: pasa a la protegida
+                self._quitar(self.probatoria, clave)
+                self.protegida[clave] = (valor, expira, peso)
+                self.peso_protegida += peso
+                while self.peso_protegida > self.cap_protegida and len(self.protegida) > 1:
+                    degradada, datos = self.protegida.popitem(last=False)
+                    self.peso_protegida -= datos[2]
+                    self.probatoria[degradada] = datos
+                    self.peso_probatoria += datos[2]
+            else:
+                segmento.move_to_end(clave)
+            self.estadisticas["hits"] += 1
+            return valor
+
+    def guardar(self, clave, valor, ttl):
+        """Guarda valor por ttl segundos (ttl <= 0 no guarda nada)"""
+        peso = self._peso(valor)
+        if not self.activa or ttl <= 0 or peso > self.capacidad:
+            return
+        expira = time.monotonic() + ttl
+        with self.lock:
+            segmento = self._segmento(clave)
+            if segmento is not None:
+                # Se actualiza en su lugar, sin tocar la frecuencia
+                self._quitar(segmento, clave)
+                segmento[clave] = (valor, expira, peso)
+                if segmento is self.ventana:
+                    self.peso_ventana += peso
+                elif segmento is self.probatoria:
+                    self.peso_probatoria += peso
+                else:
+                    self.peso_protegida += peso
+                return
+
+            self.ventana[clave] = (valor, expira, peso)
+            self.peso_ventana += peso
+            while self.peso_ventana > self.cap_ventana and len(self.ventana) > 1:
+                candidata, datos = self.ventana.popitem(last=False)
+                self.peso_ventana -= datos[2]
+                self._admitir(candidata, datos)
+
+    def _admitir(self, candidata, datos):
+        """Decide si la candidata que sale de la ventana entra a la zona principal"""
+        peso = datos[2]
+        if self.peso_probatoria + self.peso_protegida + peso > self.cap_principal:
+            victima = next(iter(self.probatoria or self.protegida), None)
+            if victima is None or self.sketch.estimar(candidata) <= self.sketch.estimar(victima):
+                self.estadisticas["rechazados"] += 1
+                return
+        self.probatoria[candidata] = datos
+        self.peso_probatoria += peso
+        self.estadisticas["admitidos"] += 1
+        while self.peso_probatoria + self.peso_protegida > self.cap_principal:
+            segmento = self.probatoria if len(self.probatoria) > 1 or not self.protegida else self.protegida
+            self._quitar(segmento, next(iter(segmento)))
+            self.estadisticas["expulsados"] += 1
+
+    def invalidar(self, clave):
+        with self.lock:
+            segmento = self._segmento(clave)
+            if segmento is not None:
+                self._quitar(segmento, clave)
+
+    def limpiar(self):
+        with self.lock:
+            self.ventana.clear()
+            self.probatoria.clear()
+            self.protegida.clear()
+            self.peso_ventana = self.peso_probatoria = self.peso_protegida = 0
+
+    def info(self):
+        with self.lock:
+            consultas = self.estadisticas["hits"] + self.estadisticas["misses"]
+            return {
+                "limite": f"{self.capacidad} {'bytes' if self.por_bytes else 'entradas'}",
+                "entradas": len(self.ventana) + len(self.probatoria) + len(self.protegida),
+                "ocupado": self.peso_ventana + self.peso_probatoria + self.peso_protegida,
+                "ventana": len(self.ventana), "probatoria": len(self.probatoria), "protegida": len(self.protegida),
+                "hit_rate": round(self.estadisticas["hits"] / consultas * 100, 2) if consultas else 0.0,
+                **self.estadisticas
+            }
+
+def ttl_l1(ttl_redis):
+    """TTL de una entrada L1: el de L1 acotado por lo que le queda a la clave en Redis (menos L1_MARGEN)"""
+    if ttl_redis is None or ttl_redis < 0:
+        # Sin TTL en Redis (-1) o clave recién expirada (-2)
+        return L1_TTL if ttl_redis == -1 else 0
+    return min(L1_TTL, ttl_redis - L1_MARGEN)
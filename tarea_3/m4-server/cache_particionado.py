@@ -0,0 +1,373 @@
+import bisect
+import hashlib
+import os
+import sys
+import time
+
+import redis
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError, TimeoutError
+
+from metricas import estado_pool_redis
+
+# Caché repartida entre varios nodos Redis con hashing consistente del lado del
+# cliente. Cada nodo aparece REDIS_NODOS_VIRTUALES veces en el anillo, así las
+# claves quedan parejas entre nodos y al agregar o quitar uno solo cambian de nodo
+# ~1/N de las claves. Los pipelines se arman uno por nodo y se ejecutan nodo a
+# nodo; las respuestas vuelven en el orden en que se pidieron.
+#
+# Un nodo que no responde queda marcado como caído REDIS_NODO_REINTENTO segundos:
+# sus claves se tratan como miss (GET -> None) y sus escrituras se descartan, así
+# la consulta sigue hacia MongoDB en vez de fallar. Sus claves no se mueven a otro
+# nodo, para no dejar copias viejas cuando vuelva.
+#
+# Sin REDIS_NODOS se usa un solo redis.Redis con REDIS_HOST y REDIS_PORT, como antes.
+
+REDIS_NODOS = [nodo.strip() for nodo in os.environ.get('REDIS_NODOS', '').split(',') if nodo.strip()]  # host:port,...
+REDIS_NODOS_VIRTUALES = int(os.environ.get('REDIS_NODOS_VIRTUALES', 160))
+REDIS_TIMEOUT = float(os.environ.get('REDIS_TIMEOUT', 0.5))  # Segundos; un nodo caído no debe colgar la consulta
+REDIS_NODO_REINTENTO = float(os.environ.get('REDIS_NODO_REINTENTO', 5))  # Segundos antes de volver a probar un nodo caído
+
+ERRORES_NODO = (ConnectionError, TimeoutError)
+
+def _hash(texto):
+    # md5 solo para repartir: estable entre procesos (hash() de Python no lo es)
+    return int.from_bytes(hashlib.md5(texto.encode('utf-8')).digest()[:8], 'big')
+
+def clave_de_ruteo(clave):
+    """Los locks de coalescencia viven en el mismo nodo que la clave que protegen"""
+    if isinstance(clave, bytes):
+        clave = clave.decode('utf-8')
+    return clave[5:] if clave.startswith('lock:') else clave
+
+def _separar(nodo):
+    host, _, puerto = nodo.rpartition(':')
+    return (host, int(puerto)) if host else (nodo, 6379)
+
+class Anillo:
+    """Anillo de hashing consistente con nodos virtuales"""
+    def __init__(self, nombres, virtuales=REDIS_NODOS_VIRTUALES):
+        puntos = sorted((_hash(f"{nombre}#{i}"), nombre) for nombre in nombres for i in range(virtuales))
+        self.puntos = [punto for punto, _ in puntos]
+        self.nombres = [nombre for _, nombre in puntos]
+
+    def nodo(self, clave):
+        i = bisect.bisect_right(self.puntos, _hash(clave))
+        return self.nombres[i % len(self.puntos)]
+
+class Nodo:
+    def __init__(self, nombre, cliente):
+        self.nombre = nombre
+        self.cliente = cliente
+        self.caido_hasta = 0.0
+        self.fallas = 0
+
+    def disponible(self):
+        return time.monotonic() >= self.caido_hasta
+
+    def marcar_caido(self, error):
+        if self.disponible():
+            print(f"Nodo Redis {self.nombre} no responde ({str(error)}), sus claves irán a MongoDB")
+        self.caido_hasta = time.monotonic() + REDIS_NODO_REINTENTO
+        self.fallas += 1
+
+class _LockSinNodo:
+    """Lock de un nodo caído: se deja pasar la consulta a MongoDB sin coordinar"""
+    def acquire(self, *args, **kwargs):
+        return True
+
+    def release(self):
+        pass
+
+class _LockSinNodoAsync:
+    async def acquire(self, *args, **kwargs):
+        return True
+
+    async def release(self):
+        pass
+
+class _LockTolerante:
+    """Lock de redis-py que, si el nodo se cae en medio, se comporta como _LockSinNodo"""
+    def __init__(self, nodo, lock):
+        self.nodo = nodo
+        self.lock = lock
+
+    def acquire(self, *args, **kwargs):
+        try:
+            return self.lock.acquire(*args, **kwargs)
+        except ERRORES_NODO as e:
+            self.nodo.marcar_caido(e)
+            return True
+
+    def release(self):
+        try:
+            self.lock.release()
+        except ERRORES_NODO as e:
+            self.nodo.marcar_caido(e)
+
+class _LockToleranteAsync(_LockTolerante):
+    async def acquire(self, *args, **kwargs):
+        try:
+            return await self.lock.acquire(*args, **kwargs)
+        except ERRORES_NODO as e:
+            self.nodo.marcar_caido(e)
+            return True
+
+    async def release(self):
+        try:
+            await self.lock.release()
+        except ERRORES_NODO as e:
+            self.nodo.marcar_caido(e)
+
+class _BaseParticionado:
+    def __init__(self, nombres, crear_cliente, virtuales=REDIS_NODOS_VIRTUALES):
+        self.nodos = {nombre: Nodo(nombre, crear_cliente(*_separar(nombre))) for nombre in nombres}
+        self.anillo = Anillo(list(self.nodos), virtuales)
+
+    def nodo(self, clave):
+        return self.nodos[self.anillo.nodo(clave_de_ruteo(clave))]
+
+    def medidas(self):
+        """Para /metrics: conexiones de cada nodo y si está caído"""
+        medidas = []
+        for nombre, nodo in self.nodos.items():
+            medidas.extend(((nombre, estado), valor) for (estado,), valor in estado_pool_redis(nodo.cliente.connection_pool))
+            medidas.append(((nombre, "caido"), 0 if nodo.disponible() else 1))
+        return medidas
+
+    def info_nodos(self):
+        return {nombre: {"disponible": nodo.disponible(), "fallas": nodo.fallas} for nombre, nodo in self.nodos.items()}
+
+    @staticmethod
+    def _sumar_memoria(infos):
+        # El presupuesto del precalentamiento se calcula sobre la memoria de todos los nodos
+        if not infos:
+            return {}
+        if any(int(info.get('maxmemory', 0)) <= 0 for info in infos):
+            return {'maxmemory': 0}
+        return {'maxmemory': sum(int(info['maxmemory']) for info in infos),
+                'used_memory': sum(int(info.get('used_memory', 0)) for info in infos)}
+
+class ClienteParticionado(_BaseParticionado):
+    """
+    Lo que server.py y precalentamiento.py usan de redis.Redis (comandos de una
+    clave, lock, pipeline e info('memory')), repartido entre los nodos.
+    """
+    def __init__(self, nombres, virtuales=REDIS_NODOS_VIRTUALES):
+        super().__init__(nombres, lambda host, puerto: redis.Redis(
+            host=host, port=puerto, db=0, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT), virtuales)
+
+    def __getattr__(self, comando):
+        # get, setex, pttl, set, delete, ...: el primer argumento es la clave
+        def ejecutar(clave, *args, **kwargs):
+            nodo = self.nodo(clave)
+            if not nodo.disponible():
+                return None
+            try:
+                return getattr(nodo.cliente, comando)(clave, *args, **kwargs)
+            except ERRORES_NODO as e:
+                nodo.marcar_caido(e)
+                return None
+        return ejecutar
+
+    def lock(self, nombre, **kwargs):
+        nodo = self.nodo(nombre)
+        if not nodo.disponible():
+            return _LockSinNodo()
+        return _LockTolerante(nodo, nodo.cliente.lock(nombre, **kwargs))
+
+    def pipeline(self, transaction=False):
+        return PipelineParticionado(self)
+
+    def info(self, seccion=None):
+        infos = []
+        for nodo in self.nodos.values():
+            if not nodo.disponible():
+                continue
+            try:
+                infos.append(nodo.cliente.info(seccion))
+            except ERRORES_NODO as e:
+                nodo.marcar_caido(e)
+        return self._sumar_memoria(infos)
+
+    def close(self):
+        for nodo in self.nodos.values():
+            nodo.cliente.close()
+
+class PipelineParticionado:
+    """
+    Un pipeline por nodo. Cada comando se anota con su nodo y su posición, y
+    execute() devuelve las respuestas en el orden original (None para los comandos
+    de un nodo caído).
+    """
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.pipes = {}
+        self.orden = []  # [(nombre del nodo | None, posición en su pipeline)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+    def _pipe(self, nodo):
+        pipe = self.pipes.get(nodo.nombre)
+        if pipe is None:
+            pipe = self.pipes[nodo.nombre] = [nodo, nodo.cliente.pipeline(transaction=False), 0]
+        return pipe
+
+    def __getattr__(self, comando):
+        def anotar(clave, *args, **kwargs):
+            nodo = self.cliente.nodo(clave)
+            if not nodo.disponible():
+                self.orden.append((None, 0))
+                return self
+            pipe = self._pipe(nodo)
+            getattr(pipe[1], comando)(clave, *args, **kwargs)
+            self.orden.append((nodo.nombre, pipe[2]))
+            pipe[2] += 1
+            return self
+        return anotar
+
+    def _resultados(self, respuestas):
+        return [respuestas[nombre][i] if nombre is not None else None for nombre, i in self.orden]
+
+    def execute(self):
+        respuestas = {}
+        for nombre, (nodo, pipe, n) in self.pipes.items():
+            try:
+                respuestas[nombre] = pipe.execute()
+            except ERRORES_NODO as e:
+                nodo.marcar_caido(e)
+                respuestas[nombre] = [None] * n
+        resultados = self._resultados(respuestas)
+        self.reset()
+        return resultados
+
+    def reset(self):
+        for _, pipe, _ in self.pipes.values():
+            pipe.reset()
+        self.pipes = {}
+        self.orden = []
+
+class ClienteParticionadoAsync(_BaseParticionado):
+    """Igual que ClienteParticionado, con redis.asyncio (para server_async.py)"""
+    def __init__(self, nombres, max_connections=None, virtuales=REDIS_NODOS_VIRTUALES):
+        super().__init__(nombres, lambda host, puerto: aioredis.Redis(
+            host=host, port=puerto, db=0, max_connections=max_connections,
+            socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT), virtuales)
+
+    def __getattr__(self, comando):
+        async def ejecutar(clave, *args, **kwargs):
+            nodo = self.nodo(clave)
+            if not nodo.disponible():
+                return None
+            try:
+                return await getattr(nodo.cliente, comando)(clave, *args, **kwargs)
+            except ERRORES_NODO as e:
+                nodo.marcar_caido(e)
+                return None
+        return ejecutar
+
+    def lock(self, nombre, **kwargs):
+        nodo = self.nodo(nombre)
+        if not nodo.disponible():
+            return _LockSinNodoAsync()
+        return _LockToleranteAsync(nodo, nodo.cliente.lock(nombre, **kwargs))
+
+    def pipeline(self, transaction=False):
+        return PipelineParticionadoAsync(self)
+
+    async def info(self, seccion=None):
+        infos = []
+        for nodo in self.nodos.values():
+            if not nodo.disponible():
+                continue
+            try:
+                infos.append(await nodo.cliente.info(seccion))
+            except ERRORES_NODO as e:
+                nodo.marcar_caido(e)
+        return self._sumar_memoria(infos)
+
+    async def close(self):
+        for nodo in self.nodos.values():
+            await nodo.cliente.close()
+
+class PipelineParticionadoAsync(PipelineParticionado):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.reset()
+
+    async def execute(self):
+        respuestas = {}
+        for nombre, (nodo, pipe, n) in self.pipes.items():
+            try:
+                respuestas[nombre] = await pipe.execute()
+            except ERRORES_NODO as e:
+                nodo.marcar_caido(e)
+                respuestas[nombre] = [None] * n
+        resultados = self._resultados(respuestas)
+        await self.reset()
+        return resultados
+
+    async def reset(self):
+        for _, pipe, _ in self.pipes.values():
+            await pipe.reset()
+        self.pipes = {}
+        self.orden = []
+
+def cliente_de(redis_client, clave):
+    """Cliente redis del nodo que tiene la clave (o canal); el mismo cliente si no hay REDIS_NODOS"""
+    if isinstance(redis_client, _BaseParticionado):
+        return redis_client.nodo(clave).cliente
+    return redis_client
+
+def crear_cliente_redis(host, puerto):
+    """ClienteParticionado si hay REDIS_NODOS; si no, un redis.Redis como antes"""
+    if REDIS_NODOS:
+        return ClienteParticionado(REDIS_NODOS)
+    return redis.Redis(host=host, port=puerto, db=0)
+
+def crear_cliente_redis_async(host, puerto, max_connections):
+    if REDIS_NODOS:
+        return ClienteParticionadoAsync(REDIS_NODOS, max_connections)
+    return aioredis.Redis(host=host, port=puerto, db=0, max_connections=max_connections)
+
+def movimiento(nombres_antes, nombres_despues, n_claves=100000, virtuales=REDIS_NODOS_VIRTUALES):
+    """Fracción de claves que cambian de nodo entre dos configuraciones del anillo"""
+    antes, despues = Anillo(nombres_antes, virtuales), Anillo(nombres_despues, virtuales)
+    claves = [f"alerta:{i}" for i in range(n_claves)]
+    return sum(1 for clave in claves if antes.nodo(clave) != despues.nodo(clave)) / n_claves
+
+def reparto(nombres, n_claves=100000, virtuales=REDIS_NODOS_VIRTUALES):
+    """Claves por nodo para n_claves claves sintéticas"""
+    anillo = Anillo(nombres, virtuales)
+    conteo = dict.fromkeys(nombres, 0)
+    for i in range(n_claves):
+        conteo[anillo.nodo(f"alerta:{i}")] += 1
+    return conteo
+
+if __name__ == '__main__':
+    # python cache_particionado.py [host:port ...]: reparto de claves y cuántas se mueven al agregar o quitar un nodo
+    nombres = sys.argv[1:] or REDIS_NODOS or [f"redis{i}:6379" for i in range(1, 4)]
+    print(f"Reparto de 100000 claves entre {len(nombres)} nodos ({REDIS_NODOS_VIRTUALES} virtuales por nodo):")
+    for nombre, n in reparto(nombres).items():
+        print(f"  {nombre:<24} {n:>7} ({n / 1000:.1f}%)")
+    nuevo = f"nuevo:{len(nombres) + 1}"
+    print(f"Al agregar un nodo se mueven {movimiento(nombres, nombres + [nuevo]) * 100:.1f}% de las claves "
+          f"(ideal {100 / (len(nombres) + 1):.1f}%)")
+    if len(nombres) > 1:
+        print(f"Al quitar {nombres[-1]} se mueven {movimiento(nombres, nombres[:-1]) * 100:.1f}% de las claves "
+              f"(ideal {100 / len(nombres):.1f}%)")
+    if REDIS_NODOS or sys.argv[1:]:
+        # Con nodos reales: quién responde
+        cliente = ClienteParticionado(nombres)
+        for nombre, nodo in cliente.nodos.items():
+            try:
+                nodo.cliente.ping()
+                print(f"  {nombre}: responde, {nodo.cliente.dbsize()} claves")
+            except ERRORES_NODO as e:
+                print(f"  {nombre}: no responde ({str(e)})")
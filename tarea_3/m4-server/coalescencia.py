@@ -0,0 +1,88 @@
+import asyncio
+import math
+import os
+import random
+import threading
+
+# Evita estampidas de misses cuando expira una clave caliente:
+#   - VueloUnico / VueloUnicoAsync: dentro del proceso, las consultas concurrentes
+#     por la misma clave esperan el resultado de la primera en vez de ir a MongoDB.
+#   - Entre procesos se usa un lock corto en Redis (ver server.py y server_async.py).
+#   - Expiración anticipada probabilística (XFetch): una lectura que encuentra la
+#     clave cerca de expirar la refresca antes de tiempo, con una probabilidad que
+#     crece a medida que se acerca el fin del TTL.
+
+LOCK_TTL_MS = int(os.environ.get('LOCK_TTL_MS', 2000))  # Vida máxima del lock en Redis
+LOCK_ESPERA = float(os.environ.get('LOCK_ESPERA', 1.0))  # Segundos que se espera al dueño del lock
+LOCK_SONDEO = 0.01  # Cada cuánto se revisa Redis mientras se espera
+XFETCH_BETA = float(os.environ.get('XFETCH_BETA', 1.0))  # > 1 refresca antes, 0 desactiva
+
+class VueloUnico:
+    """Agrupa las llamadas concurrentes (hilos) con la misma clave en una sola ejecución"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.en_vuelo = {}
+
+    def ejecutar(self, clave, funcion):
+        """Retorna (resultado, coalescido): coalescido es True si se esperó a otro hilo"""
+        with self.lock:
+            vuelo = self.en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                # [evento, resultado, excepción]
+                vuelo = self.en_vuelo[clave] = [threading.Event(), None, None]
+
+        if not lider:
+            vuelo[0].wait()
+            if vuelo[2] is not None:
+                raise vuelo[2]
+            return vuelo[1], True
+
+        try:
+            vuelo[1] = funcion()
+        except Exception as e:
+            vuelo[2] = e
+            raise
+        finally:
+            with self.lock:
+                del self.en_vuelo[clave]
+            vuelo[0].set()
+        return vuelo[1], False
+
+class VueloUnicoAsync:
+    """Lo mismo que VueloUnico para corrutinas dentro de un event loop"""
+    def __init__(self):
+        self.en_vuelo = {}
+
+    async def ejecutar(self, clave, funcion):
+        futuro = self.en_vuelo.get(clave)
+        if futuro is not None:
+            return await asyncio.shield(futuro), True
+
+        futuro = asyncio.ensure_future(funcion())
+        self.en_vuelo[clave] = futuro
+        try:
+            # shield: si se cancela esta consulta, las que esperan siguen recibiendo el resultado
+            return await asyncio.shield(futuro), False
+        finally:
+            if self.en_vuelo.get(clave) is futuro:
+                del self.en_vuelo[clave]
+
+class TiempoRecalculo:
+    """Promedio móvil del tiempo que toma traer un documento de MongoDB (delta de XFetch)"""
+    def __init__(self, inicial_ms=5.0, alfa=0.1):
+        self.valor_ms = inicial_ms
+        self.alfa = alfa
+
+    def registrar(self, tiempo_ms):
+        self.valor_ms += self.alfa * (tiempo_ms - self.valor_ms)
+
+def refrescar_antes(pttl_ms, delta_ms, beta=XFETCH_BETA):
+    """
+    XFetch: True si hay que refrescar ya una clave a la que le quedan pttl_ms. Con
+    delta el costo de recalcular, la probabilidad es casi nula lejos de la expiración
+    y sube hasta 1 cuando lo que queda es del orden de unos pocos delta.
+    """
+    if beta <= 0 or pttl_ms is None or pttl_ms < 0:
+        return False
+    return -delta_ms * beta * math.log(1.0 - random.random()) >= pttl_ms
@@ -0,0 +1,86 @@
+import json
+import os
+import zlib
+from datetime import datetime
+
+import msgpack
+from bson import Decimal128, ObjectId, json_util
+
+# Formato de los valores en Redis (y en L1). Un documento se serializa una sola vez
+# con msgpack y, si pasa de CACHE_COMPRIMIR_DESDE bytes, se comprime con zlib. El
+# primer byte indica el formato; los valores JSON que dejaron versiones anteriores
+# empiezan con '{' y se siguen leyendo. VALOR_NO_EXISTE es la entrada de la caché
+# negativa (un UUID que no está en MongoDB).
+
+CACHE_FORMATO = os.environ.get('CACHE_FORMATO', 'msgpack')  # 'json' = formato anterior (legible en Redis)
+CACHE_COMPRIMIR_DESDE = int(os.environ.get('CACHE_COMPRIMIR_DESDE', 512))  # Bytes; 0 = nunca comprimir
+CACHE_ZLIB_NIVEL = int(os.environ.get('CACHE_ZLIB_NIVEL', 1))  # Nivel bajo: el miss no debe pagar mucha CPU
+
+MARCA_NO_EXISTE = b'\x00'
+MARCA_MSGPACK = b'\x01'
+MARCA_MSGPACK_ZLIB = b'\x02'
+VALOR_NO_EXISTE = MARCA_NO_EXISTE
+
+def _campos(variable):
+    """'uuid,type,street' -> ['uuid', 'type', 'street']; '-line' excluye en vez de incluir"""
+    return [campo.strip() for campo in os.environ.get(variable, '').split(',') if campo.strip()]
+
+# Campos que se guardan en caché por tipo de clave; vacío = todo el documento menos _id
+CACHE_CAMPOS = {
+    'alerta': _campos('CACHE_CAMPOS_ALERTA'),
+    'atasco': _campos('CACHE_CAMPOS_ATASCO'),
+}
+
+def proyeccion(prefijo):
+    """
+    Proyección de MongoDB para las claves prefijo:<uuid>. Se aplica en la consulta,
+    así los campos que no van a la caché tampoco viajan desde MongoDB. uuid siempre
+    se incluye porque las consultas en lote y el precalentamiento lo usan.
+    """
+    campos = CACHE_CAMPOS.get(prefijo) or []
+    excluidos = [campo[1:] for campo in campos if campo.startswith('-')]
+    if excluidos:
+        return {"_id": 0, **{campo: 0 for campo in excluidos if campo != 'uuid'}}
+    if campos:
+        return {"_id": 0, "uuid": 1, **{campo: 1 for campo in campos}}
+    return {"_id": 0}
+
+def proyeccion_de_clave(cache_key):
+    return proyeccion(cache_key.partition(':')[0])
+
+def _tipos_basicos(valor):
+    # Tipos BSON que msgpack no conoce
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal128):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable en caché: {type(valor).__name__}")
+
+def codificar(documento):
+    """Documento de MongoDB -> bytes para Redis, en una sola pasada"""
+    if CACHE_FORMATO == 'json':
+        return json_util.dumps(documento).encode('utf-8')
+    datos = msgpack.packb(documento, default=_tipos_basicos, use_bin_type=True)
+    if CACHE_COMPRIMIR_DESDE and len(datos) >= CACHE_COMPRIMIR_DESDE:
+        comprimido = zlib.compress(datos, CACHE_ZLIB_NIVEL)
+        if len(comprimido) < len(datos):
+            return MARCA_MSGPACK_ZLIB + comprimido
+    return MARCA_MSGPACK + datos
+
+def decodificar(datos):
+    """Bytes leídos de Redis -> documento, en cualquiera de los formatos (None si no hay datos o no existe)"""
+    if not datos:
+        return None
+    marca = datos[:1]
+    if marca == MARCA_NO_EXISTE:
+        return None
+    if marca == MARCA_MSGPACK:
+        return msgpack.unpackb(memoryview(datos)[1:], raw=False)
+    if marca == MARCA_MSGPACK_ZLIB:
+        return msgpack.unpackb(zlib.decompress(memoryview(datos)[1:]), raw=False)
+    return json.loads(datos)
+
+def es_no_existe(datos):
+    return datos == VALOR_NO_EXISTE
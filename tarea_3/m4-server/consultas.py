@@ -0,0 +1,156 @@
+import logging
+import os
+
+from cache_l1 import ttl_l1
+from codec_cache import VALOR_NO_EXISTE, codificar, es_no_existe
+
+# Lo que server.py y server_async.py hacen igual al atender una consulta y que no
+# toca la red: clasificar lo leído de L1 y Redis, contar y registrar resultados,
+# armar las consultas en lote y sus respuestas, y comparar ETags. Cada servidor
+# solo pone los viajes a Redis y MongoDB (bloqueantes o con await).
+
+# Resultados que se responden como no_encontrado: descartado por el filtro de UUIDs,
+# entrada de la caché negativa o no está en MongoDB
+NO_ENCONTRADOS = ("filtrado", "negativo", "no_encontrado")
+
+def configurar_registro():
+    """
+    Con LOG_CONSULTAS=1 cada hit y cada miss escribe "Cache <resultado> for ..." con
+    marca de tiempo (m6-simulador-cache las lee como traza .log). Apagado por
+    defecto porque cuesta por consulta.
+    """
+    if os.environ.get('LOG_CONSULTAS', '0') == '1':
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+def linea_log(resultado, cache_key):
+    tipo, _, uuid = cache_key.partition(':')
+    if resultado == "miss":
+        return f"Cache miss for {tipo} UUID: {uuid}, querying MongoDB"
+    return f"Cache {resultado} for {tipo} UUID: {uuid}"
+
+def clasificar(valor, nivel):
+    """Valor leído de L1 o Redis: "negativo" (caché negativa), nivel ("hit_l1" | "hit_l2") o None si no estaba"""
+    if not valor:
+        return None
+    return "negativo" if es_no_existe(valor) else nivel
+
+def guardar_l1_desde_redis(cache_l1, cache_key, valor, pttl):
+    # La entrada L1 no debe durar más que la de Redis
+    cache_l1.guardar(cache_key, valor, ttl_l1(pttl / 1000 if pttl >= 0 else pttl))
+
+def registrar_resultado(metricas, logger, cache_key, resultado):
+    """Cuenta el resultado en /metrics; los hits además dejan su línea de log"""
+    tipo = cache_key.partition(':')[0]
+    if resultado in ("hit_l1", "hit_l2"):
+        logger.info(linea_log(resultado, cache_key))
+    metricas.contar('api_cache_consultas_total', (tipo, resultado))
+
+def respuesta(resultado, tiempo_ms=None, coalescido=None):
+    """Cuerpo JSON de /alerta/<uuid> y /atasco/<uuid>"""
+    if resultado in NO_ENCONTRADOS:
+        return {"resultado": "no_encontrado"}
+    cuerpo = {"resultado": resultado, "tiempo (ms)": tiempo_ms}
+    if coalescido is not None:
+        cuerpo["coalescido"] = coalescido
+    return cuerpo
+
+def uuid_atasco(uuid):
+    # Los uuids de atasco son enteros
+    return int(uuid) if uuid.isdigit() else None
+
+def etag_coincide(if_none_match, etag):
+    """If-None-Match con comparación débil (RFC 7232): W/"etag" vale igual que "etag" y * calza con todo"""
+    etiquetas = [etiqueta.strip() for etiqueta in (if_none_match or '').split(',')]
+    return '*' in etiquetas or etag in [e[2:] if e.startswith('W/') else e for e in etiquetas]
+
+def uuids_del_cuerpo(cuerpo, maximo):
+    """UUIDs del cuerpo ({"uuids": [...]} o directamente la lista), sin repetidos y en orden. Retorna (uuids, error)"""
+    uuids = cuerpo.get('uuids') if isinstance(cuerpo, dict) else cuerpo
+    if not isinstance(uuids, list):
+        return None, 'Se espera {"uuids": [...]}'
+    if len(uuids) > maximo:
+        return None, f'Máximo {maximo} UUIDs por lote'
+    return list(dict.fromkeys(str(uuid) for uuid in uuids)), None
+
+class Lote:
+    """
+    Una consulta en lote: L1, luego un pipeline GET+PTTL a Redis por todas las claves
+    que faltan, luego un solo find con $in en MongoDB y un pipeline de SETEX con lo
+    encontrado. El servidor hace los viajes con claves_pendientes, filtro_mongo y
+    escrituras; el resto pasa aquí. convertir pasa el uuid de la URL al tipo guardado
+    en MongoDB (None = no existe). Los UUIDs que el filtro descarta y las entradas de
+    la caché negativa son no_encontrado.
+    """
+    def __init__(self, prefijo, uuids, convertir, filtro_uuids, cache_l1, frecuencias):
+        self.prefijo = prefijo
+        self.uuids = uuids
+        self.cache_l1 = cache_l1
+        self.resultados = {}
+        self.valores = {}
+        self.tiempos = {}
+        self.pendientes = []
+        for uuid in uuids:
+            valor = convertir(uuid) if convertir else uuid
+            if valor is None or not filtro_uuids.puede_existir(prefijo, valor):
+                self.resultados[uuid] = "no_encontrado"
+                continue
+            self.valores[uuid] = valor
+            frecuencias.registrar(self.clave(uuid))
+            resultado = clasificar(cache_l1.obtener(self.clave(uuid)), "hit_l1")
+            if resultado:
+                self.resultados[uuid] = "no_encontrado" if resultado == "negativo" else resultado
+            else:
+                self.pendientes.append(uuid)
+
+    def clave(self, uuid):
+        return f"{self.prefijo}:{uuid}"
+
+    def claves_pendientes(self):
+        return [self.clave(uuid) for uuid in self.pendientes]
+
+    def con_redis(self, respuestas):
+        """respuestas: GET y PTTL alternados, en el orden de claves_pendientes"""
+        faltantes = []
+        for i, uuid in enumerate(self.pendientes):
+            cached_data, pttl = respuestas[2 * i], respuestas[2 * i + 1]
+            resultado = clasificar(cached_data, "hit_l2")
+            if resultado:
+                self.resultados[uuid] = "no_encontrado" if resultado == "negativo" else resultado
+                guardar_l1_desde_redis(self.cache_l1, self.clave(uuid), cached_data, pttl)
+            else:
+                faltantes.append(uuid)
+        self.pendientes = faltantes
+
+    def filtro_mongo(self):
+        return {"uuid": {"$in": [self.valores[uuid] for uuid in self.pendientes]}}
+
+    def escrituras(self, documentos, expiracion, negativo_ttl):
+        """
+        Resultados de lo traído de MongoDB. Retorna [(clave, ttl, datos)] para el
+        pipeline de SETEX y deja lo mismo en L1.
+        """
+        por_valor = {self.valores[uuid]: uuid for uuid in self.pendientes}
+        escrituras = []
+        for documento in documentos:
+            uuid = por_valor.pop(documento["uuid"], None)
+            if uuid is None:
+                continue
+            escrituras.append((self.clave(uuid), expiracion, codificar(documento)))
+            self.resultados[uuid] = "miss"
+        for uuid in por_valor.values():
+            self.resultados[uuid] = "no_encontrado"
+            if negativo_ttl > 0:
+                escrituras.append((self.clave(uuid), negativo_ttl, VALOR_NO_EXISTE))
+        for clave, ttl, datos in escrituras:
+            self.cache_l1.guardar(clave, datos, ttl_l1(ttl))
+        self.pendientes = []
+        return escrituras
+
+    def respuesta(self, metricas):
+        conteo = {}
+        for resultado in self.resultados.values():
+            conteo[resultado] = conteo.get(resultado, 0) + 1
+        for resultado, n in conteo.items():
+            metricas.contar('api_cache_consultas_total', (self.prefijo, resultado), n)
+        return {"resultados": [{"uuid": uuid, "resultado": self.resultados[uuid]} for uuid in self.uuids],
+                "conteo": conteo, "tiempo (ms)": self.tiempos}
@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from datetime import timedelta
+
+from bson import ObjectId
+from redis.exceptions import RedisError
+
+from cache_particionado import cliente_de
+
+# Filtro de Bloom en memoria con los UUIDs que existen en MongoDB, uno por tipo. Una
+# consulta por un UUID que el filtro no conoce se responde no_encontrado sin tocar
+# Redis ni MongoDB; los falsos positivos siguen el camino normal y terminan en la
+# caché negativa.
+#
+# Se construye al iniciar recorriendo la colección y luego se pone al día cada
+# FILTRO_REFRESCO segundos con los documentos de _id mayor al último visto. Entre
+# dos puestas al día el filtro no conoce lo recién insertado, así que solo rechaza
+# mientras invalidador_cache (modo cambios) le avisa cada UUID insertado por el
+# canal pub/sub FILTRO_CANAL de Redis. El invalidador manda además un latido cada
+# FILTRO_LATIDO segundos cuando está al día con el change stream. Un tipo rechaza
+# solo si hay latidos recientes y su última puesta al día empezó después de que el
+# canal quedó sin cortes (lo insertado antes lo trae la puesta al día); si no, la
+# consulta sigue hacia Redis y MongoDB. Queda como ventana el retraso del change
+# stream entre que se inserta un documento y llega el aviso (milisegundos).
+#
+# Apagado por defecto: FILTRO_UUIDS=1 lo activa.
+
+FILTRO_UUIDS = os.environ.get('FILTRO_UUIDS', '0') == '1'
+FILTRO_TASA_FP = float(os.environ.get('FILTRO_TASA_FP', 0.01))  # Falsos positivos esperados
+FILTRO_REFRESCO = float(os.environ.get('FILTRO_REFRESCO', 30))  # Segundos entre puestas al día
+FILTRO_HOLGURA = 1.5  # Capacidad respecto a los documentos al construir, para el crecimiento
+FILTRO_SOLAPE = 60  # Segundos de _id que se vuelven a leer en cada puesta al día (inserciones fuera de orden)
+FILTRO_LOTE = 5000  # Documentos por viaje al recorrer la colección
+FILTRO_CANAL = os.environ.get('FILTRO_CANAL', 'filtro_uuids:insertados')  # Canal pub/sub de invalidador_cache
+FILTRO_LATIDO = float(os.environ.get('FILTRO_LATIDO', 5))  # Segundos entre latidos del invalidador
+FILTRO_LATIDO_MAX = 3 * FILTRO_LATIDO  # Sin latidos por más tiempo se considera cortado el canal
+
+class FiltroBloom:
+    """Conjunto aproximado: k posiciones por elemento con doble hash sobre un blake2b de 128 bits"""
+    def __init__(self, capacidad, tasa_fp=FILTRO_TASA_FP):
+        self.capacidad = max(int(capacidad), 1000)
+        self.m = max(64, int(math.ceil(-self.capacidad * math.log(tasa_fp) / (math.log(2) ** 2))))
+        self.k = max(1, round(self.m / self.capacidad * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.elementos = 0
+
+    def _posiciones(self, valor):
+        digest = hashlib.blake2b(str(valor).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def agregar(self, valor):
+        nuevo = False
+        for posicion in self._posiciones(valor):
+            byte, bit = posicion >> 3, 1 << (posicion & 7)
+            if not self.bits[byte] & bit:
+                self.bits[byte] |= bit
+                nuevo = True
+        if nuevo:
+            self.elementos += 1
+
+    def __contains__(self, valor):
+        bits = self.bits
+        return all(bits[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(valor))
+
+    @property
+    def lleno(self):
+        return self.elementos > self.capacidad
+
+class FiltroUUIDs:
+    """
+    Filtros por tipo ('alerta', 'atasco'). Mientras un tipo no termina su primera
+    construcción, o mientras su rechazo no es confiable (ver confiable), todos sus
+    UUIDs se consideran posibles.
+    """
+    def __init__(self, activo=FILTRO_UUIDS):
+        self.activo = activo
+        self.filtros = {}
+        self.ultimo_id = {}
+        self.lock = threading.Lock()
+        self.estadisticas = {"rechazados": 0, "sin_confirmar": 0}
+        self.canal_desde = None  # Instante (monotónico) desde el que el canal no se corta; None = sin suscripción
+        self.ultimo_latido = 0.0
+        self.al_dia = {}  # tipo -> instante en que empezó la última puesta al día completa
+
+    def confiable(self, tipo):
+        """Si el filtro del tipo conoce todo lo insertado: canal con latidos y puesta al día posterior al corte"""
+        desde = self.canal_desde
+        return (desde is not None and time.monotonic() - self.ultimo_latido <= FILTRO_LATIDO_MAX
+                and self.al_dia.get(tipo, float('-inf')) >= desde)
+
+    def puede_existir(self, tipo, uuid):
+        filtro = self.filtros.get(tipo)
+        if filtro is None or uuid in filtro:
+            return True
+        if not self.confiable(tipo):
+            # Puede ser un UUID insertado después de la última puesta al día
+            self.estadisticas["sin_confirmar"] += 1
+            return True
+        self.estadisticas["rechazados"] += 1
+        return False
+
+    def agregar(self, tipo, uuid):
+        """UUID insertado que avisa el invalidador"""
+        with self.lock:
+            filtro = self.filtros.get(tipo)
+            if filtro is not None:
+                filtro.agregar(uuid)
+
+    # Canal de invalidador_cache
+
+    def suscrito(self):
+        self.canal_desde = time.monotonic()
+
+    def desconectado(self):
+        self.canal_desde = None
+
+    def recibir(self, datos):
+        """Mensaje del canal: {"uuids": {tipo: [...]}} con lo insertado, o {"latido": ts}"""
+        try:
+            mensaje = json.loads(datos)
+        except ValueError:
+            print(f"Mensaje inválido en {FILTRO_CANAL}: {datos!r}")
+            return
+        for tipo, uuids in mensaje.get("uuids", {}).items():
+            for uuid in uuids:
+                self.agregar(tipo, uuid)
+        if "latido" in mensaje:
+            ahora = time.monotonic()
+            if ahora - self.ultimo_latido > FILTRO_LATIDO_MAX:
+                # Hubo un corte (o es el primer latido): lo insertado entretanto lo trae la próxima puesta al día
+                self.canal_desde = ahora
+            self.ultimo_latido = ahora
+
+    def escuchar(self, redis_client):
+        """Hilo: sigue el canal del invalidador y se vuelve a suscribir si se corta"""
+        cliente = cliente_de(redis_client, FILTRO_CANAL)
+        while True:
+            pubsub = cliente.pubsub()
+            try:
+                pubsub.subscribe(FILTRO_CANAL)
+                while True:
+                    mensaje = pubsub.get_message(timeout=1.0)
+                    if mensaje is None:
+                        continue
+                    if mensaje["type"] == "subscribe":
+                        self.suscrito()
+                    elif mensaje["type"] == "message":
+                        self.recibir(mensaje["data"])
+            except RedisError as e:
+                print(f"Canal {FILTRO_CANAL} cortado ({str(e)}), el filtro deja pasar todo hasta reconectar")
+            finally:
+                self.desconectado()
+                pubsub.close()
+            time.sleep(1)
+
+    async def escuchar_async(self, redis_client):
+        """Igual que escuchar, con redis.asyncio"""
+        cliente = cliente_de(redis_client, FILTRO_CANAL)
+        while True:
+            pubsub = cliente.pubsub()
+            try:
+                await pubsub.subscribe(FILTRO_CANAL)
+                while True:
+                    mensaje = await pubsub.get_message(timeout=1.0)
+                    if mensaje is None:
+                        continue
+                    if mensaje["type"] == "subscribe":
+                        self.suscrito()
+                    elif mensaje["type"] == "message":
+                        self.recibir(mensaje["data"])
+            except RedisError as e:
+                print(f"Canal {FILTRO_CANAL} cortado ({str(e)}), el filtro deja pasar todo hasta reconectar")
+            finally:
+                self.desconectado()
+                await pubsub.reset()
+            await asyncio.sleep(1)
+
+    def _desde(self, tipo):
+        """Filtro de la puesta al día: _id desde el último visto menos FILTRO_SOLAPE segundos"""
+        ultimo = self.ultimo_id.get(tipo)
+        if not isinstance(ultimo, ObjectId):
+            return {}
+        return {"_id": {"$gte": ObjectId.from_datetime(ultimo.generation_time - timedelta(seconds=FILTRO_SOLAPE))}}
+
+    def _incorporar(self, tipo, filtro, documento):
+        filtro.agregar(documento["uuid"])
+        ultimo = self.ultimo_id.get(tipo)
+        if ultimo is None or documento["_id"] > ultimo:
+            self.ultimo_id[tipo] = documento["_id"]
+
+    def _reemplazar(self, tipo, filtro):
+        with self.lock:
+            self.filtros[tipo] = filtro
+
+    def construir(self, tipo, collection):
+        """Recorre la colección completa y reemplaza el filtro del tipo"""
+        capacidad = collection.estimated_document_count() * FILTRO_HOLGURA
+        while True:
+            filtro = FiltroBloom(capacidad)
+            self.ultimo_id.pop(tipo, None)
+            for documento in collection.find({}, {"uuid": 1}).batch_size(FILTRO_LOTE):
+                self._incorporar(tipo, filtro, documento)
+            if not filtro.lleno:
+                break
+            capacidad = filtro.elementos * FILTRO_HOLGURA  # El conteo estimado se quedó corto
+        self._reemplazar(tipo, filtro)
+        # Lo insertado mientras se recorría la colección
+        self.actualizar(tipo, collection)
+
+    def actualizar(self, tipo, collection):
+        """Agrega los documentos nuevos; si el filtro se llenó lo reconstruye más grande"""
+        inicio = time.monotonic()
+        filtro = self.filtros.get(tipo)
+        if filtro is None or filtro.lleno:
+            self.construir(tipo, collection)
+            return
+        for documento in collection.find(self._desde(tipo), {"uuid": 1}).batch_size(FILTRO_LOTE):
+            with self.lock:
+                self._incorporar(tipo, filtro, documento)
+        self.al_dia[tipo] = inicio
+
+    async def construir_async(self, tipo, collection):
+        """Igual que construir, con motor"""
+        capacidad = await collection.estimated_document_count() * FILTRO_HOLGURA
+        while True:
+            filtro = FiltroBloom(capacidad)
+            self.ultimo_id.pop(tipo, None)
+            async for documento in collection.find({}, {"uuid": 1}).batch_size(FILTRO_LOTE):
+                self._incorporar(tipo, filtro, documento)
+            if not filtro.lleno:
+                break
+            capacidad = filtro.elementos * FILTRO_HOLGURA
+        self._reemplazar(tipo, filtro)
+        await self.actualizar_async(tipo, collection)
+
+    async def actualizar_async(self, tipo, collection):
+        inicio = time.monotonic()
+        filtro = self.filtros.get(tipo)
+        if filtro is None or filtro.lleno:
+            await self.construir_async(tipo, collection)
+            return
+        async for documento in collection.find(self._desde(tipo), {"uuid": 1}).batch_size(FILTRO_LOTE):
+            self._incorporar(tipo, filtro, documento)
+        self.al_dia[tipo] = inicio
+
+    def info(self):
+        return {tipo: {"elementos": filtro.elementos, "capacidad": filtro.capacidad, "bytes": len(filtro.bits),
+                       "funciones_hash": filtro.k, "confiable": self.confiable(tipo)} for tipo, filtro in self.filtros.items()}
+
+    def medidas(self):
+        """Para /metrics: elementos y bytes de cada filtro"""
+        return ([((tipo, "elementos"), filtro.elementos) for tipo, filtro in self.filtros.items()] +
+                [((tipo, "bytes"), len(filtro.bits)) for tipo, filtro in self.filtros.items()])
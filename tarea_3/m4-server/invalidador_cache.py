@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import time
+from datetime import timedelta
+
+import pymongo
+from bson import json_util
+from pymongo.errors import OperationFailure, PyMongoError
+
+from cache_particionado import crear_cliente_redis
+from codec_cache import codificar, proyeccion
+from filtro_uuids import FILTRO_CANAL, FILTRO_LATIDO, FILTRO_LATIDO_MAX
+
+# Invalidación de la caché cuando cambian los documentos en MongoDB. El scrapper
+# actualiza alertas y atascos en el lugar (upserts con updated_at, ended_at al
+# terminar), así que sin esto Redis sirve la versión vieja hasta CACHE_EXPIRATION.
+# Con el invalidador corriendo, la caché se mantiene al día y CACHE_EXPIRATION se
+# puede subir bastante sin servir datos viejos (L1 de cada servidor sigue con su
+# L1_TTL de pocos segundos).
+#
+# Modos:
+#   - cambios: change stream sobre la base (alertas y atascos). Requiere replica
+#     set; el resume token se guarda en INVALIDACION_ESTADO_RUTA y al reiniciar se
+#     sigue desde ahí, sin perder los cambios ocurridos mientras estuvo abajo.
+#   - sondeo: consulta cada INVALIDACION_SONDEO segundos los documentos con
+#     updated_at o ended_at posterior a la última marca vista y los _id nuevos.
+#   - auto: cambios si el servidor lo soporta, si no sondeo.
+#
+# Acciones sobre cada clave cambiada:
+#   - refrescar: relee el documento (un $in por lote) y lo reescribe con SET XX, o
+#     sea solo si la clave ya estaba en Redis. También reemplaza las entradas de la
+#     caché negativa de documentos recién insertados.
+#   - borrar: DEL de la clave; la próxima consulta la trae de MongoDB.
+# Cada lote se vuelve a aplicar INVALIDACION_REPETIR segundos después, por si un
+# miss concurrente alcanzó a leer la versión anterior y guardarla en Redis.
+#
+# Los delete solo traen el _id en el change stream, así que no tienen clave que
+# invalidar (el scrapper no borra documentos: marca ended_at).
+#
+# En modo cambios también avisa por FILTRO_CANAL los UUIDs insertados, con un
+# latido cada FILTRO_LATIDO segundos mientras está al día, para el filtro de UUIDs
+# de los servidores (ver filtro_uuids.py). En modo sondeo no hay latidos y el
+# filtro no rechaza nada.
+#
+# Replica set local de un nodo para probar el modo cambios:
+#   docker run -d --name mongo-rs -p 27017:27017 mongo --replSet rs0
+#   docker exec mongo-rs mongosh --eval "rs.initiate()"
+#   MONGO_URI="mongodb://localhost:27017/?directConnection=true" python invalidador_cache.py --modo cambios
+
+INVALIDACION_MODO = os.environ.get('INVALIDACION_MODO', 'auto')  # auto | cambios | sondeo
+INVALIDACION_ACCION = os.environ.get('INVALIDACION_ACCION', 'refrescar')  # refrescar | borrar
+INVALIDACION_SONDEO = float(os.environ.get('INVALIDACION_SONDEO', 2))  # Segundos entre consultas en modo sondeo
+INVALIDACION_SOLAPE = float(os.environ.get('INVALIDACION_SOLAPE', 5))  # Segundos que se releen bajo la marca (relojes y escrituras tardías)
+INVALIDACION_REPETIR = float(os.environ.get('INVALIDACION_REPETIR', 1))  # Segundos hasta la segunda pasada; 0 = sin repetir
+INVALIDACION_LOTE = int(os.environ.get('INVALIDACION_LOTE', 500))  # Cambios por $in y por pipeline
+INVALIDACION_ESTADO_RUTA = os.environ.get('INVALIDACION_ESTADO_RUTA', './datos/invalidador.json')
+CACHE_EXPIRATION = int(os.environ.get('CACHE_EXPIRATION', 300))  # TTL de las claves refrescadas, igual que los servidores
+INVALIDACION_REPORTE = 60  # Segundos entre resúmenes por consola
+
+PREFIJOS = {'alertas': 'alerta', 'atascos': 'atasco'}
+
+# Códigos de MongoDB: sin replica set, y resume token fuera del oplog
+NO_ES_REPLICA_SET = (40573,)
+HISTORIA_PERDIDA = (260, 280, 286)
+
+def _mas_reciente(version):
+    fechas = [fecha for fecha in version if fecha is not None]
+    return max(fechas) if fechas else None
+
+class EstadoInvalidador:
+    """Resume token del change stream y marcas del sondeo, persistidos en un JSON"""
+    def __init__(self, ruta=INVALIDACION_ESTADO_RUTA):
+        self.ruta = ruta
+        self.token = None
+        self.marcas = {}      # colección -> último updated_at/ended_at visto
+        self.ultimos_id = {}  # colección -> último _id visto
+        self.guardado = 0.0
+
+    def cargar(self):
+        if not self.ruta or not os.path.exists(self.ruta):
+            return False
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                # Fechas sin zona, igual que las que devuelve pymongo al sondear
+                datos = json_util.loads(f.read(), json_options=json_util.JSONOptions(tz_aware=False))
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer el estado del invalidador ({str(e)}), se parte desde ahora")
+            return False
+        self.token = datos.get('token')
+        self.marcas = datos.get('marcas', {})
+        self.ultimos_id = datos.get('ultimos_id', {})
+        return True
+
+    def guardar(self, forzar=False):
+        # Como mucho una vez por segundo: perder el último segundo solo repite cambios al reiniciar
+        if not self.ruta or (not forzar and time.monotonic() - self.guardado < 1):
+            return
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        temporal = self.ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(json_util.dumps({'token': self.token, 'marcas': self.marcas, 'ultimos_id': self.ultimos_id}))
+        os.replace(temporal, self.ruta)
+        self.guardado = time.monotonic()
+
+class Invalidador:
+    def __init__(self, db, redis_client, accion=INVALIDACION_ACCION, estado=None):
+        self.db = db
+        self.redis_client = redis_client
+        self.accion = accion
+        self.estado = estado or EstadoInvalidador()
+        self.repetir = []  # [(instante, {colección: uuids})] para la segunda pasada
+        self.estadisticas = {"eventos": 0, "sin_uuid": 0, "refrescadas": 0, "borradas": 0, "lotes": 0}
+        self.ultimo_reporte = time.monotonic()
+        self.ultimo_latido = 0.0
+        self.latidos_pausados_hasta = 0.0
+
+    def aplicar(self, cambios, repetir=True):
+        """cambios: {colección: set(uuid)}. Refresca o borra las claves en un pipeline"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        operaciones = []  # "refrescadas" | "borradas", una por comando del pipeline
+        for coleccion, uuids in cambios.items():
+            prefijo = PREFIJOS[coleccion]
+            pendientes = list(uuids)
+            for i in range(0, len(pendientes), INVALIDACION_LOTE):
+                lote = set(pendientes[i:i + INVALIDACION_LOTE])
+                if self.accion == 'refrescar':
+                    for documento in self.db[coleccion].find({"uuid": {"$in": list(lote)}}, proyeccion(prefijo)):
+                        pipe.set(f"{prefijo}:{documento['uuid']}", codificar(documento), ex=CACHE_EXPIRATION, xx=True)
+                        lote.discard(documento["uuid"])
+                        operaciones.append("refrescadas")
+                # Borrados de MongoDB o acción borrar
+                for uuid in lote:
+                    pipe.delete(f"{prefijo}:{uuid}")
+                    operaciones.append("borradas")
+        # Solo cuentan las claves que estaban en Redis
+        for operacion, resultado in zip(operaciones, pipe.execute()):
+            if resultado:
+                self.estadisticas[operacion] += 1
+        self.estadisticas["lotes"] += 1
+        if repetir and INVALIDACION_REPETIR > 0:
+            self.repetir.append((time.monotonic() + INVALIDACION_REPETIR, cambios))
+
+    def repetir_pendientes(self):
+        ahora = time.monotonic()
+        while self.repetir and self.repetir[0][0] <= ahora:
+            _, cambios = self.repetir.pop(0)
+            self.aplicar(cambios, repetir=False)
+        if ahora - self.ultimo_reporte >= INVALIDACION_REPORTE:
+            print(f"Invalidador: {self.estadisticas}")
+            self.ultimo_reporte = ahora
+
+    # Avisos al filtro de UUIDs
+
+    def _publicar(self, mensaje):
+        if self.redis_client.publish(FILTRO_CANAL, json.dumps(mensaje)) is None:
+            # Con REDIS_NODOS y el nodo del canal caído el aviso se pierde: sin latidos
+            # por un rato los servidores ven el corte y se vuelven a poner al día
+            self.latidos_pausados_hasta = time.monotonic() + FILTRO_LATIDO_MAX + FILTRO_LATIDO
+
+    def avisar_insertados(self, insertados):
+        """insertados: {colección: set(uuid)}"""
+        self._publicar({"uuids": {PREFIJOS[coleccion]: list(uuids) for coleccion, uuids in insertados.items()}})
+
+    def latido(self):
+        """Solo cuando ya se leyó todo lo que había en el change stream"""
+        ahora = time.monotonic()
+        if ahora >= self.latidos_pausados_hasta and ahora - self.ultimo_latido >= FILTRO_LATIDO:
+            self._publicar({"latido": time.time()})
+            self.ultimo_latido = ahora
+
+    # Modo cambios
+
+    def seguir_cambios(self):
+        """Procesa el change stream en lotes; retorna solo si el servidor no lo soporta"""
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": list(PREFIJOS)},
+                        "operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+            # Del documento completo solo interesa el uuid
+            {"$project": {"operationType": 1, "ns": 1, "documentKey": 1, "fullDocument.uuid": 1}},
+        ]
+        while True:
+            try:
+                # try_next espera como mucho un segundo, así las segundas pasadas no se atrasan
+                with self.db.watch(pipeline, full_document='updateLookup', resume_after=self.estado.token,
+                                   max_await_time_ms=1000) as stream:
+                    print(f"Siguiendo el change stream de {self.db.name} ({'reanudado' if self.estado.token else 'desde ahora'})")
+                    while stream.alive:
+                        cambios, insertados, n = self._leer_lote(stream)
+                        if insertados:
+                            self.avisar_insertados(insertados)
+                        if n:
+                            self.aplicar(cambios)
+                        if n < INVALIDACION_LOTE:
+                            self.latido()
+                        self.estado.token = stream.resume_token
+                        self.estado.guardar()
+                        self.repetir_pendientes()
+            except OperationFailure as e:
+                if e.code in NO_ES_REPLICA_SET:
+                    return
+                if e.code in HISTORIA_PERDIDA and self.estado.token is not None:
+                    print(f"El resume token ya no está en el oplog ({str(e)}), se sigue desde ahora; "
+                          f"lo cambiado mientras tanto expira con CACHE_EXPIRATION")
+                    self.estado.token = None
+                    continue
+                print(f"Error en el change stream: {str(e)}")
+            except PyMongoError as e:
+                print(f"Error en el change stream: {str(e)}")
+            time.sleep(1)
+
+    def _leer_lote(self, stream):
+        cambios = {}
+        insertados = {}
+        n = 0
+        while n < INVALIDACION_LOTE:
+            cambio = stream.try_next()
+            if cambio is None:
+                break
+            self.estadisticas["eventos"] += 1
+            uuid = (cambio.get("fullDocument") or {}).get("uuid")
+            if uuid is None:
+                # delete, o update de un documento que ya no existe
+                self.estadisticas["sin_uuid"] += 1
+                continue
+            cambios.setdefault(cambio["ns"]["coll"], set()).add(uuid)
+            if cambio["operationType"] == "insert":
+                insertados.setdefault(cambio["ns"]["coll"], set()).add(uuid)
+            n += 1
+        return cambios, insertados, n
+
+    # Modo sondeo
+
+    def _iniciar_marcas(self, coleccion):
+        """Sin estado guardado: se parte desde el último documento actual"""
+        collection = self.db[coleccion]
+        marca = None
+        for campo in ('updated_at', 'ended_at'):
+            documento = collection.find_one({campo: {"$exists": True}}, {campo: 1}, sort=[(campo, -1)])
+            if documento and (marca is None or documento[campo] > marca):
+                marca = documento[campo]
+        ultimo = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        self.estado.marcas[coleccion] = marca
+        self.estado.ultimos_id[coleccion] = ultimo["_id"] if ultimo else None
+
+    def _filtro_sondeo(self, coleccion):
+        condiciones = []
+        marca = self.estado.marcas.get(coleccion)
+        if marca is not None:
+            desde = marca - timedelta(seconds=INVALIDACION_SOLAPE)
+            condiciones += [{"updated_at": {"$gte": desde}}, {"ended_at": {"$gte": desde}}]
+        else:
+            condiciones += [{"updated_at": {"$exists": True}}, {"ended_at": {"$exists": True}}]
+        ultimo_id = self.estado.ultimos_id.get(coleccion)
+        condiciones.append({"_id": {"$gt": ultimo_id}} if ultimo_id is not None else {})
+        return {"$or": condiciones}
+
+    def sondear(self):
+        """Modo sondeo: nunca retorna"""
+        for coleccion in PREFIJOS:
+            if coleccion not in self.estado.marcas:
+                self._iniciar_marcas(coleccion)
+        vistos = {coleccion: {} for coleccion in PREFIJOS}  # uuid -> versión ya aplicada dentro del solape
+        print(f"Sondeando {', '.join(PREFIJOS)} cada {INVALIDACION_SONDEO} s")
+        while True:
+            try:
+                for coleccion in PREFIJOS:
+                    self._sondear_coleccion(coleccion, vistos[coleccion])
+                self.estado.guardar()
+            except PyMongoError as e:
+                print(f"Error al sondear MongoDB: {str(e)}")
+            self.repetir_pendientes()
+            time.sleep(INVALIDACION_SONDEO)
+
+    def _sondear_coleccion(self, coleccion, vistos):
+        cambios = set()
+        marca = self.estado.marcas.get(coleccion)
+        ultimo_id = self.estado.ultimos_id.get(coleccion)
+        documentos = self.db[coleccion].find(self._filtro_sondeo(coleccion), {"uuid": 1, "updated_at": 1, "ended_at": 1})
+        for documento in documentos.batch_size(INVALIDACION_LOTE):
+            self.estadisticas["eventos"] += 1
+            version = (documento.get("updated_at"), documento.get("ended_at"))
+            if vistos.get(documento["uuid"]) == version:
+                continue  # Ya aplicado en una vuelta anterior (está dentro del solape)
+            vistos[documento["uuid"]] = version
+            cambios.add(documento["uuid"])
+            for fecha in version:
+                if fecha is not None and (marca is None or fecha > marca):
+                    marca = fecha
+            if ultimo_id is None or documento["_id"] > ultimo_id:
+                ultimo_id = documento["_id"]
+        self.estado.marcas[coleccion] = marca
+        self.estado.ultimos_id[coleccion] = ultimo_id
+        # Lo que quedó bajo el solape (o solo se vio por _id) ya no vuelve a aparecer
+        limite = marca - timedelta(seconds=INVALIDACION_SOLAPE) if marca is not None else None
+        for uuid in [uuid for uuid, version in vistos.items() if _mas_reciente(version) is None or
+                     (limite is not None and _mas_reciente(version) < limite)]:
+            del vistos[uuid]
+        if cambios:
+            self.aplicar({coleccion: cambios})
+
+    def correr(self, modo=INVALIDACION_MODO):
+        self.estado.cargar()
+        if modo in ('auto', 'cambios'):
+            self.seguir_cambios()
+            if modo == 'cambios':
+                raise SystemExit("MongoDB no es un replica set: el modo cambios necesita change streams")
+            print("MongoDB no es un replica set (sin change streams), se usa el modo sondeo")
+        self.sondear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantiene Redis al día con los cambios de alertas y atascos en MongoDB")
+    parser.add_argument('--modo', choices=['auto', 'cambios', 'sondeo'], default=INVALIDACION_MODO)
+    parser.add_argument('--accion', choices=['refrescar', 'borrar'], default=INVALIDACION_ACCION,
+                        help="Reescribir las claves que están en Redis con el documento nuevo o solo borrarlas")
+    args = parser.parse_args()
+
+    mongo_client = pymongo.MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    db = mongo_client[os.environ.get('MONGO_DB', 'trafico_rm')]
+    redis_client = crear_cliente_redis(os.environ.get('REDIS_HOST', 'localhost'), int(os.environ.get('REDIS_PORT', 6379)))
+    invalidador = Invalidador(db, redis_client, args.accion)
+    try:
+        invalidador.correr(args.modo)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        invalidador.estado.guardar(forzar=True)
+        print(f"Invalidador: {invalidador.estadisticas}")
+
+if __name__ == '__main__':
+    main()
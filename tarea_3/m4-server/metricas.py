@@ -0,0 +1,248 @@
+import threading
+import time
+
+from pymongo import monitoring
+
+# Métricas del servidor en formato de texto de Prometheus (ruta /metrics). Las
+# latencias se guardan en histogramas log-lineales tipo HDR: cada potencia de 2 de
+# microsegundos se divide en SUBCUBETAS cubetas, así cualquier percentil sale con un
+# error relativo de 1/SUBCUBETAS sin guardar las muestras. Registrar una medición es
+# calcular un índice y sumar 1 en una lista.
+
+SUBBITS = 3
+SUBCUBETAS = 1 << SUBBITS  # 8 cubetas por potencia de 2: error <= 12.5%
+MAX_MICROSEGUNDOS = 1 << 27  # ~134 s; lo que pase de ahí cae en la última cubeta
+PERCENTILES = (0.5, 0.9, 0.99, 0.999)
+# Se exportan los límites le= en potencias de 2 de microsegundos (16 us ... 67 s)
+EXPONENTES_LE = range(4, 27)
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _indice(microsegundos):
+    if microsegundos < 2 * SUBCUBETAS:
+        return microsegundos
+    e = microsegundos.bit_length() - (SUBBITS + 1)
+    return (e + 1) * SUBCUBETAS + (microsegundos >> e) - SUBCUBETAS
+
+def _limite_superior(indice):
+    """Microsegundos en que termina la cubeta (exclusivo)"""
+    if indice < 2 * SUBCUBETAS:
+        return indice + 1
+    e = indice // SUBCUBETAS - 1
+    return (indice % SUBCUBETAS + SUBCUBETAS + 1) << e
+
+class HistogramaHDR:
+    """Conteo de latencias en cubetas log-lineales, con suma y total para _sum y _count"""
+    def __init__(self):
+        self.cuentas = [0] * (_indice(MAX_MICROSEGUNDOS) + 1)
+        self.ultima = len(self.cuentas) - 1
+        self.total = 0
+        self.suma = 0.0
+        self.lock = threading.Lock()
+
+    def registrar(self, segundos):
+        i = _indice(int(segundos * 1e6)) if segundos > 0 else 0
+        with self.lock:
+            self.cuentas[min(i, self.ultima)] += 1
+            self.total += 1
+            self.suma += segundos
+
+    def instantanea(self):
+        with self.lock:
+            return list(self.cuentas), self.total, self.suma
+
+    @staticmethod
+    def percentil(cuentas, total, q):
+        """Segundos bajo los que cae la fracción q de las mediciones (límite superior de su cubeta)"""
+        if not total:
+            return 0.0
+        objetivo = q * total
+        acumulado = 0
+        for i, cuenta in enumerate(cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return _limite_superior(i) / 1e6
+        return _limite_superior(len(cuentas) - 1) / 1e6
+
+    @staticmethod
+    def cubetas_le(cuentas):
+        """[(le en segundos, acumulado)] en los límites de cada potencia de 2"""
+        resultado = []
+        acumulado = 0
+        i = 0
+        for exponente in EXPONENTES_LE:
+            limite = 1 << exponente
+            while i < len(cuentas) and _limite_superior(i) <= limite:
+                acumulado += cuentas[i]
+                i += 1
+            resultado.append((limite / 1e6, acumulado))
+        return resultado
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+class Familia:
+    """Una métrica con sus series por combinación de etiquetas"""
+    def __init__(self, nombre, tipo, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.tipo = tipo
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def _serie(self, valores, crear):
+        serie = self.series.get(valores)
+        if serie is None:
+            with self.lock:
+                serie = self.series.setdefault(valores, crear())
+        return serie
+
+class Metricas:
+    """Registro de histogramas, contadores y medidores (gauges calculados al exponer)"""
+    def __init__(self):
+        self.familias = {}
+        self.medidores = []  # [(Familia, funcion -> [(valores_etiquetas, valor)])]
+
+    def histograma(self, nombre, ayuda, etiquetas=()):
+        return self.familias.setdefault(nombre, Familia(nombre, 'histogram', ayuda, etiquetas))
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self.familias.setdefault(nombre, Familia(nombre, 'counter', ayuda, etiquetas))
+
+    def medidor(self, nombre, ayuda, etiquetas, funcion):
+        self.medidores.append((Familia(nombre, 'gauge', ayuda, etiquetas), funcion))
+
+    def observar(self, nombre, valores, segundos):
+        self.familias[nombre]._serie(valores, HistogramaHDR).registrar(segundos)
+
+    def contar(self, nombre, valores, n=1):
+        familia = self.familias[nombre]
+        contador = familia._serie(valores, lambda: [0])
+        with familia.lock:
+            contador[0] += n
+
+    def exponer(self):
+        """Todas las métricas en formato de texto de Prometheus"""
+        lineas = []
+        for familia in list(self.familias.values()):
+            lineas.append(f"# HELP {familia.nombre} {familia.ayuda}")
+            lineas.append(f"# TYPE {familia.nombre} {familia.tipo}")
+            percentiles = []
+            for valores, serie in list(familia.series.items()):
+                if familia.tipo == 'counter':
+                    lineas.append(f"{familia.nombre}{_etiquetas(familia.etiquetas, valores)} {serie[0]}")
+                    continue
+                cuentas, total, suma = serie.instantanea()
+                for le, acumulado in HistogramaHDR.cubetas_le(cuentas):
+                    etiquetas = _etiquetas(familia.etiquetas, valores, 'le="%g"' % le)
+                    lineas.append(f"{familia.nombre}_bucket{etiquetas} {acumulado}")
+                etiquetas = _etiquetas(familia.etiquetas, valores, 'le="+Inf"')
+                lineas.append(f"{familia.nombre}_bucket{etiquetas} {total}")
+                lineas.append(f"{familia.nombre}_sum{_etiquetas(familia.etiquetas, valores)} {suma:.6f}")
+                lineas.append(f"{familia.nombre}_count{_etiquetas(familia.etiquetas, valores)} {total}")
+                for q in PERCENTILES:
+                    percentiles.append((valores, q, HistogramaHDR.percentil(cuentas, total, q)))
+            if percentiles:
+                # Percentiles ya calculados (p99 sin histogram_quantile), como gauge aparte
+                nombre = f"{familia.nombre}_percentil"
+                lineas.append(f"# HELP {nombre} Percentiles de {familia.nombre} desde el histograma HDR")
+                lineas.append(f"# TYPE {nombre} gauge")
+                for valores, q, valor in percentiles:
+                    etiquetas = _etiquetas(familia.etiquetas, valores, 'quantile="%s"' % q)
+                    lineas.append(f"{nombre}{etiquetas} {valor:g}")
+        for familia, funcion in self.medidores:
+            lineas.append(f"# HELP {familia.nombre} {familia.ayuda}")
+            lineas.append(f"# TYPE {familia.nombre} gauge")
+            try:
+                for valores, valor in funcion():
+                    lineas.append(f"{familia.nombre}{_etiquetas(familia.etiquetas, valores)} {valor}")
+            except Exception:
+                pass  # Un medidor que falla no debe romper el resto de /metrics
+        return '\n'.join(lineas) + '\n'
+
+def estado_pool_redis(pool):
+    """Conexiones creadas, disponibles y en uso de un ConnectionPool de redis-py (sync o asyncio)"""
+    disponibles = len(getattr(pool, '_available_connections', []))
+    en_uso = len(getattr(pool, '_in_use_connections', []))
+    return [(("creadas",), getattr(pool, '_created_connections', disponibles + en_uso)),
+            (("disponibles",), disponibles), (("en_uso",), en_uso),
+            (("maximo",), getattr(pool, 'max_connections', 0))]
+
+class MonitorPoolMongo(monitoring.ConnectionPoolListener):
+    """
+    Escucha los eventos CMAP de pymongo (también llegan desde motor): conexiones
+    abiertas y en uso, y cuánto se espera para obtener una conexión del pool.
+    """
+    def __init__(self, metricas):
+        self.metricas = metricas
+        self.abiertas = 0
+        self.en_uso = 0
+        self.lock = threading.Lock()
+        self.inicio_espera = threading.local()
+        metricas.histograma('mongo_pool_espera_segundos', 'Espera para obtener una conexión del pool de MongoDB')
+        metricas.contador('mongo_pool_eventos_total', 'Eventos del pool de MongoDB', ('evento',))
+        metricas.medidor('mongo_pool_conexiones', 'Conexiones del pool de MongoDB', ('estado',),
+                         lambda: [(("abiertas",), self.abiertas), (("en_uso",), self.en_uso)])
+
+    def _sumar(self, atributo, n):
+        with self.lock:
+            setattr(self, atributo, getattr(self, atributo) + n)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.metricas.contar('mongo_pool_eventos_total', ("pool_limpiado",))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._sumar('abiertas', 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._sumar('abiertas', -1)
+
+    def connection_check_out_started(self, event):
+        self.inicio_espera.valor = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self.metricas.contar('mongo_pool_eventos_total', ("checkout_fallido",))
+
+    def connection_checked_out(self, event):
+        inicio = getattr(self.inicio_espera, 'valor', None)
+        if inicio is not None:
+            self.metricas.observar('mongo_pool_espera_segundos', (), time.perf_counter() - inicio)
+        self._sumar('en_uso', 1)
+
+    def connection_checked_in(self, event):
+        self._sumar('en_uso', -1)
+
+def crear_metricas():
+    """Las métricas que usan server.py y server_async.py"""
+    metricas = Metricas()
+    metricas.histograma('api_solicitud_segundos', 'Latencia de cada ruta (hasta el primer byte en las de streaming)',
+                        ('ruta', 'metodo'))
+    metricas.contador('api_solicitudes_total', 'Solicitudes atendidas por ruta y código HTTP', ('ruta', 'metodo', 'codigo'))
+    metricas.histograma('api_backend_segundos', 'Latencia de cada operación contra Redis o MongoDB',
+                        ('backend', 'operacion'))
+    metricas.contador('api_cache_consultas_total', ('Consultas por tipo y resultado (hit_l1, hit_l2, miss, no_encontrado, '
+                       'negativo = caché negativa, filtrado = filtro de UUIDs)'),
+                      ('tipo', 'resultado'))
+    return metricas
+
+def medir(metricas, backend, operacion, inicio):
+    """Registra una operación que empezó en inicio (time.perf_counter())"""
+    metricas.observar('api_backend_segundos', (backend, operacion), time.perf_counter() - inicio)
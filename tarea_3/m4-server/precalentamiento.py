@@ -0,0 +1,196 @@
+import gzip
+import heapq
+import json
+import os
+import random
+import threading
+import time
+
+from redis.exceptions import ResponseError
+
+from codec_cache import codificar, proyeccion
+
+# Frecuencia de acceso por clave con decaimiento exponencial, persistida en disco, y
+# precalentamiento de Redis con las claves más consultadas. Redis parte vacío en cada
+# despliegue (el compose borra dump.rdb), así que sin esto los primeros minutos se
+# atienden casi todos desde MongoDB.
+
+FRECUENCIAS_RUTA = os.environ.get('FRECUENCIAS_RUTA', './datos/frecuencias.json.gz')  # '' = sin persistir
+FRECUENCIAS_VIDA_MEDIA = float(os.environ.get('FRECUENCIAS_VIDA_MEDIA', 1800))  # Segundos en que un acceso vale la mitad
+FRECUENCIAS_MAX_CLAVES = int(os.environ.get('FRECUENCIAS_MAX_CLAVES', 100000))
+FRECUENCIAS_INTERVALO = float(os.environ.get('FRECUENCIAS_INTERVALO', 60))  # Cada cuánto se guarda la tabla
+PRECALENTAR_AL_INICIAR = os.environ.get('PRECALENTAR_AL_INICIAR', '1') == '1'
+PRECALENTAR_TOP_K = int(os.environ.get('PRECALENTAR_TOP_K', 5000))
+# Fracción de la memoria libre de Redis (maxmemory - used_memory) que puede usar el precalentamiento
+PRECALENTAR_FRACCION_MEMORIA = float(os.environ.get('PRECALENTAR_FRACCION_MEMORIA', 0.8))
+PRECALENTAR_LOTE = 500  # Claves por consulta $in y por pipeline
+SOBRECOSTO_CLAVE = 90  # Bytes aproximados que Redis usa por clave además de la clave y el valor
+
+class FrecuenciasDecaidas:
+    """
+    Tabla clave -> puntaje donde cada acceso suma 1 y los puntajes decaen a la mitad cada
+    vida_media segundos. En vez de decaer toda la tabla, cada acceso suma un peso que
+    crece con el tiempo (2^(t/vida_media)) y la tabla se renormaliza de vez en cuando.
+    """
+    def __init__(self, vida_media=FRECUENCIAS_VIDA_MEDIA, max_claves=FRECUENCIAS_MAX_CLAVES):
+        self.vida_media = vida_media
+        self.max_claves = max_claves
+        self.origen = time.time()
+        self.puntajes = {}
+        self.lock = threading.Lock()
+
+    def _peso(self, ahora):
+        return 2.0 ** ((ahora - self.origen) / self.vida_media)
+
+    def registrar(self, clave):
+        ahora = time.time()
+        with self.lock:
+            if ahora - self.origen > 64 * self.vida_media:
+                self._renormalizar(ahora)
+            self.puntajes[clave] = self.puntajes.get(clave, 0.0) + self._peso(ahora)
+            if len(self.puntajes) > self.max_claves * 1.25:
+                # Se descartan las menos frecuentes de una vez para no podar en cada acceso
+                self.puntajes = dict(heapq.nlargest(self.max_claves, self.puntajes.items(), key=lambda x: x[1]))
+
+    def _renormalizar(self, ahora):
+        factor = self._peso(ahora)
+        self.puntajes = {clave: puntaje / factor for clave, puntaje in self.puntajes.items() if puntaje / factor > 1e-6}
+        self.origen = ahora
+
+    def top(self, k):
+        """Las k claves más frecuentes con su puntaje actual (accesos equivalentes)"""
+        with self.lock:
+            factor = self._peso(time.time())
+            return [(clave, puntaje / factor)
+                    for clave, puntaje in heapq.nlargest(k, self.puntajes.items(), key=lambda x: x[1])]
+
+    def __len__(self):
+        return len(self.puntajes)
+
+    def guardar(self, ruta):
+        """Escritura atómica (archivo temporal + rename) con los puntajes al momento de guardar"""
+        with self.lock:
+            factor = self._peso(time.time())
+            datos = {"version": 1, "vida_media": self.vida_media, "guardado": time.time(),
+                     "puntajes": {clave: puntaje / factor for clave, puntaje in self.puntajes.items()}}
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        temporal = f"{ruta}.tmp"
+        with gzip.open(temporal, 'wt', encoding='utf-8') as f:
+            json.dump(datos, f)
+        os.replace(temporal, ruta)
+
+    def cargar(self, ruta):
+        """Carga una tabla guardada, decayendo sus puntajes por el tiempo que pasó desde entonces"""
+        if not os.path.exists(ruta):
+            return False
+        with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+            datos = json.load(f)
+        decaimiento = 2.0 ** (-(time.time() - datos["guardado"]) / self.vida_media)
+        with self.lock:
+            self.origen = time.time()
+            for clave, puntaje in datos["puntajes"].items():
+                self.puntajes[clave] = self.puntajes.get(clave, 0.0) + puntaje * decaimiento
+        return True
+
+def clave_a_consulta(clave):
+    """'alerta:<uuid>' -> ('alertas', uuid), 'atasco:<n>' -> ('atascos', n); None si no aplica"""
+    tipo, _, uuid = clave.partition(':')
+    if tipo == 'alerta' and uuid:
+        return 'alertas', uuid
+    if tipo == 'atasco' and uuid.isdigit():
+        return 'atascos', int(uuid)
+    return None
+
+def presupuesto_memoria(info_memoria, fraccion=PRECALENTAR_FRACCION_MEMORIA):
+    """Bytes que puede ocupar el precalentamiento según INFO memory (None = sin límite)"""
+    maximo = int(info_memoria.get('maxmemory', 0))
+    if maximo <= 0:
+        return None
+    return max(0, int((maximo - int(info_memoria.get('used_memory', 0))) * fraccion))
+
+def planificar(claves):
+    """Agrupa claves (en orden de frecuencia) en lotes por colección: [(coleccion, [(clave, valor), ...])]"""
+    lotes = {}
+    plan = []
+    for clave in claves:
+        consulta = clave_a_consulta(clave)
+        if consulta is None:
+            continue
+        coleccion, valor = consulta
+        lote = lotes.setdefault(coleccion, [])
+        lote.append((clave, valor))
+        if len(lote) == PRECALENTAR_LOTE:
+            plan.append((coleccion, lote))
+            lotes[coleccion] = []
+    plan.extend((coleccion, lote) for coleccion, lote in lotes.items() if lote)
+    return plan
+
+def _serializar(documentos, lote):
+    """Pares (clave, datos) en el orden del lote para los documentos encontrados"""
+    por_valor = {documento["uuid"]: documento for documento in documentos}
+    for clave, valor in lote:
+        documento = por_valor.get(valor)
+        if documento is not None:
+            yield clave, codificar(documento)
+
+def _ttl_escalonado(expiracion):
+    # Las claves precalentadas no deben expirar todas en el mismo instante
+    return max(1, int(expiracion * random.uniform(0.5, 1.0)))
+
+def precalentar(redis_client, colecciones, frecuencias, expiracion, top_k=PRECALENTAR_TOP_K):
+    """
+    Lleva a Redis las top_k claves más frecuentes que todavía no están, con un $in por
+    lote a MongoDB y SET NX EX en pipeline, hasta agotar el presupuesto de memoria.
+    """
+    inicio = time.time()
+    try:
+        presupuesto = presupuesto_memoria(redis_client.info('memory'))
+    except ResponseError:
+        presupuesto = None  # INFO deshabilitado: solo se limita por top_k
+    resumen = {"candidatas": 0, "escritas": 0, "bytes": 0, "agotado_presupuesto": False}
+    for coleccion, lote in planificar(clave for clave, _ in frecuencias.top(top_k)):
+        resumen["candidatas"] += len(lote)
+        documentos = colecciones[coleccion].find({"uuid": {"$in": [valor for _, valor in lote]}},
+                                                 proyeccion(lote[0][0].partition(':')[0]))
+        pipe = redis_client.pipeline(transaction=False)
+        for clave, datos in _serializar(documentos, lote):
+            costo = len(clave) + len(datos) + SOBRECOSTO_CLAVE
+            if presupuesto is not None and resumen["bytes"] + costo > presupuesto:
+                resumen["agotado_presupuesto"] = True
+                break
+            pipe.set(clave, datos, ex=_ttl_escalonado(expiracion), nx=True)
+            resumen["bytes"] += costo
+        resumen["escritas"] += sum(1 for escrita in pipe.execute() if escrita)
+        if resumen["agotado_presupuesto"]:
+            break
+    resumen["segundos"] = round(time.time() - inicio, 3)
+    return resumen
+
+async def precalentar_async(redis_client, colecciones, frecuencias, expiracion, top_k=PRECALENTAR_TOP_K):
+    """Igual que precalentar, con redis.asyncio y motor"""
+    inicio = time.time()
+    try:
+        presupuesto = presupuesto_memoria(await redis_client.info('memory'))
+    except ResponseError:
+        presupuesto = None  # INFO deshabilitado: solo se limita por top_k
+    resumen = {"candidatas": 0, "escritas": 0, "bytes": 0, "agotado_presupuesto": False}
+    for coleccion, lote in planificar(clave for clave, _ in frecuencias.top(top_k)):
+        resumen["candidatas"] += len(lote)
+        cursor = colecciones[coleccion].find({"uuid": {"$in": [valor for _, valor in lote]}},
+                                             proyeccion(lote[0][0].partition(':')[0]))
+        documentos = [documento async for documento in cursor]
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for clave, datos in _serializar(documentos, lote):
+                costo = len(clave) + len(datos) + SOBRECOSTO_CLAVE
+                if presupuesto is not None and resumen["bytes"] + costo > presupuesto:
+                    resumen["agotado_presupuesto"] = True
+                    break
+                pipe.set(clave, datos, ex=_ttl_escalonado(expiracion), nx=True)
+                resumen["bytes"] += costo
+            resumen["escritas"] += sum(1 for escrita in await pipe.execute() if escrita)
+        if resumen["agotado_presupuesto"]:
+            break
+    resumen["segundos"] = round(time.time() - inicio, 3)
+    return resumen
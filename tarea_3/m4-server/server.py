@@ -1,29 +1,187 @@
-from flask import Flask, request, jsonify
-import redis
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import threading
+import atexit
+from redis.exceptions import LockError
 import pymongo
 import json
 import os
-from bson import json_util
+from bson import ObjectId
+from bson.errors import InvalidId
 import time
+from cache_l1 import CacheL1, ttl_l1
+from cache_particionado import ClienteParticionado, crear_cliente_redis
+from codec_cache import VALOR_NO_EXISTE, codificar, decodificar, proyeccion, proyeccion_de_clave
+from consultas import (Lote, clasificar, configurar_registro, etag_coincide, guardar_l1_desde_redis, linea_log,
+                       registrar_resultado, respuesta, uuid_atasco, uuids_del_cuerpo)
+from filtro_uuids import FILTRO_REFRESCO, FiltroUUIDs
+from metricas import TIPO_CONTENIDO, MonitorPoolMongo, crear_metricas, estado_pool_redis, medir
+from snapshot_uuids import SnapshotUUIDs
+from precalentamiento import (FRECUENCIAS_INTERVALO, FRECUENCIAS_RUTA, PRECALENTAR_AL_INICIAR,
+                              PRECALENTAR_TOP_K, FrecuenciasDecaidas, precalentar)
+from coalescencia import (LOCK_ESPERA, LOCK_SONDEO, LOCK_TTL_MS, TiempoRecalculo, VueloUnico,
+                          refrescar_antes)
+
+# Líneas "Cache <resultado> for ..." con LOG_CONSULTAS=1 (ver consultas.py)
+configurar_registro()
 
 app = Flask(__name__)
 
-# Conexión a Redis
-redis_client = redis.Redis(
-    host=os.environ.get('REDIS_HOST', 'localhost'),
-    port=int(os.environ.get('REDIS_PORT', 6379)),
-    db=0
+# Histogramas de latencia y contadores para /metrics
+metricas = crear_metricas()
+
+# Conexión a Redis (o a varios nodos con REDIS_NODOS, ver cache_particionado.py)
+redis_client = crear_cliente_redis(
+    os.environ.get('REDIS_HOST', 'localhost'),
+    int(os.environ.get('REDIS_PORT', 6379))
 )
 
 # Conexión a MongoDB
 mongo_uri = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-mongo_client = pymongo.MongoClient(mongo_uri)
+mongo_client = pymongo.MongoClient(mongo_uri, event_listeners=[MonitorPoolMongo(metricas)])
 mongo_db = mongo_client[os.environ.get('MONGO_DB', 'trafico_rm')]
 alertas_collection = mongo_db['alertas']
 atascos_collection = mongo_db['atascos']
 
+if isinstance(redis_client, ClienteParticionado):
+    metricas.medidor('redis_nodo_conexiones', 'Conexiones del pool de cada nodo Redis y si está caído',
+                     ('nodo', 'estado'), redis_client.medidas)
+else:
+    metricas.medidor('redis_pool_conexiones', 'Conexiones del pool de Redis', ('estado',),
+                     lambda: estado_pool_redis(redis_client.connection_pool))
+
 # Tiempo de expiración de caché en Redis (en segundos)
-CACHE_EXPIRATION = 300 # 5 minutos, frescura para tiempo real
+CACHE_EXPIRATION = int(os.environ.get('CACHE_EXPIRATION', 300)) # 5 minutos, frescura para tiempo real
+# Caché negativa: un UUID que no está en MongoDB se recuerda estos segundos (0 = desactivada)
+CACHE_NEGATIVO_TTL = int(os.environ.get('CACHE_NEGATIVO_TTL', 30))
+
+# Máximo de UUIDs por consulta en lote
+LOTE_MAX_UUIDS = int(os.environ.get('LOTE_MAX_UUIDS', 1000))
+
+# Caché L1 en memoria del proceso, delante de Redis (L2)
+cache_l1 = CacheL1()
+
+# UUIDs existentes por tipo: los desconocidos se rechazan sin ir a Redis ni a MongoDB
+filtro_uuids = FiltroUUIDs()
+metricas.medidor('filtro_uuids', 'Elementos y bytes del filtro de Bloom de UUIDs', ('tipo', 'medida'),
+                 filtro_uuids.medidas)
+
+# Misses agrupados por clave y tiempo de MongoDB para la expiración anticipada
+vuelos = VueloUnico()
+tiempo_recalculo = TiempoRecalculo()
+
+# Frecuencia de acceso por clave, para precalentar Redis al reiniciar
+frecuencias = FrecuenciasDecaidas()
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')  # Si se define, las rutas /admin lo exigen en X-Admin-Token
+
+def buscar_en_cache(cache_key, refrescar=None):
+    """
+    Busca primero en L1 y luego en Redis. Retorna ("hit_l1" | "hit_l2", tiempo_ms),
+    ("negativo", tiempo_ms) si hay una entrada de la caché negativa o (None,
+    tiempo_ms) si no está en ninguna. Si la clave está por expirar en Redis (XFetch)
+    se llama a refrescar() para renovarla en segundo plano.
+    """
+    inicio_tiempo_cache = time.perf_counter()
+    resultado = clasificar(cache_l1.obtener(cache_key), "hit_l1")
+    if resultado:
+        return resultado, round((time.perf_counter() - inicio_tiempo_cache) * 1000, 3)
+
+    # GET y PTTL en un solo viaje: la entrada L1 no debe durar más que la de Redis
+    inicio_redis = time.perf_counter()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.get(cache_key)
+    pipe.pttl(cache_key)
+    cached_data, pttl = pipe.execute()
+    medir(metricas, 'redis', 'get', inicio_redis)
+    tiempo_cache_ms = round((time.perf_counter() - inicio_tiempo_cache) * 1000, 2)  # Convertir a milisegundos
+    resultado = clasificar(cached_data, "hit_l2")
+    if resultado:
+        guardar_l1_desde_redis(cache_l1, cache_key, cached_data, pttl)
+    if resultado == "hit_l2" and refrescar is not None and refrescar_antes(pttl, tiempo_recalculo.valor_ms):
+        refrescar()
+    return resultado, tiempo_cache_ms
+
+def guardar_en_cache(cache_key, documento):
+    """Guarda en Redis para futuras consultas y en L1 (ver codec_cache.py)"""
+    datos = codificar(documento)
+    inicio = time.perf_counter()
+    redis_client.setex(cache_key, CACHE_EXPIRATION, datos)
+    medir(metricas, 'redis', 'setex', inicio)
+    cache_l1.guardar(cache_key, datos, ttl_l1(CACHE_EXPIRATION))
+
+def guardar_no_existe(cache_key):
+    """Entrada de la caché negativa: las próximas consultas por la clave no llegan a MongoDB"""
+    if CACHE_NEGATIVO_TTL > 0:
+        redis_client.setex(cache_key, CACHE_NEGATIVO_TTL, VALOR_NO_EXISTE)
+        cache_l1.guardar(cache_key, VALOR_NO_EXISTE, ttl_l1(CACHE_NEGATIVO_TTL))
+
+def buscar_en_mongo(cache_key, collection, filtro):
+    """find_one y, si existe, guardar en caché. Retorna (documento | None, tiempo_mongo_ms)"""
+    inicio_tiempo_mongo = time.perf_counter()
+    documento = collection.find_one(filtro, proyeccion_de_clave(cache_key))
+    medir(metricas, 'mongo', 'find_one', inicio_tiempo_mongo)
+    tiempo_mongo_ms = round((time.perf_counter() - inicio_tiempo_mongo) * 1000, 2)  # Convertir a milisegundos
+    tiempo_recalculo.registrar(tiempo_mongo_ms)
+    if not documento:
+        guardar_no_existe(cache_key)
+        return None, tiempo_mongo_ms
+
+    guardar_en_cache(cache_key, documento)
+    return documento, tiempo_mongo_ms
+
+def cargar_coalescido(cache_key, collection, filtro):
+    """
+    Resuelve un miss con una sola consulta a MongoDB por clave: dentro del proceso los
+    hilos esperan al primero (VueloUnico) y entre procesos se usa un lock corto en Redis;
+    quien no lo obtiene espera a que la clave aparezca en Redis.
+    Retorna (documento | None, tiempo_ms, coalescido).
+    """
+    def cargar():
+        lock = redis_client.lock(f"lock:{cache_key}", timeout=LOCK_TTL_MS / 1000)
+        if lock.acquire(blocking=False):
+            try:
+                return buscar_en_mongo(cache_key, collection, filtro) + (False,)
+            finally:
+                try:
+                    lock.release()
+                except LockError:
+                    pass  # El lock expiró antes de terminar
+
+        # Otro proceso está consultando MongoDB: esperar a que deje el documento en Redis
+        inicio_espera = time.time()
+        while time.time() - inicio_espera < LOCK_ESPERA:
+            time.sleep(LOCK_SONDEO)
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(cache_key)
+            pipe.exists(f"lock:{cache_key}")
+            cached_data, hay_lock = pipe.execute()
+            if cached_data:
+                cache_l1.guardar(cache_key, cached_data, ttl_l1(CACHE_EXPIRATION))
+                return decodificar(cached_data), round((time.time() - inicio_espera) * 1000, 2), True
+            if not hay_lock:
+                break  # El dueño terminó sin guardar nada (no existe) o se cayó
+        return buscar_en_mongo(cache_key, collection, filtro) + (False,)
+
+    (documento, tiempo_ms, coalescido), esperado = vuelos.ejecutar(cache_key, cargar)
+    return documento, tiempo_ms, coalescido or esperado
+
+def refrescar_en_segundo_plano(cache_key, collection, filtro):
+    """Expiración anticipada: renueva la clave sin hacer esperar a la consulta actual"""
+    def refrescar():
+        lock = redis_client.lock(f"lock:{cache_key}", timeout=LOCK_TTL_MS / 1000)
+        if not lock.acquire(blocking=False):
+            return  # Otro hilo o proceso ya la está renovando
+        try:
+            buscar_en_mongo(cache_key, collection, filtro)
+            app.logger.info(f"Refresco anticipado de {cache_key}")
+        except Exception as e:
+            app.logger.error(f"Error en refresco anticipado de {cache_key}: {str(e)}")
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
+    threading.Thread(target=refrescar, daemon=True).start()
+
 @app.route('/', methods=['GET'])
 def index():
     return '''
@@ -31,151 +189,269 @@ def index():
         
     '''
 #<img src="https://i.imgur.com/nkoz0qO.jpeg" width="800">
-# Rutas para obtener todos los UUIDs de alertas y atascos
+# Rutas para obtener todos los UUIDs de alertas y atascos. La lista JSON se escribe
+# mientras se recorre el cursor, sin armarla completa en memoria.
+LISTADO_LOTE = 1000  # Documentos que MongoDB entrega por viaje al recorrer un cursor
+PAGINA_MAX = int(os.environ.get('PAGINA_MAX', 10000))
+
+snapshots_uuids = {tipo: SnapshotUUIDs(tipo) for tipo in ('alertas', 'atascos')}
+
+def coleccion_uuids(tipo):
+    return {'alertas': alertas_collection, 'atascos': atascos_collection}.get(tipo)
+
+def recorrer_uuids(collection):
+    cursor = collection.find({}, {"uuid": 1, "_id": 0}).batch_size(LISTADO_LOTE)
+    for doc in cursor:
+        if doc.get('uuid'):
+            yield doc['uuid']
+
+def lista_json_en_streaming(collection):
+    yield '['
+    separador = ''
+    for uuid in recorrer_uuids(collection):
+        yield separador + json.dumps(uuid)
+        separador = ','
+    yield ']'
+
 @app.route('/uuids_alertas', methods=['GET'])
 def get_uuids_alertas():
-    try:
-        uuids = list(alertas_collection.find({}, {"uuid": 1, "_id": 0}))
-        uuid_list = [doc.get('uuid') for doc in uuids if doc.get('uuid')]
-        return jsonify(uuid_list)
-    
-    except Exception as e:
-        app.logger.error(f"Error retrieving alertas UUIDs: {str(e)}")
-        return jsonify({'error': f'Error retrieving alertas UUIDs: {str(e)}'}), 500
+    return Response(stream_with_context(lista_json_en_streaming(alertas_collection)), mimetype='application/json')
 
 @app.route('/uuids_atascos', methods=['GET'])
 def get_uuids_atascos():
-    print("Entrando a la ruta /uuids_atascos")
-    app.logger.info("Entrando a la ruta /uuids_atascos")
+    return Response(stream_with_context(lista_json_en_streaming(atascos_collection)), mimetype='application/json')
+
+# Listado paginado por _id: /uuids/alertas?despues=<siguiente>&limite=1000
+@app.route('/uuids/<tipo>', methods=['GET'])
+def get_uuids_pagina(tipo):
+    collection = coleccion_uuids(tipo)
+    if collection is None:
+        return jsonify({'error': f'Tipo desconocido: {tipo}'}), 404
     try:
-        # Verificar conexión
-        server_info = mongo_client.server_info()
-        app.logger.info(f"Conexión a MongoDB exitosa: versión {server_info.get('version', 'desconocida')}")
-        
-        # Contar documentos antes de la consulta
-        total_docs = atascos_collection.count_documents({})
-        app.logger.info(f"Total de documentos en la colección atascos: {total_docs}")
-        
-        # Proyección para obtener solo los UUIDs de los atascos
-        uuids = list(atascos_collection.find({}, {"uuid": 1, "_id": 0}))
-        app.logger.info(f"Documentos recuperados en la proyección: {len(uuids)}")
-        
-        # Diagnóstico: Inspeccionar documentos recuperados
-        for i, doc in enumerate(uuids[:5]):  # Solo los primeros 5 para no saturar logs
-            app.logger.info(f"Documento {i}: {doc}")
-        
-        # Extraer solo los valores de UUID en una lista simple
-        uuid_list = [doc.get('uuid') for doc in uuids if doc.get('uuid')]
-        
-        app.logger.info(f"UUIDs extraídos: {len(uuid_list)}")
-        if uuid_list:
-            app.logger.info(f"Primeros UUIDs: {uuid_list[:5]}")
-        else:
-            app.logger.warning("No se encontraron UUIDs en los documentos")
-        
-        return jsonify(uuid_list)
-        
-    except pymongo.errors.ConnectionFailure as e:
-        app.logger.error(f"Error de conexión a MongoDB: {str(e)}")
-        return jsonify({'error': f'Error de conexión a MongoDB: {str(e)}'}), 500
-        
-    except Exception as e:
-        app.logger.error(f"Error retrieving atascos UUIDs: {str(e)}")
-        return jsonify({'error': f'Error retrieving atascos UUIDs: {str(e)}'}), 500
+        limite = min(int(request.args.get('limite', 1000)), PAGINA_MAX)
+        filtro = {"_id": {"$gt": ObjectId(request.args['despues'])}} if request.args.get('despues') else {}
+    except (ValueError, InvalidId) as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
+    if limite <= 0:
+        return jsonify({'error': 'limite debe ser positivo'}), 400
+
+    docs = list(collection.find(filtro, {"uuid": 1}).sort("_id", 1).limit(limite))
+    return jsonify({
+        "uuids": [doc['uuid'] for doc in docs if doc.get('uuid')],
+        # None cuando ya no quedan más páginas
+        "siguiente": str(docs[-1]['_id']) if len(docs) == limite else None
+    })
+
+# Listado completo en NDJSON (un uuid JSON por línea)
+@app.route('/uuids/<tipo>.ndjson', methods=['GET'])
+def get_uuids_ndjson(tipo):
+    collection = coleccion_uuids(tipo)
+    if collection is None:
+        return jsonify({'error': f'Tipo desconocido: {tipo}'}), 404
+    lineas = (json.dumps(uuid) + '\n' for uuid in recorrer_uuids(collection))
+    return Response(stream_with_context(lineas), mimetype='application/x-ndjson')
+
+def huella_coleccion(collection):
+    """Cambia cuando se insertan o borran documentos (barata: no recorre la colección)"""
+    ultimo = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return collection.estimated_document_count(), ultimo["_id"] if ultimo else None
+
+# Snapshot binario (msgpack) de todos los UUIDs, con ETag
+@app.route('/uuids/<tipo>.msgpack', methods=['GET'])
+def get_uuids_snapshot(tipo):
+    collection = coleccion_uuids(tipo)
+    if collection is None:
+        return jsonify({'error': f'Tipo desconocido: {tipo}'}), 404
+    snapshot = snapshots_uuids[tipo]
+    with snapshot.lock:
+        if not snapshot.vigente():
+            huella = huella_coleccion(collection)
+            if not snapshot.actualizar(huella):
+                app.logger.info(f"Regenerando snapshot de {tipo}")
+                snapshot.actualizar(huella, recorrer_uuids(collection))
+        datos, etag = snapshot.datos, snapshot.etag
+
+    if etag_coincide(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers={'ETag': etag})
+    return Response(datos, mimetype='application/x-msgpack', headers={'ETag': etag, 'Cache-Control': 'no-cache'})
 # FIN
 
 
 #Rutas para que el generador de trafico pregunte por alertas y atascos
+def consultar(cache_key, collection, filtro, valor):
+    """
+    Busca en L1 y Redis y, si no está, en MongoDB guardando el resultado en ambas.
+    valor es el uuid como está en MongoDB, para el filtro de UUIDs.
+    """
+    if not filtro_uuids.puede_existir(cache_key.partition(':')[0], valor):
+        # El filtro de Bloom no lo conoce: no existe, sin consultar Redis ni MongoDB
+        return terminar(cache_key, "filtrado")
+    frecuencias.registrar(cache_key)
+    resultado, tiempo_cache_ms = buscar_en_cache(
+        cache_key, lambda: refrescar_en_segundo_plano(cache_key, collection, filtro))
+    if resultado:
+        # Está en caché (L1 o Redis), o en la caché negativa
+        return terminar(cache_key, resultado, tiempo_cache_ms)
+
+    # Si no está en Redis, buscar en MongoDB (una sola vez por clave aunque lleguen muchas consultas)
+    app.logger.info(linea_log("miss", cache_key))
+    documento, tiempo_mongo_ms, coalescido = cargar_coalescido(cache_key, collection, filtro)
+    return terminar(cache_key, "miss" if documento else "no_encontrado", tiempo_mongo_ms, coalescido)
+
+def terminar(cache_key, resultado, tiempo_ms=None, coalescido=None):
+    registrar_resultado(metricas, app.logger, cache_key, resultado)
+    return jsonify(respuesta(resultado, tiempo_ms, coalescido))
+
 @app.route('/alerta/<uuid>', methods=['GET'])
 def get_alerta(uuid):
-    # Buscar en Redis primero
-    cache_key = f"alerta:{uuid}"
-    inicio_tiempo_cache = time.time()
-    cached_data = redis_client.get(cache_key)
-    fin_tiempo_cache = time.time()
-    tiempo_cache = fin_tiempo_cache - inicio_tiempo_cache
-    tiempo_cache_ms = round(tiempo_cache * 1000, 2)  # Convertir a milisegundos
-    
-    if cached_data:
-        # Si el registro está en caché
-        app.logger.info(f"Cache hit for alerta UUID: {uuid}")
-        return jsonify({"resultado": "hit", "tiempo (ms)": tiempo_cache_ms})
-    
-    # Si no está en Redis, buscar en MongoDB
-    app.logger.info(f"Cache miss for alerta UUID: {uuid}, querying MongoDB")
-
-    inicio_tiempo_mongo = time.time()
-    alerta = alertas_collection.find_one({"uuid": uuid})
-    fin_tiempo_mongo = time.time()
-    tiempo_mongo = fin_tiempo_mongo - inicio_tiempo_mongo
-    tiempo_mongo_ms = round(tiempo_mongo * 1000, 2)  # Convertir a milisegundos
-    if not alerta:
-        return jsonify({"resultado": "no_encontrado"})
-    
-    # Convertir el documento BSON a JSON
-    alerta_json = json.loads(json_util.dumps(alerta))
-    
-    # Guardar en Redis para futuras consultas
-    redis_client.setex(
-        cache_key,
-        CACHE_EXPIRATION,
-        json.dumps(alerta_json)
-    )
-    
-    return jsonify({"resultado": "miss", "tiempo (ms)": tiempo_mongo_ms})
+    return consultar(f"alerta:{uuid}", alertas_collection, {"uuid": uuid}, uuid)
 
 @app.route('/atasco/<uuid>', methods=['GET'])
 def get_atasco(uuid):
-    # Buscar en Redis primero
-    cache_key = f"atasco:{uuid}"
-    inicio_tiempo_cache = time.time()
-    cached_data = redis_client.get(cache_key)
-    fin_tiempo_cache = time.time()
-    tiempo_cache = fin_tiempo_cache - inicio_tiempo_cache
-    tiempo_cache_ms = round(tiempo_cache * 1000, 2)  # Convertir a milisegundos
-    
-    if cached_data:
-        # Si el registro está en caché
-        app.logger.info(f"Cache hit for atasco UUID: {uuid}")
-        return jsonify({"resultado": "hit", "tiempo (ms)": tiempo_cache_ms})
-    
-    # Si no está en Redis, buscar en MongoDB
-    app.logger.info(f"Cache miss for atasco UUID: {uuid}, querying MongoDB")
-    
-    
-    # 1. Intentar buscar con el UUID como string
-    #atasco = atascos_collection.find_one({"uuid": uuid}) # NO SIRVE PORQUE UUID ES UN INT
-    atasco = None
-
-    # 2. Si no se encuentra y parece ser un número, intentar con formato numérico
-    if not atasco and uuid.isdigit():
-        inicio_tiempo_mongo = time.time()
-        atasco = atascos_collection.find_one({"uuid": int(uuid)}) # Se convierte a int porque los uuids de atasco son inT
-        fin_tiempo_mongo = time.time()
-        tiempo_mongo = fin_tiempo_mongo - inicio_tiempo_mongo
-        tiempo_mongo_ms = round(tiempo_mongo * 1000, 2)  # Convertir a milisegundos
-    # 3. Si sigue sin encontrarse, verificar si es un UUID con guiones
-    if not atasco:
-        return jsonify({"resultado": "no_encontrado"})
-    
-    # Convertir el documento BSON a JSON
-    atasco_json = json.loads(json_util.dumps(atasco))
-    
-    # Guardar en Redis para futuras consultas
-    redis_client.setex(
-        cache_key,
-        CACHE_EXPIRATION,
-        json.dumps(atasco_json)
-    )
-    
-    return jsonify({"resultado": "miss", "tiempo (ms)": tiempo_mongo_ms})
+    # Los uuids de atasco son enteros: cualquier otra cosa no existe
+    valor = uuid_atasco(uuid)
+    if valor is None:
+        return terminar(f"atasco:{uuid}", "no_encontrado")
+    return consultar(f"atasco:{uuid}", atascos_collection, {"uuid": valor}, valor)
 #FIN
 
+# Rutas de consulta en lote: un viaje a Redis y uno a MongoDB por lote, no por UUID
+def leer_lote():
+    return uuids_del_cuerpo(request.get_json(silent=True), LOTE_MAX_UUIDS)
+
+def consultar_lote(prefijo, collection, uuids, convertir=None):
+    """Resuelve un lote con un viaje a Redis y uno a MongoDB (ver consultas.Lote)"""
+    inicio_tiempo_cache = time.perf_counter()
+    lote = Lote(prefijo, uuids, convertir, filtro_uuids, cache_l1, frecuencias)
+    if lote.pendientes:
+        pipe = redis_client.pipeline(transaction=False)
+        for clave in lote.claves_pendientes():
+            pipe.get(clave)
+            pipe.pttl(clave)
+        inicio_redis = time.perf_counter()
+        respuestas = pipe.execute()
+        medir(metricas, 'redis', 'get_lote', inicio_redis)
+        lote.con_redis(respuestas)
+    lote.tiempos["cache"] = round((time.perf_counter() - inicio_tiempo_cache) * 1000, 2)
+
+    if lote.pendientes:
+        inicio_tiempo_mongo = time.perf_counter()
+        documentos = list(collection.find(lote.filtro_mongo(), proyeccion(prefijo)))
+        medir(metricas, 'mongo', 'find_lote', inicio_tiempo_mongo)
+        lote.tiempos["mongo"] = round((time.perf_counter() - inicio_tiempo_mongo) * 1000, 2)
+
+        pipe = redis_client.pipeline(transaction=False)
+        for clave, ttl, datos in lote.escrituras(documentos, CACHE_EXPIRATION, CACHE_NEGATIVO_TTL):
+            pipe.setex(clave, ttl, datos)
+        inicio_redis = time.perf_counter()
+        pipe.execute()
+        medir(metricas, 'redis', 'setex_lote', inicio_redis)
+    return lote.respuesta(metricas)
+
+@app.route('/alertas/lote', methods=['POST'])
+def post_alertas_lote():
+    uuids, error = leer_lote()
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(consultar_lote("alerta", alertas_collection, uuids))
+
+@app.route('/atascos/lote', methods=['POST'])
+def post_atascos_lote():
+    uuids, error = leer_lote()
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(consultar_lote("atasco", atascos_collection, uuids, uuid_atasco))
+
+# Latencia por ruta: se mide con el reloj monotónico desde que Flask recibe la solicitud
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_solicitud = time.perf_counter()
+
+@app.after_request
+def registrar_solicitud(response):
+    inicio = g.pop('inicio_solicitud', None)
+    if inicio is not None:
+        ruta = request.url_rule.rule if request.url_rule else 'sin_ruta'
+        metricas.observar('api_solicitud_segundos', (ruta, request.method), time.perf_counter() - inicio)
+        metricas.contar('api_solicitudes_total', (ruta, request.method, str(response.status_code)))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metricas.exponer(), content_type=TIPO_CONTENIDO)
+
+# Estado de la caché L1 de este proceso
+@app.route('/cache_l1', methods=['GET'])
+def get_cache_l1():
+    return jsonify(cache_l1.info())
+
+# Estado del filtro de UUIDs de este proceso
+@app.route('/filtro_uuids', methods=['GET'])
+def get_filtro_uuids():
+    return jsonify({"activo": filtro_uuids.activo, **filtro_uuids.estadisticas,
+                    "filtros": filtro_uuids.info()})
+
 
 @app.errorhandler(Exception)
 def handle_error(e):
     app.logger.error(f"Error: {str(e)}")
     return jsonify({'error': str(e)}), 500
 
+# Precalentamiento de Redis con las claves más frecuentes
+def admin_autorizado():
+    return not ADMIN_TOKEN or request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+@app.route('/admin/precalentar', methods=['POST'])
+def post_precalentar():
+    if not admin_autorizado():
+        return jsonify({'error': 'No autorizado'}), 403
+    top_k = request.args.get('top_k', PRECALENTAR_TOP_K, type=int)
+    colecciones = {'alertas': alertas_collection, 'atascos': atascos_collection}
+    return jsonify(precalentar(redis_client, colecciones, frecuencias, CACHE_EXPIRATION, top_k))
+
+@app.route('/admin/frecuencias', methods=['GET'])
+def get_frecuencias():
+    if not admin_autorizado():
+        return jsonify({'error': 'No autorizado'}), 403
+    n = request.args.get('n', 20, type=int)
+    return jsonify({"claves": len(frecuencias),
+                    "top": [{"clave": clave, "puntaje": round(puntaje, 3)} for clave, puntaje in frecuencias.top(n)]})
+
+def guardar_frecuencias():
+    try:
+        frecuencias.guardar(FRECUENCIAS_RUTA)
+    except OSError as e:
+        app.logger.error(f"No se pudo guardar la tabla de frecuencias: {str(e)}")
+
+def tareas_de_fondo():
+    """Carga la tabla de frecuencias, precalienta Redis y la guarda periódicamente"""
+    if FRECUENCIAS_RUTA and frecuencias.cargar(FRECUENCIAS_RUTA):
+        print(f"Tabla de frecuencias cargada: {len(frecuencias)} claves")
+    if PRECALENTAR_AL_INICIAR and len(frecuencias):
+        try:
+            colecciones = {'alertas': alertas_collection, 'atascos': atascos_collection}
+            print(f"Precalentamiento: {precalentar(redis_client, colecciones, frecuencias, CACHE_EXPIRATION)}")
+        except Exception as e:
+            print(f"Error en el precalentamiento: {str(e)}")
+    while FRECUENCIAS_RUTA:
+        time.sleep(FRECUENCIAS_INTERVALO)
+        guardar_frecuencias()
+
+def mantener_filtro():
+    """Construye el filtro de UUIDs y lo pone al día cada FILTRO_REFRESCO segundos"""
+    while True:
+        for tipo, collection in (('alerta', alertas_collection), ('atasco', atascos_collection)):
+            try:
+                filtro_uuids.actualizar(tipo, collection)
+            except Exception as e:
+                print(f"Error al actualizar el filtro de UUIDs de {tipo}: {str(e)}")
+        time.sleep(FILTRO_REFRESCO)
+
 if __name__ == '__main__':
+    threading.Thread(target=tareas_de_fondo, daemon=True).start()
+    if filtro_uuids.activo:
+        threading.Thread(target=mantener_filtro, daemon=True).start()
+        threading.Thread(target=filtro_uuids.escuchar, args=(redis_client,), daemon=True).start()
+    if FRECUENCIAS_RUTA:
+        atexit.register(guardar_frecuencias)
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,508 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from redis.exceptions import LockError
+import uvicorn
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.middleware import Middleware
+from starlette.routing import Route
+
+from cache_l1 import CacheL1, ttl_l1
+from cache_particionado import ClienteParticionadoAsync, crear_cliente_redis_async
+from codec_cache import VALOR_NO_EXISTE, codificar, es_no_existe, proyeccion, proyeccion_de_clave
+from consultas import (Lote, clasificar, configurar_registro, etag_coincide, guardar_l1_desde_redis, linea_log,
+                       registrar_resultado, respuesta, uuid_atasco, uuids_del_cuerpo)
+from filtro_uuids import FILTRO_REFRESCO, FiltroUUIDs
+from metricas import TIPO_CONTENIDO, MonitorPoolMongo, crear_metricas, estado_pool_redis, medir
+from precalentamiento import (FRECUENCIAS_INTERVALO, FRECUENCIAS_RUTA, PRECALENTAR_AL_INICIAR,
+                              PRECALENTAR_TOP_K, FrecuenciasDecaidas, precalentar_async)
+from coalescencia import (LOCK_ESPERA, LOCK_SONDEO, LOCK_TTL_MS, TiempoRecalculo, VueloUnicoAsync,
+                          refrescar_antes)
+from snapshot_uuids import SnapshotUUIDs
+
+# Versión asíncrona (ASGI) de server.py: mismas rutas y mismas respuestas, pero cada
+# consulta a Redis o MongoDB cede el event loop en vez de bloquear un hilo, así un
+# solo proceso atiende miles de consultas en curso.
+
+logger = logging.getLogger("server_async")
+# Líneas "Cache <resultado> for ..." con LOG_CONSULTAS=1 (ver consultas.py)
+configurar_registro()
+
+REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+REDIS_MAX_CONEXIONES = int(os.environ.get('REDIS_MAX_CONEXIONES', 512))
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB = os.environ.get('MONGO_DB', 'trafico_rm')
+MONGO_MAX_CONEXIONES = int(os.environ.get('MONGO_MAX_CONEXIONES', 200))
+
+# Tiempo de expiración de caché en Redis (en segundos)
+CACHE_EXPIRATION = int(os.environ.get('CACHE_EXPIRATION', 300)) # 5 minutos, frescura para tiempo real
+# Caché negativa: un UUID que no está en MongoDB se recuerda estos segundos (0 = desactivada)
+CACHE_NEGATIVO_TTL = int(os.environ.get('CACHE_NEGATIVO_TTL', 30))
+
+# Máximo de UUIDs por consulta en lote
+LOTE_MAX_UUIDS = int(os.environ.get('LOTE_MAX_UUIDS', 1000))
+
+# Caché L1 en memoria del proceso, delante de Redis (L2)
+cache_l1 = CacheL1()
+
+# Histogramas de latencia y contadores para /metrics
+metricas = crear_metricas()
+monitor_mongo = MonitorPoolMongo(metricas)
+metricas.medidor('redis_pool_conexiones', 'Conexiones del pool de Redis', ('estado',),
+                 lambda: [] if isinstance(redis_client, ClienteParticionadoAsync) else estado_pool_redis(redis_client.connection_pool))
+metricas.medidor('redis_nodo_conexiones', 'Conexiones del pool de cada nodo Redis y si está caído', ('nodo', 'estado'),
+                 lambda: redis_client.medidas() if isinstance(redis_client, ClienteParticionadoAsync) else [])
+
+# UUIDs existentes por tipo: los desconocidos se rechazan sin ir a Redis ni a MongoDB
+filtro_uuids = FiltroUUIDs()
+metricas.medidor('filtro_uuids', 'Elementos y bytes del filtro de Bloom de UUIDs', ('tipo', 'medida'),
+                 filtro_uuids.medidas)
+
+# Clientes creados al iniciar, dentro del event loop de uvicorn
+redis_client = None
+mongo_client = None
+alertas_collection = None
+atascos_collection = None
+
+async def iniciar():
+    global redis_client, mongo_client, alertas_collection, atascos_collection
+    redis_client = crear_cliente_redis_async(REDIS_HOST, REDIS_PORT, REDIS_MAX_CONEXIONES)
+    mongo_client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=MONGO_MAX_CONEXIONES, event_listeners=[monitor_mongo])
+    mongo_db = mongo_client[MONGO_DB]
+    alertas_collection = mongo_db['alertas']
+    atascos_collection = mongo_db['atascos']
+    tareas_de_fondo.append(asyncio.create_task(mantener_frecuencias()))
+    if filtro_uuids.activo:
+        tareas_de_fondo.append(asyncio.create_task(mantener_filtro()))
+        tareas_de_fondo.append(asyncio.create_task(filtro_uuids.escuchar_async(redis_client)))
+
+async def detener():
+    for tarea in tareas_de_fondo:
+        tarea.cancel()
+    if FRECUENCIAS_RUTA:
+        guardar_frecuencias()
+    await redis_client.close()
+    mongo_client.close()
+
+# Frecuencia de acceso por clave, para precalentar Redis al reiniciar
+frecuencias = FrecuenciasDecaidas()
+tareas_de_fondo = []
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')  # Si se define, las rutas /admin lo exigen en X-Admin-Token
+
+def colecciones_precalentamiento():
+    return {'alertas': alertas_collection, 'atascos': atascos_collection}
+
+def guardar_frecuencias():
+    try:
+        frecuencias.guardar(FRECUENCIAS_RUTA)
+    except OSError as e:
+        logger.error(f"No se pudo guardar la tabla de frecuencias: {str(e)}")
+
+async def mantener_filtro():
+    """Construye el filtro de UUIDs y lo pone al día cada FILTRO_REFRESCO segundos"""
+    while True:
+        for tipo, collection in (('alerta', alertas_collection), ('atasco', atascos_collection)):
+            try:
+                await filtro_uuids.actualizar_async(tipo, collection)
+            except Exception as e:
+                logger.error(f"Error al actualizar el filtro de UUIDs de {tipo}: {str(e)}")
+        await asyncio.sleep(FILTRO_REFRESCO)
+
+async def mantener_frecuencias():
+    """Carga la tabla de frecuencias, precalienta Redis y la guarda periódicamente"""
+    if FRECUENCIAS_RUTA and frecuencias.cargar(FRECUENCIAS_RUTA):
+        print(f"Tabla de frecuencias cargada: {len(frecuencias)} claves")
+    if PRECALENTAR_AL_INICIAR and len(frecuencias):
+        try:
+            resumen = await precalentar_async(redis_client, colecciones_precalentamiento(), frecuencias, CACHE_EXPIRATION)
+            print(f"Precalentamiento: {resumen}")
+        except Exception as e:
+            print(f"Error en el precalentamiento: {str(e)}")
+    while FRECUENCIAS_RUTA:
+        await asyncio.sleep(FRECUENCIAS_INTERVALO)
+        await asyncio.to_thread(guardar_frecuencias)
+
+async def index(request):
+    return HTMLResponse('''
+        <h1>Bienvenido a la API de tráfico</h1>
+
+    ''')
+
+LISTADO_LOTE = 1000  # Documentos que MongoDB entrega por viaje al recorrer un cursor
+PAGINA_MAX = int(os.environ.get('PAGINA_MAX', 10000))
+
+snapshots_uuids = {tipo: SnapshotUUIDs(tipo) for tipo in ('alertas', 'atascos')}
+locks_snapshot = {}
+
+def coleccion_uuids(tipo):
+    return {'alertas': alertas_collection, 'atascos': atascos_collection}.get(tipo)
+
+async def recorrer_uuids(collection):
+    async for doc in collection.find({}, {"uuid": 1, "_id": 0}).batch_size(LISTADO_LOTE):
+        if doc.get('uuid'):
+            yield doc['uuid']
+
+async def lista_json_en_streaming(collection):
+    yield '['
+    separador = ''
+    async for uuid in recorrer_uuids(collection):
+        yield separador + json.dumps(uuid)
+        separador = ','
+    yield ']'
+
+# Rutas para obtener todos los UUIDs de alertas y atascos. La lista JSON se escribe
+# mientras se recorre el cursor, sin armarla completa en memoria.
+async def get_uuids_alertas(request):
+    return StreamingResponse(lista_json_en_streaming(alertas_collection), media_type='application/json')
+
+async def get_uuids_atascos(request):
+    return StreamingResponse(lista_json_en_streaming(atascos_collection), media_type='application/json')
+
+# Listado paginado por _id: /uuids/alertas?despues=<siguiente>&limite=1000
+async def get_uuids_pagina(request):
+    tipo = request.path_params['tipo']
+    collection = coleccion_uuids(tipo)
+    if collection is None:
+        return JSONResponse({'error': f'Tipo desconocido: {tipo}'}, status_code=404)
+    try:
+        limite = min(int(request.query_params.get('limite', 1000)), PAGINA_MAX)
+        despues = request.query_params.get('despues')
+        filtro = {"_id": {"$gt": ObjectId(despues)}} if despues else {}
+    except (ValueError, InvalidId) as e:
+        return JSONResponse({'error': f'Parámetros inválidos: {str(e)}'}, status_code=400)
+    if limite <= 0:
+        return JSONResponse({'error': 'limite debe ser positivo'}, status_code=400)
+
+    docs = await collection.find(filtro, {"uuid": 1}).sort("_id", 1).limit(limite).to_list(limite)
+    return JSONResponse({
+        "uuids": [doc['uuid'] for doc in docs if doc.get('uuid')],
+        # None cuando ya no quedan más páginas
+        "siguiente": str(docs[-1]['_id']) if len(docs) == limite else None
+    })
+
+# Listado completo en NDJSON (un uuid JSON por línea)
+async def get_uuids_ndjson(request):
+    tipo = request.path_params['tipo']
+    collection = coleccion_uuids(tipo)
+    if collection is None:
+        return JSONResponse({'error': f'Tipo desconocido: {tipo}'}, status_code=404)
+
+    async def lineas():
+        async for uuid in recorrer_uuids(collection):
+            yield json.dumps(uuid) + '\n'
+    return StreamingResponse(lineas(), media_type='application/x-ndjson')
+
+async def huella_coleccion(collection):
+    """Cambia cuando se insertan o borran documentos (barata: no recorre la colección)"""
+    ultimo = await collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return await collection.estimated_document_count(), ultimo["_id"] if ultimo else None
+
+# Snapshot binario (msgpack) de todos los UUIDs, con ETag
+async def get_uuids_snapshot(request):
+    tipo = request.path_params['tipo']
+    collection = coleccion_uuids(tipo)
+    if collection is None:
+        return JSONResponse({'error': f'Tipo desconocido: {tipo}'}, status_code=404)
+    snapshot = snapshots_uuids[tipo]
+    async with locks_snapshot.setdefault(tipo, asyncio.Lock()):
+        if not snapshot.vigente():
+            huella = await huella_coleccion(collection)
+            if not snapshot.actualizar(huella):
+                logger.info(f"Regenerando snapshot de {tipo}")
+                snapshot.actualizar(huella, [uuid async for uuid in recorrer_uuids(collection)])
+        datos, etag = snapshot.datos, snapshot.etag
+
+    if etag_coincide(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    return Response(datos, media_type='application/x-msgpack', headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+# Misses agrupados por clave y tiempo de MongoDB para la expiración anticipada
+vuelos = VueloUnicoAsync()
+tiempo_recalculo = TiempoRecalculo()
+refrescos = set()  # Tareas de refresco en curso (para que no las recolecte el GC)
+
+async def guardar_no_existe(cache_key):
+    """Entrada de la caché negativa: las próximas consultas por la clave no llegan a MongoDB"""
+    if CACHE_NEGATIVO_TTL > 0:
+        await redis_client.setex(cache_key, CACHE_NEGATIVO_TTL, VALOR_NO_EXISTE)
+        cache_l1.guardar(cache_key, VALOR_NO_EXISTE, ttl_l1(CACHE_NEGATIVO_TTL))
+
+async def buscar_en_mongo(cache_key, collection, filtro):
+    """find_one y, si existe, guardar en Redis y L1. Retorna (datos | None, tiempo_mongo_ms)"""
+    inicio_tiempo_mongo = time.perf_counter()
+    documento = await collection.find_one(filtro, proyeccion_de_clave(cache_key))
+    medir(metricas, 'mongo', 'find_one', inicio_tiempo_mongo)
+    tiempo_mongo_ms = round((time.perf_counter() - inicio_tiempo_mongo) * 1000, 2)
+    tiempo_recalculo.registrar(tiempo_mongo_ms)
+    if not documento:
+        await guardar_no_existe(cache_key)
+        return None, tiempo_mongo_ms
+
+    # Mismo formato que server.py
+    datos = codificar(documento)
+    inicio = time.perf_counter()
+    await redis_client.setex(cache_key, CACHE_EXPIRATION, datos)
+    medir(metricas, 'redis', 'setex', inicio)
+    cache_l1.guardar(cache_key, datos, ttl_l1(CACHE_EXPIRATION))
+    return datos, tiempo_mongo_ms
+
+async def cargar_coalescido(cache_key, collection, filtro):
+    """
+    Igual que en server.py: una sola consulta a MongoDB por clave, con VueloUnicoAsync
+    dentro del proceso y un lock corto en Redis entre procesos.
+    Retorna (datos | None, tiempo_ms, coalescido).
+    """
+    async def cargar():
+        lock = redis_client.lock(f"lock:{cache_key}", timeout=LOCK_TTL_MS / 1000)
+        if await lock.acquire(blocking=False):
+            try:
+                return (*await buscar_en_mongo(cache_key, collection, filtro), False)
+            finally:
+                try:
+                    await lock.release()
+                except LockError:
+                    pass  # El lock expiró antes de terminar
+
+        # Otro proceso está consultando MongoDB: esperar a que deje el documento en Redis
+        inicio_espera = time.time()
+        while time.time() - inicio_espera < LOCK_ESPERA:
+            await asyncio.sleep(LOCK_SONDEO)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                cached_data, hay_lock = await pipe.get(cache_key).exists(f"lock:{cache_key}").execute()
+            if cached_data:
+                cache_l1.guardar(cache_key, cached_data, ttl_l1(CACHE_EXPIRATION))
+                return cached_data, round((time.time() - inicio_espera) * 1000, 2), True
+            if not hay_lock:
+                break  # El dueño terminó sin guardar nada (no existe) o se cayó
+        return (*await buscar_en_mongo(cache_key, collection, filtro), False)
+
+    (datos, tiempo_ms, coalescido), esperado = await vuelos.ejecutar(cache_key, cargar)
+    return datos, tiempo_ms, coalescido or esperado
+
+async def refrescar(cache_key, collection, filtro):
+    """Expiración anticipada: renueva la clave sin hacer esperar a la consulta actual"""
+    lock = redis_client.lock(f"lock:{cache_key}", timeout=LOCK_TTL_MS / 1000)
+    if not await lock.acquire(blocking=False):
+        return  # Otra tarea o proceso ya la está renovando
+    try:
+        await buscar_en_mongo(cache_key, collection, filtro)
+        logger.info(f"Refresco anticipado de {cache_key}")
+    except Exception as e:
+        logger.error(f"Error en refresco anticipado de {cache_key}: {str(e)}")
+    finally:
+        try:
+            await lock.release()
+        except LockError:
+            pass
+
+async def consultar(cache_key, collection, filtro, valor):
+    """
+    Busca en L1, luego en Redis y, si no está, en MongoDB guardando el resultado en ambas.
+    valor es el uuid como está en MongoDB, para el filtro de UUIDs.
+    """
+    if not filtro_uuids.puede_existir(cache_key.partition(':')[0], valor):
+        # El filtro de Bloom no lo conoce: no existe, sin consultar Redis ni MongoDB
+        return terminar(cache_key, "filtrado")
+    frecuencias.registrar(cache_key)
+    inicio_tiempo_cache = time.perf_counter()
+    resultado = clasificar(cache_l1.obtener(cache_key), "hit_l1")
+    if resultado:
+        return terminar(cache_key, resultado, round((time.perf_counter() - inicio_tiempo_cache) * 1000, 3))
+
+    # GET y PTTL en un solo viaje: la entrada L1 no debe durar más que la de Redis
+    inicio_redis = time.perf_counter()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        cached_data, pttl = await pipe.get(cache_key).pttl(cache_key).execute()
+    medir(metricas, 'redis', 'get', inicio_redis)
+    tiempo_cache_ms = round((time.perf_counter() - inicio_tiempo_cache) * 1000, 2)  # Convertir a milisegundos
+    resultado = clasificar(cached_data, "hit_l2")
+    if resultado:
+        guardar_l1_desde_redis(cache_l1, cache_key, cached_data, pttl)
+    if resultado == "hit_l2" and refrescar_antes(pttl, tiempo_recalculo.valor_ms):
+        tarea = asyncio.create_task(refrescar(cache_key, collection, filtro))
+        refrescos.add(tarea)
+        tarea.add_done_callback(refrescos.discard)
+    if resultado:
+        return terminar(cache_key, resultado, tiempo_cache_ms)
+
+    logger.info(linea_log("miss", cache_key))
+    datos, tiempo_mongo_ms, coalescido = await cargar_coalescido(cache_key, collection, filtro)
+    # Quien esperó a otro proceso puede encontrar la entrada de la caché negativa
+    encontrado = datos and not es_no_existe(datos)
+    return terminar(cache_key, "miss" if encontrado else "no_encontrado", tiempo_mongo_ms, coalescido)
+
+def terminar(cache_key, resultado, tiempo_ms=None, coalescido=None):
+    registrar_resultado(metricas, logger, cache_key, resultado)
+    return JSONResponse(respuesta(resultado, tiempo_ms, coalescido))
+
+# Rutas para que el generador de trafico pregunte por alertas y atascos
+async def get_alerta(request):
+    uuid = request.path_params['uuid']
+    return await consultar(f"alerta:{uuid}", alertas_collection, {"uuid": uuid}, uuid)
+
+async def get_atasco(request):
+    uuid = request.path_params['uuid']
+    valor = uuid_atasco(uuid)
+    if valor is None:
+        return terminar(f"atasco:{uuid}", "no_encontrado")
+    return await consultar(f"atasco:{uuid}", atascos_collection, {"uuid": valor}, valor)
+
+# Rutas de consulta en lote: un viaje a Redis y uno a MongoDB por lote, no por UUID
+async def leer_lote(request):
+    try:
+        cuerpo = await request.json()
+    except ValueError:
+        cuerpo = None
+    return uuids_del_cuerpo(cuerpo, LOTE_MAX_UUIDS)
+
+async def consultar_lote(prefijo, collection, uuids, convertir=None):
+    """Igual que consultar_lote de server.py, con await en los viajes (ver consultas.Lote)"""
+    inicio_tiempo_cache = time.perf_counter()
+    lote = Lote(prefijo, uuids, convertir, filtro_uuids, cache_l1, frecuencias)
+    if lote.pendientes:
+        inicio_redis = time.perf_counter()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for clave in lote.claves_pendientes():
+                pipe.get(clave).pttl(clave)
+            respuestas = await pipe.execute()
+        medir(metricas, 'redis', 'get_lote', inicio_redis)
+        lote.con_redis(respuestas)
+    lote.tiempos["cache"] = round((time.perf_counter() - inicio_tiempo_cache) * 1000, 2)
+
+    if lote.pendientes:
+        inicio_tiempo_mongo = time.perf_counter()
+        documentos = [doc async for doc in collection.find(lote.filtro_mongo(), proyeccion(prefijo))]
+        medir(metricas, 'mongo', 'find_lote', inicio_tiempo_mongo)
+        lote.tiempos["mongo"] = round((time.perf_counter() - inicio_tiempo_mongo) * 1000, 2)
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for clave, ttl, datos in lote.escrituras(documentos, CACHE_EXPIRATION, CACHE_NEGATIVO_TTL):
+                pipe.setex(clave, ttl, datos)
+            inicio_redis = time.perf_counter()
+            await pipe.execute()
+            medir(metricas, 'redis', 'setex_lote', inicio_redis)
+    return lote.respuesta(metricas)
+
+async def post_alertas_lote(request):
+    uuids, error = await leer_lote(request)
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+    return JSONResponse(await consultar_lote("alerta", alertas_collection, uuids))
+
+async def post_atascos_lote(request):
+    uuids, error = await leer_lote(request)
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+    return JSONResponse(await consultar_lote("atasco", atascos_collection, uuids, uuid_atasco))
+
+# Precalentamiento de Redis con las claves más frecuentes
+def admin_autorizado(request):
+    return not ADMIN_TOKEN or request.headers.get('x-admin-token') == ADMIN_TOKEN
+
+async def post_precalentar(request):
+    if not admin_autorizado(request):
+        return JSONResponse({'error': 'No autorizado'}, status_code=403)
+    try:
+        top_k = int(request.query_params.get('top_k', PRECALENTAR_TOP_K))
+    except ValueError:
+        return JSONResponse({'error': 'top_k debe ser un entero'}, status_code=400)
+    return JSONResponse(await precalentar_async(redis_client, colecciones_precalentamiento(), frecuencias,
+                                                CACHE_EXPIRATION, top_k))
+
+async def get_frecuencias(request):
+    if not admin_autorizado(request):
+        return JSONResponse({'error': 'No autorizado'}, status_code=403)
+    try:
+        n = int(request.query_params.get('n', 20))
+    except ValueError:
+        return JSONResponse({'error': 'n debe ser un entero'}, status_code=400)
+    return JSONResponse({"claves": len(frecuencias),
+                         "top": [{"clave": clave, "puntaje": round(puntaje, 3)} for clave, puntaje in frecuencias.top(n)]})
+
+# Estado de la caché L1 de este proceso
+async def get_cache_l1(request):
+    return JSONResponse(cache_l1.info())
+
+# Estado del filtro de UUIDs de este proceso
+async def get_filtro_uuids(request):
+    return JSONResponse({"activo": filtro_uuids.activo, **filtro_uuids.estadisticas,
+                         "filtros": filtro_uuids.info()})
+
+async def get_metrics(request):
+    return Response(metricas.exponer(), headers={'Content-Type': TIPO_CONTENIDO})
+
+class MedirSolicitudes:
+    """
+    Middleware ASGI: latencia por ruta (con el reloj monotónico, hasta que sale el
+    encabezado de la respuesta) y cantidad de solicitudes por código HTTP.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        registrada = False
+
+        def registrar(codigo):
+            # El router deja en scope el endpoint que atendió la solicitud
+            ruta = rutas_por_endpoint.get(scope.get("endpoint"), 'sin_ruta')
+            metricas.observar('api_solicitud_segundos', (ruta, scope["method"]), time.perf_counter() - inicio)
+            metricas.contar('api_solicitudes_total', (ruta, scope["method"], str(codigo)))
+
+        async def enviar(mensaje):
+            nonlocal registrada
+            if mensaje["type"] == "http.response.start" and not registrada:
+                registrada = True
+                registrar(mensaje["status"])
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if not registrada:
+                registrar(500)  # La respuesta de error la envía ServerErrorMiddleware, más afuera
+
+async def handle_error(request, exc):
+    logger.error(f"Error: {str(exc)}")
+    return JSONResponse({'error': str(exc)}, status_code=500)
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/uuids_alertas', get_uuids_alertas),
+        Route('/uuids_atascos', get_uuids_atascos),
+        # Las rutas con extensión van antes: '/uuids/{tipo}' también calzaría con ellas
+        Route('/uuids/{tipo}.ndjson', get_uuids_ndjson),
+        Route('/uuids/{tipo}.msgpack', get_uuids_snapshot),
+        Route('/uuids/{tipo}', get_uuids_pagina),
+        Route('/alerta/{uuid}', get_alerta),
+        Route('/atasco/{uuid}', get_atasco),
+        Route('/alertas/lote', post_alertas_lote, methods=['POST']),
+        Route('/atascos/lote', post_atascos_lote, methods=['POST']),
+        Route('/cache_l1', get_cache_l1),
+        Route('/filtro_uuids', get_filtro_uuids),
+        Route('/admin/precalentar', post_precalentar, methods=['POST']),
+        Route('/admin/frecuencias', get_frecuencias),
+        Route('/metrics', get_metrics),
+    ],
+    middleware=[Middleware(MedirSolicitudes)],
+    exception_handlers={Exception: handle_error},
+    on_startup=[iniciar],
+    on_shutdown=[detener],
+)
+rutas_por_endpoint = {ruta.endpoint: ruta.path for ruta in app.routes}
+
+if __name__ == '__main__':
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)),
+                log_level=os.environ.get('LOG_LEVEL', 'warning'), backlog=4096)
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+import uuid as uuidlib
+
+import msgpack
+
+# Snapshot binario de todos los UUIDs de una colección, para que los generadores de
+# tráfico los descarguen de una vez al iniciar. Es un mapa msgpack:
+#   {"tipo", "formato", "cantidad", "datos"}
+# donde, según el formato, "datos" es:
+#   - "uuid16": los UUIDs de alertas como 16 bytes cada uno, concatenados
+#   - "uint64": los uuids enteros de atascos como uint64 little endian, concatenados
+#   - "lista": la lista tal cual (si hay algún uuid que no calza con lo anterior)
+
+# Cada cuánto (segundos) se revisa si la colección cambió antes de servir el snapshot
+SNAPSHOT_REVISION = float(os.environ.get('SNAPSHOT_REVISION', 5))
+
+def empaquetar(tipo, uuids):
+    uuids = list(uuids)
+    try:
+        if all(isinstance(uuid, int) and 0 <= uuid < 2 ** 64 for uuid in uuids):
+            formato, datos = "uint64", struct.pack(f"<{len(uuids)}Q", *uuids)
+        else:
+            formato, datos = "uuid16", b"".join(uuidlib.UUID(uuid).bytes for uuid in uuids)
+            if any(str(uuidlib.UUID(bytes=datos[16 * i:16 * i + 16])) != uuid for i, uuid in enumerate(uuids)):
+                # Mayúsculas, llaves u otra forma que no se recupera igual
+                raise ValueError
+    except (ValueError, TypeError, AttributeError):
+        formato, datos = "lista", uuids
+    return msgpack.packb({"tipo": tipo, "formato": formato, "cantidad": len(uuids), "datos": datos},
+                         use_bin_type=True)
+
+def desempaquetar(datos):
+    """Retorna la lista de uuids de un snapshot"""
+    snapshot = msgpack.unpackb(datos, raw=False)
+    formato, cantidad, contenido = snapshot["formato"], snapshot["cantidad"], snapshot["datos"]
+    if formato == "uint64":
+        return list(struct.unpack(f"<{cantidad}Q", contenido))
+    if formato == "uuid16":
+        return [str(uuidlib.UUID(bytes=contenido[16 * i:16 * i + 16])) for i in range(cantidad)]
+    return list(contenido)
+
+class SnapshotUUIDs:
+    """
+    Snapshot de una colección guardado en memoria con su ETag. Se regenera solo si
+    cambió la huella de la colección (cantidad estimada de documentos y último _id),
+    que se revisa a lo más cada SNAPSHOT_REVISION segundos.
+    """
+    def __init__(self, tipo, revision=SNAPSHOT_REVISION):
+        self.tipo = tipo
+        self.revision = revision
+        self.huella = None
+        self.datos = None
+        self.etag = None
+        self.revisado = 0.0
+        self.lock = threading.Lock()
+
+    def vigente(self):
+        """True si el snapshot se puede servir sin volver a revisar la colección"""
+        return self.datos is not None and time.monotonic() - self.revisado < self.revision
+
+    def actualizar(self, huella, uuids=None):
+        """
+        Registra la huella actual. Si es distinta a la del snapshot hay que pasarle los
+        uuids (retorna False si faltan, para que el llamador los lea y vuelva a llamar).
+        """
+        if huella == self.huella and self.datos is not None:
+            self.revisado = time.monotonic()
+            return True
+        if uuids is None:
+            return False
+        datos = empaquetar(self.tipo, uuids)
+        self.datos = datos
+        self.etag = '"' + hashlib.blake2b(datos, digest_size=12).hexdigest() + '"'
+        self.huella = huella
+        self.revisado = time.monotonic()
+        return True
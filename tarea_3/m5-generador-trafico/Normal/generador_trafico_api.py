@@ -1,4 +1,7 @@
 import json
+import struct
+import uuid as uuidlib
+import msgpack
 from scipy.stats import norm
 import numpy as np
 import requests
@@ -7,14 +10,34 @@ import time
 # Definir la URL base de la API
 api_base_url = "http://api_server:5000"  # Usando el nombre del servicio como hostname
 
+def desempaquetar_uuids(datos):
+    """Lista de uuids de un snapshot /uuids/<tipo>.msgpack (ver m4-server/snapshot_uuids.py)"""
+    snapshot = msgpack.unpackb(datos, raw=False)
+    formato, cantidad, contenido = snapshot["formato"], snapshot["cantidad"], snapshot["datos"]
+    if formato == "uint64":
+        return list(struct.unpack(f"<{cantidad}Q", contenido))
+    if formato == "uuid16":
+        return [str(uuidlib.UUID(bytes=contenido[16 * i:16 * i + 16])) for i in range(cantidad)]
+    return list(contenido)
+
+def obtener_uuids(tipo):
+    """Descarga el snapshot binario de UUIDs; si el servidor no lo ofrece usa la lista JSON"""
+    try:
+        response = requests.get(f"{api_base_url}/uuids/{tipo}.msgpack")
+        response.raise_for_status()
+        return desempaquetar_uuids(response.content)
+    except (requests.exceptions.RequestException, ValueError, KeyError, struct.error) as e:
+        print(f"Snapshot de {tipo} no disponible ({e}), usando /uuids_{tipo}")
+    response = requests.get(f"{api_base_url}/uuids_{tipo}")
+    response.raise_for_status()  # Lanzar excepción si hay error HTTP
+    return response.json()
+
 # Lista para almacenar todos los UUIDs con su tipo
 combined_uuids = []
 
 # Obtener UUIDs de alertas desde la API
 try:
-    alertas_response = requests.get(f"{api_base_url}/uuids_alertas")
-    alertas_response.raise_for_status()  # Lanzar excepción si hay error HTTP
-    alertas = alertas_response.json()
+    alertas = obtener_uuids("alertas")
     
     for uuid in alertas:
         combined_uuids.append({"tipo": "alerta", "uuid": uuid})
@@ -26,9 +49,7 @@ except requests.exceptions.RequestException as e:
 
 # Obtener UUIDs de atascos desde la API
 try:
-    atascos_response = requests.get(f"{api_base_url}/uuids_atascos")
-    atascos_response.raise_for_status()  # Lanzar excepción si hay error HTTP
-    atascos = atascos_response.json()
+    atascos = obtener_uuids("atascos")
     
     for uuid in atascos:
         combined_uuids.append({"tipo": "atasco", "uuid": uuid})
@@ -86,6 +107,7 @@ print("\nConsultando la API para cada UUID en la distribución Normal...")
 # Contadores para estadísticas
 total_requests = 0
 cache_hits = 0
+hits_l1 = 0  # Hits resueltos en la caché en memoria del servidor, sin ir a Redis
 cache_misses = 0
 not_found = 0
 tiempos_cache = []
@@ -117,8 +139,11 @@ for item in normal_uuids:
         # Analizar la respuesta para determinar si fue hit, miss o no_encontrado
         data = response.json()
         
-        if data.get('resultado') == 'hit':
+        # 'hit_l1' o 'hit_l2' (o 'hit' en servidores sin L1)
+        if data.get('resultado', '').startswith('hit'):
             cache_hits += 1
+            if data['resultado'] == 'hit_l1':
+                hits_l1 += 1
             tiempos_cache.append(float(data.get('tiempo (ms)')))
             tiempo_cache += float(data.get('tiempo (ms)'))
         elif data.get('resultado') == 'miss':
@@ -146,6 +171,7 @@ tiempo_promedio_no_cache = tiempo_no_cache / cache_misses if cache_misses > 0 el
 print("\nResultados de las consultas:")
 print(f"Total de consultas: {total_requests}")
 print(f"Cache hits: {cache_hits}")
+print(f"  - en L1: {hits_l1}, en Redis: {cache_hits - hits_l1}")
 print(f"Cache misses: {cache_misses}")
 print(f"No encontrados: {not_found}")
 print(f"Hit rate: {hit_rate:.2f}%")
@@ -155,6 +181,7 @@ print(f"Tiempo total: {total_time:.2f} segundos")
 results = {
     "total consultas": total_requests,
     "cache hits": cache_hits,
+    "cache hits l1": hits_l1,
     "cache misses": cache_misses,
     "no encontrados": not_found,
     "hit_rate": hit_rate,
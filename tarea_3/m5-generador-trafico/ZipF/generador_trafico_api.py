@@ -1,4 +1,7 @@
 import json
+import struct
+import uuid as uuidlib
+import msgpack
 from scipy.stats import zipf, expon
 import numpy as np
 import requests
@@ -11,11 +14,33 @@ total_samples = 1000  # Reducir para pruebas rápidas (original: 100000)
 a_zipf = 1.3  # Parámetro Zipf (mayor = más sesgo)
 lambda_exp = 0.5  # Parámetro exponencial (menor = más rápido)
 
+def desempaquetar_uuids(datos):
+    """Lista de uuids de un snapshot /uuids/<tipo>.msgpack (ver m4-server/snapshot_uuids.py)"""
+    snapshot = msgpack.unpackb(datos, raw=False)
+    formato, cantidad, contenido = snapshot["formato"], snapshot["cantidad"], snapshot["datos"]
+    if formato == "uint64":
+        return list(struct.unpack(f"<{cantidad}Q", contenido))
+    if formato == "uuid16":
+        return [str(uuidlib.UUID(bytes=contenido[16 * i:16 * i + 16])) for i in range(cantidad)]
+    return list(contenido)
+
+def obtener_uuids(tipo):
+    """Descarga el snapshot binario de UUIDs; si el servidor no lo ofrece usa la lista JSON"""
+    try:
+        response = requests.get(f"{api_base_url}/uuids/{tipo}.msgpack")
+        response.raise_for_status()
+        return desempaquetar_uuids(response.content)
+    except (requests.exceptions.RequestException, ValueError, KeyError, struct.error) as e:
+        print(f"Snapshot de {tipo} no disponible ({e}), usando /uuids_{tipo}")
+    response = requests.get(f"{api_base_url}/uuids_{tipo}")
+    response.raise_for_status()  # Lanzar excepción si hay error HTTP
+    return response.json()
+
 # Obtener UUIDs (tu código original)
 combined_uuids = []
 
 try:
-    alertas = requests.get(f"{api_base_url}/uuids_alertas").json()
+    alertas = obtener_uuids("alertas")
     combined_uuids.extend([{"tipo": "alerta", "uuid": uuid} for uuid in alertas])
     print(f"Se obtuvieron {len(alertas)} UUIDs de alertas")
 except Exception as e:
@@ -23,7 +48,7 @@ except Exception as e:
     alertas = []
 
 try:
-    atascos = requests.get(f"{api_base_url}/uuids_atascos").json()
+    atascos = obtener_uuids("atascos")
     combined_uuids.extend([{"tipo": "atasco", "uuid": uuid} for uuid in atascos])
     print(f"Se obtuvieron {len(atascos)} UUIDs de atascos")
 except Exception as e:
@@ -45,6 +70,7 @@ tiempos_entre_consultas = expon.rvs(scale=1/lambda_exp, size=total_samples)
 
 
 total_requests = cache_hits = cache_misses = not_found = 0
+hits_l1 = 0  # Hits resueltos en la caché en memoria del servidor, sin ir a Redis
 start_time = datetime.now()
 
 for i, item in enumerate(zipf_uuids):
@@ -59,8 +85,11 @@ for i, item in enumerate(zipf_uuids):
         response = requests.get(url)
         data = response.json()
         
-        if data.get('resultado') == 'hit':
+        # 'hit_l1' o 'hit_l2' (o 'hit' en servidores sin L1)
+        if data.get('resultado', '').startswith('hit'):
             cache_hits += 1
+            if data['resultado'] == 'hit_l1':
+                hits_l1 += 1
         elif data.get('resultado') == 'miss':
             cache_misses += 1
         elif data.get('resultado') == 'no_encontrado':
@@ -77,6 +106,7 @@ total_time = (datetime.now() - start_time).total_seconds()
 print("\n--- Resultados ---")
 print(f"Total consultas: {total_requests}")
 print(f"Cache hits: {cache_hits} ({hit_rate:.2f}%)")
+print(f"  - en L1: {hits_l1}, en Redis: {cache_hits - hits_l1}")
 print(f"Cache misses: {cache_misses}")
 print(f"No encontrados: {not_found}")
 print(f"Tiempo total: {total_time:.2f} segundos")
@@ -86,6 +116,7 @@ print(f"Consultas/segundo: {total_requests / total_time:.2f}")
 results = {
     "total_requests": total_requests,
     "cache_hits": cache_hits,
+    "cache_hits_l1": hits_l1,
     "cache_misses": cache_misses,
     "not_found": not_found,
     "hit_rate": hit_rate,
@@ -0,0 +1,5 @@
+"""Simulador de políticas de caché dirigido por trazas (ver README.md)"""
+from .mattson import curva_lru
+from .politicas import POLITICAS, crear_politica
+from .simulacion import curvas, simular
+from .traza import Traza, cargar_traza, traza_zipf
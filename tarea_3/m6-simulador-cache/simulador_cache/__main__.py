@@ -0,0 +1,176 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+from .politicas import POLITICAS
+from .simulacion import curvas
+from .traza import TAMANO_POR_DEFECTO, cargar_tamanos, cargar_traza, tamanos_desde_mongo, traza_zipf
+
+UNIDADES = {'b': 1, 'k': 1000, 'kb': 1024, 'm': 1000 ** 2, 'mb': 1024 ** 2, 'g': 1000 ** 3, 'gb': 1024 ** 3}
+
+def parsear_tamano(texto):
+    """'64kb', '1mb', '1048576' -> bytes (mismas unidades que redis.conf)"""
+    texto = texto.strip().lower()
+    numero = texto.rstrip('kmgb')
+    unidad = texto[len(numero):] or 'b'
+    return int(float(numero) * UNIDADES[unidad])
+
+def formatear_tamano(n):
+    for unidad, factor in (('GB', 1024 ** 3), ('MB', 1024 ** 2), ('KB', 1024)):
+        if n >= factor:
+            return f"{n / factor:.4g}{unidad}"
+    return f"{n}B"
+
+def leer_redis_conf(ruta):
+    """Opciones de desalojo de un redis.conf (como m3-cache/redis.conf)"""
+    opciones = {}
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for linea in f:
+            campos = linea.split()
+            if len(campos) == 2 and not campos[0].startswith('#'):
+                opciones[campos[0].lower()] = campos[1]
+    return opciones
+
+def capacidades_por_defecto(bytes_totales, puntos):
+    """Escala geométrica desde el 0.1% hasta el 100% de los bytes de todas las claves distintas"""
+    minimo = max(1024, bytes_totales // 1000)
+    if puntos < 2 or minimo >= bytes_totales:
+        return [bytes_totales]
+    razon = (bytes_totales / minimo) ** (1 / (puntos - 1))
+    return sorted({int(minimo * razon ** i) for i in range(puntos)})
+
+def imprimir_tabla(resultados, capacidades):
+    print(f"{'política':<12}" + "".join(f"{formatear_tamano(c):>18}" for c in capacidades))
+    print(f"{'':<12}" + "".join(f"{'hit% / byte-hit%':>18}" for _ in capacidades))
+    por_politica = {}
+    for resultado in resultados:
+        por_politica.setdefault(resultado["politica"], []).append(resultado)
+    for politica, filas in por_politica.items():
+        celdas = "".join(f"{r['hit_rate']:>10.1f} /{r['byte_hit_rate']:>6.1f}" for r in filas)
+        velocidad = sum(r["consultas_por_segundo"] for r in filas) // len(filas)
+        print(f"{politica:<12}{celdas}   ({velocidad} consultas/s por simulación)")
+
+def guardar_resultados(resultados, ruta):
+    if ruta.endswith('.csv'):
+        with open(ruta, 'w', newline='', encoding='utf-8') as f:
+            escritor = csv.DictWriter(f, fieldnames=list(resultados[0].keys()))
+            escritor.writeheader()
+            escritor.writerows(resultados)
+    else:
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+    print(f"Resultados guardados en {ruta}")
+
+def graficar(resultados, ruta, marca=None):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib no está instalado: no se genera el gráfico")
+        return
+
+    figura, (eje_hits, eje_bytes) = plt.subplots(1, 2, figsize=(14, 5))
+    por_politica = {}
+    for resultado in resultados:
+        por_politica.setdefault(resultado["politica"], []).append(resultado)
+    for politica, filas in por_politica.items():
+        x = [r["capacidad"] / 1024 for r in filas]
+        eje_hits.plot(x, [r["hit_rate"] for r in filas], marker='o', label=politica)
+        eje_bytes.plot(x, [r["byte_hit_rate"] for r in filas], marker='o', label=politica)
+    for eje, titulo in ((eje_hits, 'Hit rate (%)'), (eje_bytes, 'Byte hit rate (%)')):
+        if marca:
+            eje.axvline(marca / 1024, color='gray', linestyle='--', label='maxmemory')
+        eje.set_xscale('log')
+        eje.set_xlabel('Capacidad de la caché (KB)')
+        eje.set_ylabel(titulo)
+        eje.grid(True, alpha=0.3)
+        eje.legend()
+    figura.tight_layout()
+    figura.savefig(ruta)
+    print(f"Gráfico guardado en {ruta}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de políticas de caché a partir de trazas de consultas")
+    parser.add_argument('trazas', nargs='*', help="Archivos de traza (.json del generador, .log del servidor o texto)")
+    parser.add_argument('--formato', choices=['json', 'log', 'texto'], help="Formato de las trazas (por defecto según la extensión)")
+    parser.add_argument('--zipf', type=int, metavar='N', help="Usar una traza sintética Zipf de N consultas")
+    parser.add_argument('--zipf-claves', type=int, default=50000)
+    parser.add_argument('--zipf-s', type=float, default=1.1)
+    parser.add_argument('--politicas', default=','.join(POLITICAS),
+                        help=f"Separadas por coma: {', '.join(POLITICAS)}")
+    parser.add_argument('--capacidades', help="Tamaños de caché separados por coma (ej: 64kb,256kb,1mb)")
+    parser.add_argument('--puntos', type=int, default=10, help="Cantidad de capacidades si no se indican")
+    parser.add_argument('--tamano-item', default=str(TAMANO_POR_DEFECTO),
+                        help="Tamaño de las claves sin tamaño conocido (ej: 1kb)")
+    parser.add_argument('--tamanos', help="JSON clave -> bytes con el tamaño de cada clave")
+    parser.add_argument('--tamanos-mongo', action='store_true',
+                        help="Medir el tamaño de cada clave en MongoDB (MONGO_URI, MONGO_DB)")
+    parser.add_argument('--ttl', type=float, help="TTL en segundos (como CACHE_EXPIRATION del servidor)")
+    parser.add_argument('--tasa', type=float, default=100.0,
+                        help="Consultas por segundo para trazas sin marcas de tiempo")
+    parser.add_argument('--redis-conf', help="redis.conf del que tomar maxmemory y las opciones de desalojo")
+    parser.add_argument('--procesos', type=int, default=int(os.environ.get('SIMULADOR_PROCESOS', 0)) or None)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help="Guardar resultados en .json o .csv")
+    parser.add_argument('--grafico', help="Guardar las curvas en un PNG (requiere matplotlib)")
+    args = parser.parse_args()
+
+    politicas = [p.strip() for p in args.politicas.split(',') if p.strip()]
+    desconocidas = [p for p in politicas if p not in POLITICAS]
+    if desconocidas:
+        parser.error(f"Políticas desconocidas: {', '.join(desconocidas)}")
+    if not args.trazas and not args.zipf:
+        parser.error("Indica al menos un archivo de traza o --zipf N")
+
+    inicio = time.time()
+    if args.zipf:
+        traza = traza_zipf(args.zipf, args.zipf_claves, args.zipf_s, tasa=args.tasa, semilla=args.semilla)
+    else:
+        traza = cargar_traza(args.trazas, args.formato)
+    tabla = cargar_tamanos(args.tamanos) if args.tamanos else {}
+    if args.tamanos_mongo:
+        tabla.update(tamanos_desde_mongo(traza.nombres, os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'),
+                                         os.environ.get('MONGO_DB', 'trafico_rm')))
+    traza.completar_tamanos(parsear_tamano(args.tamano_item), tabla)
+    traza.fijar_tiempos(args.tasa)
+    print(f"Traza: {len(traza)} consultas, {traza.distintas} claves distintas, "
+          f"{formatear_tamano(traza.bytes_totales())} en total, {traza.duracion:.1f} s "
+          f"(cargada en {time.time() - inicio:.2f} s)")
+
+    opciones = {"elementos_estimados": traza.distintas}
+    marca = None
+    if args.redis_conf:
+        conf = leer_redis_conf(args.redis_conf)
+        if 'maxmemory' in conf:
+            marca = parsear_tamano(conf['maxmemory'])
+        opciones["muestras"] = int(conf.get('maxmemory-samples', 5))
+        opciones["lfu_log_factor"] = int(conf.get('lfu-log-factor', 10))
+        opciones["lfu_decay_time"] = int(conf.get('lfu-decay-time', 1))
+        print(f"redis.conf: maxmemory {conf.get('maxmemory', '-')}, política {conf.get('maxmemory-policy', '-')}")
+
+    if args.capacidades:
+        capacidades = [parsear_tamano(c) for c in args.capacidades.split(',')]
+    else:
+        capacidades = capacidades_por_defecto(traza.bytes_totales(), args.puntos)
+    if marca and marca not in capacidades:
+        capacidades.append(marca)
+    capacidades.sort()
+
+    inicio = time.time()
+    resultados = curvas(traza, politicas, capacidades, ttl=args.ttl, procesos=args.procesos,
+                        semilla=args.semilla, **opciones)
+    segundos = time.time() - inicio
+    imprimir_tabla(resultados, capacidades)
+    simuladas = len(traza) * len(resultados)
+    print(f"{simuladas} consultas simuladas en {segundos:.1f} s ({int(simuladas / segundos * 60)} por minuto)")
+
+    if args.salida:
+        guardar_resultados(resultados, args.salida)
+    if args.grafico:
+        graficar(resultados, args.grafico, marca)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Curva exacta de LRU para todas las capacidades en una sola pasada (algoritmo de
+Mattson et al., 1970). Una consulta es hit en una LRU de C bytes si y solo si la
+suma de los tamaños de las claves distintas usadas desde su acceso anterior (ella
+incluida) es <= C: la "distancia de pila" en bytes. Con un árbol de Fenwick sobre
+las posiciones de la traza, donde cada clave aporta su tamaño en la posición de su
+último acceso, esa suma se obtiene en O(log n) por consulta.
+
+No considera TTL: para LRU con expiración usar la simulación normal.
+"""
+from array import array
+from bisect import bisect_left
+
+def distancias_lru(traza):
+    """Genera (distancia en bytes, tamaño) por consulta; distancia None en el primer acceso"""
+    n = len(traza)
+    arbol = array('q', bytes(8 * (n + 1)))
+    ultimo = {}
+    tamanos = traza.tamanos
+    total = 0  # Suma de todo el árbol: evita una de las dos consultas de prefijo
+    for i, clave in enumerate(traza.claves, start=1):
+        tamano = tamanos[clave]
+        anterior = ultimo.get(clave)
+        if anterior is None:
+            distancia = None
+        else:
+            # Bytes de las claves cuyo último acceso es posterior a anterior
+            j = anterior
+            prefijo = 0
+            while j > 0:
+                prefijo += arbol[j]
+                j -= j & -j
+            distancia = total - prefijo + tamano
+            j = anterior
+            while j <= n:
+                arbol[j] -= tamano
+                j += j & -j
+            total -= tamano
+        j = i
+        while j <= n:
+            arbol[j] += tamano
+            j += j & -j
+        total += tamano
+        ultimo[clave] = i
+        yield distancia, tamano
+
+def curva_lru(traza, capacidades):
+    """[(capacidad, hits, bytes_hit)] para cada capacidad (en bytes, ordenadas)"""
+    capacidades = sorted(capacidades)
+    hits = [0] * (len(capacidades) + 1)
+    bytes_hit = [0] * (len(capacidades) + 1)
+    for distancia, tamano in distancias_lru(traza):
+        if distancia is not None:
+            # Es hit en todas las capacidades desde la primera >= distancia
+            k = bisect_left(capacidades, distancia)
+            hits[k] += 1
+            bytes_hit[k] += tamano
+    curva = []
+    acumulado_hits = acumulado_bytes = 0
+    for k, capacidad in enumerate(capacidades):
+        acumulado_hits += hits[k]
+        acumulado_bytes += bytes_hit[k]
+        curva.append((capacidad, acumulado_hits, acumulado_bytes))
+    return curva
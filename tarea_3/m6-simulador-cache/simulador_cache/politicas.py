@@ -0,0 +1,492 @@
+"""
+Políticas de reemplazo para el simulador. Todas trabajan con claves enteras (el id
+de la clave en la traza), capacidad en bytes y tamaño por elemento, y opcionalmente
+un TTL en segundos como el CACHE_EXPIRATION del servidor.
+
+Cada política implementa acceder(clave, tamano, t) -> True si fue hit.
+"""
+import random
+from collections import OrderedDict
+
+class Politica:
+    """Base: lleva los bytes usados y la expiración por TTL; las subclases deciden qué sacar"""
+    nombre = "base"
+
+    def __init__(self, capacidad, ttl=None, semilla=42):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.usado = 0
+        self.expira = {} if ttl else None
+        self.rng = random.Random(semilla)
+
+    def acceder(self, clave, tamano, t):
+        if self._contiene(clave):
+            if self.expira is None or self.expira[clave] > t:
+                self._tocar(clave, t)
+                return True
+            # Expiró: cuenta como miss y se vuelve a traer
+            self._quitar(clave)
+        if tamano > self.capacidad:
+            return False
+        self._insertar(clave, tamano, t)
+        if self.expira is not None:
+            self.expira[clave] = t + self.ttl
+        return False
+
+    def _desalojar(self, clave):
+        """Saca una clave elegida por la política (y su expiración)"""
+        if self.expira is not None:
+            self.expira.pop(clave, None)
+
+    # Lo que implementa cada política
+    def _contiene(self, clave):
+        raise NotImplementedError
+
+    def _tocar(self, clave, t):
+        raise NotImplementedError
+
+    def _insertar(self, clave, tamano, t):
+        raise NotImplementedError
+
+    def _quitar(self, clave):
+        raise NotImplementedError
+
+class LRU(Politica):
+    nombre = "lru"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.datos = OrderedDict()
+
+    def _contiene(self, clave):
+        return clave in self.datos
+
+    def _tocar(self, clave, t):
+        self.datos.move_to_end(clave)
+
+    def _insertar(self, clave, tamano, t):
+        while self.usado + tamano > self.capacidad:
+            victima, tam_victima = self.datos.popitem(last=False)
+            self.usado -= tam_victima
+            self._desalojar(victima)
+        self.datos[clave] = tamano
+        self.usado += tamano
+
+    def _quitar(self, clave):
+        self.usado -= self.datos.pop(clave)
+
+class FIFO(LRU):
+    nombre = "fifo"
+
+    def _tocar(self, clave, t):
+        pass
+
+class LFU(Politica):
+    """Menos frecuente primero, con LRU entre las de igual frecuencia"""
+    nombre = "lfu"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frecuencia = {}
+        self.tamanos = {}
+        self.cubetas = {}  # frecuencia -> OrderedDict de claves
+        self.minima = 0
+
+    def _contiene(self, clave):
+        return clave in self.frecuencia
+
+    def _tocar(self, clave, t):
+        f = self.frecuencia[clave]
+        cubeta = self.cubetas[f]
+        del cubeta[clave]
+        if not cubeta:
+            del self.cubetas[f]
+            if self.minima == f:
+                self.minima = f + 1
+        self.frecuencia[clave] = f + 1
+        self.cubetas.setdefault(f + 1, OrderedDict())[clave] = None
+
+    def _insertar(self, clave, tamano, t):
+        while self.usado + tamano > self.capacidad:
+            if self.minima not in self.cubetas:
+                self.minima = min(self.cubetas)
+            cubeta = self.cubetas[self.minima]
+            victima, _ = cubeta.popitem(last=False)
+            if not cubeta:
+                del self.cubetas[self.minima]
+            del self.frecuencia[victima]
+            self.usado -= self.tamanos.pop(victima)
+            self._desalojar(victima)
+        self.frecuencia[clave] = 1
+        self.tamanos[clave] = tamano
+        self.cubetas.setdefault(1, OrderedDict())[clave] = None
+        self.minima = 1
+        self.usado += tamano
+
+    def _quitar(self, clave):
+        f = self.frecuencia.pop(clave)
+        cubeta = self.cubetas[f]
+        del cubeta[clave]
+        if not cubeta:
+            del self.cubetas[f]
+        self.usado -= self.tamanos.pop(clave)
+
+class ARC(Politica):
+    """
+    Adaptive Replacement Cache (Megiddo y Modha) con las listas y el objetivo p medidos
+    en bytes: T1 (vistas una vez), T2 (vistas más de una vez) y sus fantasmas B1 y B2.
+    """
+    nombre = "arc"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.t1, self.t2, self.b1, self.b2 = OrderedDict(), OrderedDict(), OrderedDict(), OrderedDict()
+        self.bytes_t1 = self.bytes_t2 = self.bytes_b1 = self.bytes_b2 = 0
+        self.p = 0
+
+    def _contiene(self, clave):
+        return clave in self.t1 or clave in self.t2
+
+    def _tocar(self, clave, t):
+        if clave in self.t1:
+            tamano = self.t1.pop(clave)
+            self.bytes_t1 -= tamano
+            self.t2[clave] = tamano
+            self.bytes_t2 += tamano
+        else:
+            self.t2.move_to_end(clave)
+
+    def _reemplazar(self, tamano, en_b2):
+        while self.bytes_t1 + self.bytes_t2 + tamano > self.capacidad and (self.t1 or self.t2):
+            if self.t1 and (self.bytes_t1 > self.p or (en_b2 and self.bytes_t1 >= self.p) or not self.t2):
+                victima, tam = self.t1.popitem(last=False)
+                self.bytes_t1 -= tam
+                self.b1[victima] = tam
+                self.bytes_b1 += tam
+            else:
+                victima, tam = self.t2.popitem(last=False)
+                self.bytes_t2 -= tam
+                self.b2[victima] = tam
+                self.bytes_b2 += tam
+            self.usado -= tam
+            self._desalojar(victima)
+
+    def _recortar_fantasmas(self):
+        c = self.capacidad
+        while self.b1 and self.bytes_t1 + self.bytes_b1 > c:
+            self.bytes_b1 -= self.b1.popitem(last=False)[1]
+        while self.b2 and self.bytes_t1 + self.bytes_t2 + self.bytes_b1 + self.bytes_b2 > 2 * c:
+            self.bytes_b2 -= self.b2.popitem(last=False)[1]
+
+    def _insertar(self, clave, tamano, t):
+        if clave in self.b1:
+            # Fantasma de T1: conviene dar más espacio a las recientes
+            self.p = min(self.capacidad, self.p + tamano * max(1.0, self.bytes_b2 / max(self.bytes_b1, 1)))
+            self.bytes_b1 -= self.b1.pop(clave)
+            self._reemplazar(tamano, False)
+            self.t2[clave] = tamano
+            self.bytes_t2 += tamano
+        elif clave in self.b2:
+            # Fantasma de T2: conviene dar más espacio a las frecuentes
+            self.p = max(0, self.p - tamano * max(1.0, self.bytes_b1 / max(self.bytes_b2, 1)))
+            self.bytes_b2 -= self.b2.pop(clave)
+            self._reemplazar(tamano, True)
+            self.t2[clave] = tamano
+            self.bytes_t2 += tamano
+        else:
+            self._reemplazar(tamano, False)
+            self.t1[clave] = tamano
+            self.bytes_t1 += tamano
+        self.usado += tamano
+        self._recortar_fantasmas()
+
+    def _quitar(self, clave):
+        if clave in self.t1:
+            tam = self.t1.pop(clave)
+            self.bytes_t1 -= tam
+        else:
+            tam = self.t2.pop(clave)
+            self.bytes_t2 -= tam
+        self.usado -= tam
+
+class WTinyLFU(Politica):
+    """
+    Ventana LRU (1% de los bytes) y zona principal SLRU (20% probatoria, 80% protegida)
+    con admisión por frecuencia estimada en un Count-Min Sketch de contadores de 4 bits
+    (la misma idea que m4-server/cache_l1.py, pero en bytes).
+    """
+    nombre = "wtinylfu"
+    PROFUNDIDAD = 4
+
+    def __init__(self, capacidad, ttl=None, semilla=42, elementos_estimados=None, fraccion_ventana=0.01):
+        super().__init__(capacidad, ttl, semilla)
+        self.cap_ventana = max(1, int(capacidad * fraccion_ventana))
+        self.cap_principal = capacidad - self.cap_ventana
+        self.cap_protegida = int(self.cap_principal * 0.8)
+        self.ventana, self.probatoria, self.protegida = OrderedDict(), OrderedDict(), OrderedDict()
+        self.bytes_ventana = self.bytes_probatoria = self.bytes_protegida = 0
+        elementos = max(16, elementos_estimados or 1024)
+        ancho = 16
+        while ancho < elementos:
+            ancho *= 2
+        self.mascara = ancho - 1
+        self.tablas = [bytearray(ancho) for _ in range(self.PROFUNDIDAD)]
+        self.semillas = [self.rng.getrandbits(61) | 1 for _ in range(self.PROFUNDIDAD)]
+        self.tam_muestra = 10 * elementos
+        self.incrementos = 0
+
+    def _indices(self, clave):
+        return [((clave + 1) * semilla >> 20) & self.mascara for semilla in self.semillas]
+
+    def _incrementar(self, clave):
+        for tabla, i in zip(self.tablas, self._indices(clave)):
+            if tabla[i] < 15:
+                tabla[i] += 1
+        self.incrementos += 1
+        if self.incrementos >= self.tam_muestra:
+            for tabla in self.tablas:
+                for i, valor in enumerate(tabla):
+                    if valor:
+                        tabla[i] = valor >> 1
+            self.incrementos //= 2
+
+    def _estimar(self, clave):
+        return min(tabla[i] for tabla, i in zip(self.tablas, self._indices(clave)))
+
+    def acceder(self, clave, tamano, t):
+        self._incrementar(clave)
+        return super().acceder(clave, tamano, t)
+
+    def _contiene(self, clave):
+        return clave in self.ventana or clave in self.probatoria or clave in self.protegida
+
+    def _tocar(self, clave, t):
+        if clave in self.ventana:
+            self.ventana.move_to_end(clave)
+        elif clave in self.protegida:
+            self.protegida.move_to_end(clave)
+        else:
+            tamano = self.probatoria.pop(clave)
+            self.bytes_probatoria -= tamano
+            self.protegida[clave] = tamano
+            self.bytes_protegida += tamano
+            while self.bytes_protegida > self.cap_protegida and len(self.protegida) > 1:
+                degradada, tam = self.protegida.popitem(last=False)
+                self.bytes_protegida -= tam
+                self.probatoria[degradada] = tam
+                self.bytes_probatoria += tam
+
+    def _insertar(self, clave, tamano, t):
+        self.ventana[clave] = tamano
+        self.bytes_ventana += tamano
+        self.usado += tamano
+        while self.bytes_ventana > self.cap_ventana and len(self.ventana) > 1:
+            candidata, tam = self.ventana.popitem(last=False)
+            self.bytes_ventana -= tam
+            self._admitir(candidata, tam)
+        # Un elemento más grande que la ventana se queda solo en ella hasta que llegue otro
+        while self.usado > self.capacidad:
+            segmento = self.probatoria or self.protegida or self.ventana
+            self._sacar_lru(segmento)
+
+    def _sacar_lru(self, segmento):
+        victima, tam = segmento.popitem(last=False)
+        if segmento is self.ventana:
+            self.bytes_ventana -= tam
+        elif segmento is self.probatoria:
+            self.bytes_probatoria -= tam
+        else:
+            self.bytes_protegida -= tam
+        self.usado -= tam
+        self._desalojar(victima)
+
+    def _admitir(self, candidata, tam):
+        frecuencia = None
+        while self.bytes_probatoria + self.bytes_protegida + tam > self.cap_principal:
+            segmento = self.probatoria or self.protegida
+            if not segmento:
+                break
+            victima = next(iter(segmento))
+            if frecuencia is None:
+                frecuencia = self._estimar(candidata)
+            if frecuencia <= self._estimar(victima):
+                # Rechazada: la candidata sale de la caché
+                self.usado -= tam
+                self._desalojar(candidata)
+                return
+            self._sacar_lru(segmento)
+        self.probatoria[candidata] = tam
+        self.bytes_probatoria += tam
+
+    def _quitar(self, clave):
+        for segmento in (self.ventana, self.probatoria, self.protegida):
+            if clave in segmento:
+                tam = segmento.pop(clave)
+                if segmento is self.ventana:
+                    self.bytes_ventana -= tam
+                elif segmento is self.probatoria:
+                    self.bytes_probatoria -= tam
+                else:
+                    self.bytes_protegida -= tam
+                self.usado -= tam
+                return
+
+class SoloTTL(Politica):
+    """Sin límite de memoria: solo expira por TTL (la capacidad se ignora)"""
+    nombre = "ttl"
+
+    def __init__(self, capacidad, ttl=None, semilla=42):
+        super().__init__(float('inf'), ttl, semilla)
+        self.datos = {}
+
+    def _contiene(self, clave):
+        return clave in self.datos
+
+    def _tocar(self, clave, t):
+        pass
+
+    def _insertar(self, clave, tamano, t):
+        self.datos[clave] = tamano
+        self.usado += tamano
+
+    def _quitar(self, clave):
+        self.usado -= self.datos.pop(clave)
+
+class RedisMuestreo(Politica):
+    """
+    Desalojo aproximado como en Redis (evict.c): por cada desalojo se toman
+    maxmemory-samples claves al azar, se agregan a un pool de 16 candidatas ordenado
+    por puntaje y se saca la de mayor puntaje que todavía exista.
+    """
+    TAM_POOL = 16
+
+    def __init__(self, capacidad, ttl=None, semilla=42, muestras=5):
+        super().__init__(capacidad, ttl, semilla)
+        self.muestras = muestras
+        self.claves = []      # Para elegir al azar en O(1)
+        self.posicion = {}    # clave -> índice en self.claves
+        self.tamanos = {}
+        self.pool = []        # [(puntaje, clave)] ordenado de menor a mayor
+
+    def _contiene(self, clave):
+        return clave in self.posicion
+
+    def _agregar(self, clave, tamano):
+        self.posicion[clave] = len(self.claves)
+        self.claves.append(clave)
+        self.tamanos[clave] = tamano
+        self.usado += tamano
+
+    def _quitar(self, clave):
+        i = self.posicion.pop(clave)
+        ultima = self.claves.pop()
+        if ultima != clave:
+            self.claves[i] = ultima
+            self.posicion[ultima] = i
+        self.usado -= self.tamanos.pop(clave)
+
+    def _insertar(self, clave, tamano, t):
+        while self.usado + tamano > self.capacidad and self.claves:
+            victima = self._elegir_victima(t)
+            self._quitar(victima)
+            self._desalojar(victima)
+        self._agregar(clave, tamano)
+
+    def _elegir_victima(self, t):
+        n = len(self.claves)
+        for _ in range(min(self.muestras, n)):
+            clave = self.claves[self.rng.randrange(n)]
+            if any(c == clave for _, c in self.pool):
+                continue
+            self.pool.append((self.puntaje(clave, t), clave))
+        self.pool.sort(key=lambda x: x[0])
+        del self.pool[:-self.TAM_POOL]
+        while self.pool:
+            _, clave = self.pool.pop()
+            if clave in self.posicion:
+                return clave
+        return self.claves[self.rng.randrange(n)]
+
+    def puntaje(self, clave, t):
+        raise NotImplementedError
+
+class RedisLRU(RedisMuestreo):
+    """allkeys-lru: el puntaje es el tiempo ocioso medido con el reloj LRU de Redis (resolución 1 s)"""
+    nombre = "redis-lru"
+    RESOLUCION = 1.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ultimo = {}
+
+    def _tocar(self, clave, t):
+        self.ultimo[clave] = int(t / self.RESOLUCION)
+
+    def _insertar(self, clave, tamano, t):
+        super()._insertar(clave, tamano, t)
+        self.ultimo[clave] = int(t / self.RESOLUCION)
+
+    def _quitar(self, clave):
+        super()._quitar(clave)
+        self.ultimo.pop(clave, None)
+
+    def puntaje(self, clave, t):
+        return int(t / self.RESOLUCION) - self.ultimo[clave]
+
+class RedisLFU(RedisMuestreo):
+    """
+    allkeys-lfu: contador logarítmico de 8 bits (lfu-log-factor) que parte en 5 y baja
+    en 1 por cada lfu-decay-time minutos sin accesos. Se desaloja el de menor contador.
+    """
+    nombre = "redis-lfu"
+    CONTADOR_INICIAL = 5
+
+    def __init__(self, capacidad, ttl=None, semilla=42, muestras=5, log_factor=10, decay_minutos=1):
+        super().__init__(capacidad, ttl, semilla, muestras)
+        self.log_factor = log_factor
+        self.decay = decay_minutos * 60
+        self.contador = {}
+        self.ultimo_decay = {}
+
+    def _decaer(self, clave, t):
+        if self.decay:
+            periodos = int((t - self.ultimo_decay[clave]) / self.decay)
+            if periodos:
+                self.contador[clave] = max(0, self.contador[clave] - periodos)
+        return self.contador[clave]
+
+    def _tocar(self, clave, t):
+        contador = self._decaer(clave, t)
+        # Como updateLFU de Redis: el reloj de decaimiento se reinicia en cada acceso
+        self.ultimo_decay[clave] = t
+        if contador < 255:
+            base = max(0, contador - self.CONTADOR_INICIAL)
+            if self.rng.random() < 1.0 / (base * self.log_factor + 1):
+                self.contador[clave] = contador + 1
+
+    def _insertar(self, clave, tamano, t):
+        super()._insertar(clave, tamano, t)
+        self.contador[clave] = self.CONTADOR_INICIAL
+        self.ultimo_decay[clave] = t
+
+    def _quitar(self, clave):
+        super()._quitar(clave)
+        self.contador.pop(clave, None)
+        self.ultimo_decay.pop(clave, None)
+
+    def puntaje(self, clave, t):
+        return 255 - self._decaer(clave, t)
+
+POLITICAS = {clase.nombre: clase for clase in (LRU, FIFO, LFU, ARC, WTinyLFU, SoloTTL, RedisLRU, RedisLFU)}
+
+def crear_politica(nombre, capacidad, ttl=None, semilla=42, **opciones):
+    """Instancia una política por nombre; las opciones que no usa se ignoran"""
+    clase = POLITICAS[nombre]
+    if clase is WTinyLFU:
+        return clase(capacidad, ttl, semilla, elementos_estimados=opciones.get('elementos_estimados'))
+    if clase is RedisLRU:
+        return clase(capacidad, ttl, semilla, muestras=opciones.get('muestras', 5))
+    if clase is RedisLFU:
+        return clase(capacidad, ttl, semilla, muestras=opciones.get('muestras', 5),
+                     log_factor=opciones.get('lfu_log_factor', 10), decay_minutos=opciones.get('lfu_decay_time', 1))
+    return clase(capacidad, ttl, semilla)
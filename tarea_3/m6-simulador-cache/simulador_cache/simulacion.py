@@ -0,0 +1,86 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .mattson import curva_lru
+from .politicas import crear_politica
+
+# Una simulación es (política, capacidad): se reparten entre procesos porque cada
+# una recorre la traza completa y son independientes entre sí.
+
+_traza = None  # La traza de cada proceso trabajador (se pasa una sola vez al crearlo)
+
+def simular(traza, politica, capacidad, ttl=None, semilla=42, **opciones):
+    """Recorre la traza con una política y retorna sus contadores"""
+    cache = crear_politica(politica, capacidad, ttl, semilla, **opciones)
+    acceder = cache.acceder
+    tamanos = traza.tamanos
+    hits = bytes_hit = 0
+    inicio = time.perf_counter()
+    for clave, t in zip(traza.claves, traza.tiempos):
+        if acceder(clave, tamanos[clave], t):
+            hits += 1
+            bytes_hit += tamanos[clave]
+    return {"politica": politica, "capacidad": capacidad, "hits": hits, "bytes_hit": bytes_hit,
+            "segundos": time.perf_counter() - inicio}
+
+def _iniciar_trabajador(traza):
+    global _traza
+    _traza = traza
+
+def _simular_en_trabajador(argumentos):
+    politica, capacidad, ttl, semilla, opciones = argumentos
+    return simular(_traza, politica, capacidad, ttl, semilla, **opciones)
+
+def _bytes_pedidos(traza):
+    tamanos = traza.tamanos
+    return sum(tamanos[clave] for clave in traza.claves)
+
+def curvas(traza, politicas, capacidades, ttl=None, procesos=None, semilla=42, **opciones):
+    """
+    Hit rate y byte hit rate de cada política en cada capacidad. La LRU sin TTL se
+    calcula con la curva de Mattson (una pasada para todas las capacidades).
+    Retorna [{"politica", "capacidad", "hit_rate", "byte_hit_rate", ...}].
+    """
+    capacidades = sorted(capacidades)
+    orden = {politica: i for i, politica in enumerate(politicas)}
+    consultas = len(traza)
+    bytes_pedidos = _bytes_pedidos(traza)
+    resultados = []
+
+    if 'lru' in politicas and not ttl:
+        inicio = time.perf_counter()
+        curva = curva_lru(traza, capacidades)
+        segundos = (time.perf_counter() - inicio) / len(capacidades)
+        resultados.extend({"politica": "lru", "capacidad": capacidad, "hits": hits, "bytes_hit": bytes_hit,
+                           "segundos": segundos} for capacidad, hits, bytes_hit in curva)
+        politicas = [politica for politica in politicas if politica != 'lru']
+
+    tareas = []
+    for politica in politicas:
+        if politica == 'ttl':
+            # Sin límite de memoria: una sola simulación vale para todas las capacidades
+            tareas.append((politica, capacidades[-1], ttl, semilla, opciones))
+        else:
+            tareas.extend((politica, capacidad, ttl, semilla, opciones) for capacidad in capacidades)
+
+    procesos = procesos or os.cpu_count() or 1
+    if procesos > 1 and len(tareas) > 1:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(tareas)), initializer=_iniciar_trabajador,
+                                 initargs=(traza,)) as pool:
+            simulados = list(pool.map(_simular_en_trabajador, tareas))
+    else:
+        simulados = [simular(traza, *tarea[:4], **tarea[4]) for tarea in tareas]
+
+    for resultado in simulados:
+        if resultado["politica"] == 'ttl':
+            resultados.extend(dict(resultado, capacidad=capacidad) for capacidad in capacidades)
+        else:
+            resultados.append(resultado)
+
+    for resultado in resultados:
+        resultado["hit_rate"] = round(resultado["hits"] / consultas * 100, 2) if consultas else 0.0
+        resultado["byte_hit_rate"] = round(resultado["bytes_hit"] / bytes_pedidos * 100, 2) if bytes_pedidos else 0.0
+        resultado["consultas_por_segundo"] = int(consultas / resultado["segundos"]) if resultado["segundos"] else 0
+    resultados.sort(key=lambda r: (orden[r["politica"]], r["capacidad"]))
+    return resultados
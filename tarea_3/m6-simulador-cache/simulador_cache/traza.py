@@ -0,0 +1,247 @@
+"""
+Carga de trazas de consultas. Formatos aceptados:
+
+  - json:  lista de {"tipo": ..., "uuid": ...} como la que guardan los generadores de
+           m5-generador-trafico (uuids_normal_api.json), o un objeto con "consultas".
+  - log:   salida de m4-server con LOG_CONSULTAS=1; se toman las líneas
+           "Cache <resultado> for ..." de server.py y server_async.py, con la marca
+           de tiempo si la tienen.
+  - texto: una consulta por línea, "clave[,tamaño[,tiempo]]" (separado por coma o espacios).
+
+Las claves se pasan a enteros consecutivos (así las políticas comparan ints y no
+strings) y los tamaños quedan en una tabla por id.
+"""
+import json
+import os
+import re
+from array import array
+from datetime import datetime
+
+SOBRECOSTO_CLAVE = 90  # Bytes que Redis usa por clave además de la clave y el valor (igual que m4-server)
+TAMANO_POR_DEFECTO = 1024
+
+LINEA_FLASK = re.compile(r"Cache \w+ for (alerta|atasco) UUID: ([^\s,]+)")
+LINEA_ASYNC = re.compile(r"Cache \w+ for ((?:alerta|atasco):[^\s,]+)")
+MARCA_TIEMPO = re.compile(r"(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d)(?:[,.](\d+))?")
+
+# Las mismas variables que m4-server/codec_cache.py, para medir los valores como los guarda
+CACHE_FORMATO = os.environ.get('CACHE_FORMATO', 'msgpack')
+CACHE_COMPRIMIR_DESDE = int(os.environ.get('CACHE_COMPRIMIR_DESDE', 512))
+CACHE_ZLIB_NIVEL = int(os.environ.get('CACHE_ZLIB_NIVEL', 1))
+
+def _campos(variable):
+    return [campo.strip() for campo in os.environ.get(variable, '').split(',') if campo.strip()]
+
+CACHE_CAMPOS = {
+    'alerta': _campos('CACHE_CAMPOS_ALERTA'),
+    'atasco': _campos('CACHE_CAMPOS_ATASCO'),
+}
+
+class Traza:
+    """Secuencia de consultas: ids, tiempos (segundos desde el inicio) y tamaño de cada id"""
+    def __init__(self):
+        self.claves = array('l')
+        self.tiempos = array('d')
+        self.ids = {}         # clave (str) -> id
+        self.nombres = []     # id -> clave
+        self.tamanos = array('q')
+        self.con_tiempos = False
+
+    def agregar(self, clave, tiempo=None, tamano=None):
+        id_clave = self.ids.get(clave)
+        if id_clave is None:
+            id_clave = self.ids[clave] = len(self.nombres)
+            self.nombres.append(clave)
+            self.tamanos.append(0)
+        if tamano is not None:
+            self.tamanos[id_clave] = tamano
+        self.claves.append(id_clave)
+        if tiempo is not None:
+            self.con_tiempos = True
+        self.tiempos.append(tiempo if tiempo is not None else float('nan'))
+
+    def __len__(self):
+        return len(self.claves)
+
+    @property
+    def distintas(self):
+        return len(self.nombres)
+
+    def completar_tamanos(self, por_defecto=TAMANO_POR_DEFECTO, tabla=None):
+        """Asigna tamaño a las claves que no lo traen: desde tabla (clave -> bytes) o el por defecto"""
+        tabla = tabla or {}
+        for id_clave, clave in enumerate(self.nombres):
+            if clave in tabla:
+                self.tamanos[id_clave] = tabla[clave]
+            elif not self.tamanos[id_clave]:
+                self.tamanos[id_clave] = por_defecto
+
+    def fijar_tiempos(self, tasa):
+        """
+        Tiempos de llegada cuando la traza no los trae: tasa consultas por segundo
+        constantes. Si la traza ya tiene tiempos se reinician para que partan en 0.
+        """
+        if self.con_tiempos:
+            inicio = next((t for t in self.tiempos if t == t), 0.0)
+            anterior = 0.0
+            for i, t in enumerate(self.tiempos):
+                # Líneas sin marca de tiempo heredan la anterior
+                anterior = self.tiempos[i] = t - inicio if t == t else anterior
+        else:
+            paso = 1.0 / tasa
+            for i in range(len(self.tiempos)):
+                self.tiempos[i] = i * paso
+
+    @property
+    def duracion(self):
+        return self.tiempos[-1] - self.tiempos[0] if len(self.tiempos) > 1 else 0.0
+
+    def bytes_totales(self):
+        """Bytes que ocuparía tener todas las claves distintas en caché a la vez"""
+        return sum(self.tamanos)
+
+def _segundos(texto, fraccion):
+    marca = datetime.strptime(texto.replace('T', ' '), "%Y-%m-%d %H:%M:%S").timestamp()
+    return marca + (float(f"0.{fraccion}") if fraccion else 0.0)
+
+def detectar_formato(ruta):
+    if ruta.endswith('.json'):
+        return 'json'
+    if ruta.endswith('.log'):
+        return 'log'
+    return 'texto'
+
+def cargar_json(ruta, traza):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    if isinstance(datos, dict):
+        datos = datos.get("consultas", [])
+    for consulta in datos:
+        if isinstance(consulta, dict):
+            traza.agregar(f"{consulta['tipo']}:{consulta['uuid']}", consulta.get("tiempo"), consulta.get("tamano"))
+        else:
+            traza.agregar(str(consulta))
+
+def cargar_log(ruta, traza):
+    with open(ruta, 'r', encoding='utf-8', errors='replace') as f:
+        for linea in f:
+            coincidencia = LINEA_FLASK.search(linea)
+            if coincidencia:
+                clave = f"{coincidencia.group(1)}:{coincidencia.group(2)}"
+            else:
+                coincidencia = LINEA_ASYNC.search(linea)
+                if not coincidencia:
+                    continue
+                clave = coincidencia.group(1)
+            marca = MARCA_TIEMPO.search(linea)
+            traza.agregar(clave, _segundos(*marca.groups()) if marca else None)
+
+def cargar_texto(ruta, traza):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for linea in f:
+            campos = linea.replace(',', ' ').split()
+            if not campos or campos[0].startswith('#'):
+                continue
+            tamano = int(campos[1]) if len(campos) > 1 else None
+            tiempo = float(campos[2]) if len(campos) > 2 else None
+            traza.agregar(campos[0], tiempo, tamano)
+
+CARGADORES = {'json': cargar_json, 'log': cargar_log, 'texto': cargar_texto}
+
+def cargar_traza(rutas, formato=None):
+    """Carga una o varias trazas (en orden, una a continuación de otra)"""
+    traza = Traza()
+    for ruta in rutas:
+        CARGADORES[formato or detectar_formato(ruta)](ruta, traza)
+    return traza
+
+def cargar_tamanos(ruta):
+    """Tabla clave -> bytes desde un JSON {"alerta:<uuid>": 812, ...}"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return {clave: int(tamano) for clave, tamano in json.load(f).items()}
+
+def _proyeccion(prefijo):
+    """Igual que codec_cache.proyeccion: CACHE_CAMPOS_* incluye campos o, con '-campo', los excluye"""
+    campos = CACHE_CAMPOS.get(prefijo) or []
+    excluidos = [campo[1:] for campo in campos if campo.startswith('-')]
+    if excluidos:
+        return {"_id": 0, **{campo: 0 for campo in excluidos if campo != 'uuid'}}
+    if campos:
+        return {"_id": 0, "uuid": 1, **{campo: 1 for campo in campos}}
+    return {"_id": 0}
+
+def _tipos_basicos(valor):
+    from bson import Decimal128, ObjectId
+
+    if isinstance(valor, (ObjectId, Decimal128)):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable en caché: {type(valor).__name__}")
+
+def _tamano_valor(documento):
+    """Bytes del valor como lo arma codec_cache.codificar (CACHE_FORMATO, CACHE_COMPRIMIR_DESDE, CACHE_ZLIB_NIVEL)"""
+    if CACHE_FORMATO == 'json':
+        from bson import json_util
+        return len(json_util.dumps(documento).encode('utf-8'))
+    import msgpack
+    import zlib
+    datos = msgpack.packb(documento, default=_tipos_basicos, use_bin_type=True)
+    if CACHE_COMPRIMIR_DESDE and len(datos) >= CACHE_COMPRIMIR_DESDE:
+        return 1 + min(len(datos), len(zlib.compress(datos, CACHE_ZLIB_NIVEL)))
+    return 1 + len(datos)
+
+def tamanos_desde_mongo(claves, mongo_uri, mongo_db, lote=500):
+    """
+    Tamaño que ocupa cada clave en Redis según m4-server: la clave, el documento con
+    la proyección de CACHE_CAMPOS_* serializado como en codec_cache.py (mismas
+    variables CACHE_*, que deben coincidir con las del servidor) y SOBRECOSTO_CLAVE.
+    Requiere pymongo y, salvo CACHE_FORMATO=json, msgpack.
+    """
+    from pymongo import MongoClient
+
+    cliente = MongoClient(mongo_uri)
+    db = cliente[mongo_db]
+    tamanos = {}
+    por_coleccion = {'alertas': [], 'atascos': []}
+    prefijos = {'alertas': 'alerta', 'atascos': 'atasco'}
+    for clave in claves:
+        tipo, _, uuid = clave.partition(':')
+        if tipo == 'alerta' and uuid:
+            por_coleccion['alertas'].append((clave, uuid))
+        elif tipo == 'atasco' and uuid.isdigit():
+            por_coleccion['atascos'].append((clave, int(uuid)))
+    try:
+        for coleccion, pares in por_coleccion.items():
+            for i in range(0, len(pares), lote):
+                parte = pares[i:i + lote]
+                claves_por_valor = {valor: clave for clave, valor in parte}
+                for documento in db[coleccion].find({"uuid": {"$in": list(claves_por_valor)}},
+                                                  _proyeccion(prefijos[coleccion])):
+                    clave = claves_por_valor.get(documento["uuid"])
+                    if clave is not None:
+                        tamanos[clave] = len(clave) + _tamano_valor(documento) + SOBRECOSTO_CLAVE
+    finally:
+        cliente.close()
+    return tamanos
+
+def traza_zipf(n_consultas, n_claves, s=1.1, tasa=1000.0, tamano_min=200, tamano_max=4000, semilla=42):
+    """Traza sintética Zipf (como el generador ZipF de m5) con tamaños log-uniformes"""
+    import bisect
+    import itertools
+    import math
+    import random
+
+    rng = random.Random(semilla)
+    pesos = [1.0 / (k ** s) for k in range(1, n_claves + 1)]
+    acumulado = list(itertools.accumulate(pesos))
+    total = acumulado[-1]
+    traza = Traza()
+    for i in range(n_consultas):
+        rango = bisect.bisect_left(acumulado, rng.random() * total)
+        clave = f"sintetica:{rango}"
+        tamano = None
+        if clave not in traza.ids:
+            tamano = int(math.exp(rng.uniform(math.log(tamano_min), math.log(tamano_max))))
+        traza.agregar(clave, i / tasa, tamano)
+    return traza